@@ -1,15 +1,29 @@
+import logging
+import os
+
 import click
 from llm_documentation_modifier.run import Run
+from llm_documentation_modifier.serve import (
+    DEFAULT_ADDRESS,
+    ConversionServer,
+    convert_remote,
+    parse_address,
+)
+from utils.log import init_logger
 
+# Commands that do not use the conversion options of the group
+_STANDALONE_COMMANDS = ("client", "proxy")
 
-@click.command()
+
+@click.group(invoke_without_command=True)
 @click.option(
     "--read-file-path",
     type=str,
-    required=True,
+    required=False,
+    default=None,
     help=(
         "Path to the file with source docstrings. If a directory is specified, the program will"
-        "iterate over all files in the dir."
+        "iterate over all files in the dir. Required unless a command is given."
     ),
 )
 @click.option(
@@ -32,14 +46,511 @@ from llm_documentation_modifier.run import Run
 @click.option(
     "--deploy-route-name",
     type=str,
-    required=True,
-    help="Name of the route in the AI deploy",
+    required=False,
+    multiple=True,
+    help=(
+        "Name of the route in the AI deploy. Repeat to spread load across several"
+        " routes, optionally as NAME[:WEIGHT][@DEPLOY_URI], e.g. gpt-4:2@http://host:5000."
+    ),
 )
-def cli(read_file_path, write_file_path, deploy_uri, deploy_route_name):
+@click.option(
+    "--profile",
+    "profile_path",
+    type=str,
+    required=False,
+    default=None,
+    help="Path where a cProfile/pstats dump of the run will be written.",
+)
+@click.option(
+    "--metrics-out",
+    type=str,
+    required=False,
+    default=None,
+    help=(
+        "Path where per-stage latency metrics (p50/p95/p99) and token usage will be"
+        " written as JSON."
+    ),
+)
+@click.option(
+    "--price-table",
+    "price_table_path",
+    type=str,
+    required=False,
+    default=None,
+    help="YAML file mapping route names to USD prices per 1K prompt/completion tokens.",
+)
+@click.option(
+    "--compaction",
+    type=click.Choice(["none", "latest"]),
+    required=False,
+    default="none",
+    help=(
+        "Conversation compaction for the follow-up prompt turns. 'latest' only resends"
+        " the latest answer and a rules digest instead of the full history."
+    ),
+)
+@click.option(
+    "--initial-concurrency",
+    type=int,
+    required=False,
+    default=4,
+    help="Initial number of in-flight gateway requests.",
+)
+@click.option(
+    "--max-concurrency",
+    type=int,
+    required=False,
+    default=32,
+    help=(
+        "Upper bound on in-flight gateway requests. The live limit is adapted (AIMD)"
+        " between 1 and this value based on gateway latency and 429/5xx errors."
+    ),
+)
+@click.option(
+    "--deadline",
+    type=float,
+    required=False,
+    default=None,
+    help=(
+        "Wall-clock budget for the whole run in seconds. Docstrings that have not"
+        " finished by then are left untouched."
+    ),
+)
+@click.option(
+    "--request-timeout",
+    type=float,
+    required=False,
+    default=None,
+    help="Timeout in seconds for a single gateway request. Timeouts are retried.",
+)
+@click.option(
+    "--hedge-percentile",
+    type=click.FloatRange(0, 100),
+    required=False,
+    default=None,
+    help=(
+        "Fire a duplicate request when a request is slower than this percentile of"
+        " observed latency for its prompt turn. The first answer wins."
+    ),
+)
+@click.option(
+    "--routing-strategy",
+    type=click.Choice(["least-outstanding", "latency"]),
+    required=False,
+    default="least-outstanding",
+    help="How requests are spread across several --deploy-route-name routes.",
+)
+@click.option(
+    "--cascade-route-name",
+    type=str,
+    required=False,
+    multiple=True,
+    help=(
+        "Cheap route(s), in the same format as --deploy-route-name, that every docstring"
+        " is sent to first. Only outputs that fail local validation (parameter names,"
+        " structure, line length) are escalated to --deploy-route-name."
+    ),
+)
+@click.option(
+    "--elide-verbatim/--no-elide-verbatim",
+    default=True,
+    help=(
+        "Replace code blocks and other verbatim directives with placeholders before"
+        " prompting and restore them afterwards, so they are never sent or modified."
+    ),
+)
+@click.option(
+    "--section-only",
+    is_flag=True,
+    default=False,
+    help=(
+        "Only send the :param/:type/:return:/:rtype: region of each docstring to the LLM"
+        " and splice the converted section back into the untouched description."
+    ),
+)
+@click.option(
+    "--param-memo",
+    is_flag=True,
+    default=False,
+    help=(
+        "Convert each unique :param/:return: description once and reuse it across"
+        " docstrings. Implies --section-only."
+    ),
+)
+@click.option(
+    "--candidates",
+    type=click.IntRange(min=1),
+    required=False,
+    default=1,
+    help=(
+        "When above 1, convert each docstring with a single call requesting this many"
+        " completions and keep the best one according to local validation, instead of"
+        " the sequential validation turns."
+    ),
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help=(
+        "Stream completions and stop reading each one as soon as the docstring's"
+        " closing triple quotes arrive."
+    ),
+)
+@click.option(
+    "--schedule",
+    type=click.Choice(["longest-first", "file-priority", "fifo"]),
+    required=False,
+    default="longest-first",
+    help=(
+        "Order in which docstrings of all files are submitted. `longest-first` starts the"
+        " largest docstrings first so no large one runs alone at the end;"
+        " `file-priority` finishes (and writes) small files first."
+    ),
+)
+@click.option(
+    "--cache-path",
+    type=str,
+    required=False,
+    default=None,
+    help=(
+        "JSON lines file caching predicted docstrings, and the docstrings that failed"
+        " to convert, across runs with the same prompts, routes and settings."
+    ),
+)
+@click.option(
+    "--watch",
+    "watch_dir",
+    type=click.Path(exists=True, file_okay=False),
+    required=False,
+    default=None,
+    help=(
+        "Instead of converting --read-file-path, watch this directory and convert new or"
+        " edited docstrings of .py files in place as they are saved."
+    ),
+)
+@click.option(
+    "--log-level",
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False),
+    default="INFO",
+    help="Logging verbosity. DEBUG also logs every predicted docstring.",
+)
+@click.option(
+    "--log-json",
+    is_flag=True,
+    default=False,
+    help=(
+        "Log JSON lines through a queue handler, so formatting and output happen off"
+        " the conversion threads."
+    ),
+)
+@click.option(
+    "--progress-interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=30.0,
+    help=(
+        "Seconds between progress log lines when stderr is not a terminal; on a"
+        " terminal a status line is updated continuously."
+    ),
+)
+@click.option(
+    "--max-tokens",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Stop starting new docstrings once the run would exceed this many tokens.",
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Stop starting new docstrings once the run would exceed this many requests.",
+)
+@click.option(
+    "--max-cost",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help=(
+        "Stop starting new docstrings once the run would cost more than this many USD,"
+        " priced with --price-table."
+    ),
+)
+@click.option(
+    "--state-path",
+    type=str,
+    default=None,
+    help=(
+        "Where a run stopped by a budget records the files left to convert, and where"
+        " the next run of the same paths resumes from, with a budget of its own."
+        " Defaults to llm-docstring-state.json when a budget is set. Not used by"
+        " pre-commit or serve, which report deferred docstrings as unfinished."
+    ),
+)
+@click.option(
+    "--retry-failures",
+    is_flag=True,
+    default=False,
+    help=(
+        "Retry docstrings that the prediction cache recorded as failed, instead of"
+        " skipping them."
+    ),
+)
+@click.option(
+    "--verify-writes/--no-verify-writes",
+    default=True,
+    help=(
+        "Compile every converted file, in parallel worker processes, before writing"
+        " it, and leave the files that would no longer compile unchanged."
+    ),
+)
+@click.pass_context
+def cli(
+    ctx,
+    read_file_path,
+    write_file_path,
+    deploy_uri,
+    deploy_route_name,
+    profile_path,
+    metrics_out,
+    price_table_path,
+    compaction,
+    initial_concurrency,
+    max_concurrency,
+    deadline,
+    request_timeout,
+    hedge_percentile,
+    routing_strategy,
+    cascade_route_name,
+    elide_verbatim,
+    section_only,
+    param_memo,
+    candidates,
+    stream,
+    schedule,
+    cache_path,
+    watch_dir,
+    log_level,
+    log_json,
+    progress_interval,
+    max_tokens,
+    max_requests,
+    max_cost,
+    state_path,
+    retry_failures,
+    verify_writes,
+):
     """
     Execute a single file operation based on the given parameters and run type.
+
+    The `serve` command instead keeps the configured engine resident, and `client`
+    forwards paths to it.
+    """
+    init_logger(getattr(logging, log_level.upper()), structured=log_json)
+    if ctx.invoked_subcommand in _STANDALONE_COMMANDS:
+        return
+    if not deploy_route_name:
+        raise click.UsageError("Missing option '--deploy-route-name'.")
+    if ctx.invoked_subcommand is None and read_file_path is None and not watch_dir:
+        raise click.UsageError("Missing option '--read-file-path'.")
+
+    ctx.obj = dict(
+        deploy_uri=deploy_uri,
+        deploy_route_name=deploy_route_name,
+        profile_path=profile_path,
+        metrics_out=metrics_out,
+        price_table_path=price_table_path,
+        compaction=compaction,
+        initial_concurrency=initial_concurrency,
+        max_concurrency=max_concurrency,
+        deadline=deadline,
+        request_timeout=request_timeout,
+        hedge_percentile=hedge_percentile,
+        routing_strategy=routing_strategy,
+        cascade_route_name=list(cascade_route_name) or None,
+        elide_verbatim=elide_verbatim,
+        section_only=section_only,
+        param_memo=param_memo,
+        candidates=candidates,
+        stream=stream,
+        schedule=schedule,
+        cache_path=cache_path,
+        progress_interval=progress_interval,
+        max_tokens=max_tokens,
+        max_requests=max_requests,
+        max_cost=max_cost,
+        state_path=state_path,
+        retry_failures=retry_failures,
+        verify_writes=verify_writes,
+    )
+    if ctx.invoked_subcommand is None and watch_dir:
+        from llm_documentation_modifier.watch import watch
+
+        try:
+            watch(Run(None, None, cache=True, **ctx.obj), watch_dir)
+        except KeyboardInterrupt:
+            pass
+    elif ctx.invoked_subcommand is None:
+        Run(read_file_path, write_file_path, **ctx.obj).run()
+
+
+@cli.command()
+@click.option(
+    "--address",
+    type=str,
+    default=DEFAULT_ADDRESS,
+    help="http://host:port address to serve on.",
+)
+@click.pass_obj
+def serve(run_kwargs, address):
+    """
+    Keep the configured engine resident and convert paths posted by `client`.
+
+    The deadline, budget, profile and metrics output apply to each conversion request.
+    """
+    if run_kwargs["state_path"] is not None:
+        raise click.UsageError(
+            "--state-path is not supported by serve, which reports deferred docstrings"
+            " as unfinished."
+        )
+    run = Run(None, None, cache=True, **run_kwargs)
+    host, port = parse_address(address)
+    server = ConversionServer(run, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+@cli.command()
+@click.argument("paths", nargs=-1, required=True)
+@click.option(
+    "--address",
+    type=str,
+    default=DEFAULT_ADDRESS,
+    help="http://host:port address of the `serve` daemon.",
+)
+def client(paths, address):
+    """
+    Convert PATHS in place through a running `serve` daemon.
+    """
+    summary = convert_remote(list(paths), address)
+    click.echo(f"Changed {len(summary['files'])} files.")
+    click.echo("\n".join(summary["files"]))
+    for name in ["unfinished", "failed"]:
+        if summary[name]:
+            click.echo(f"{len(summary[name])} docstrings {name}:")
+            click.echo("\n".join(summary[name]))
+    if summary["rolled_back"]:
+        click.echo(f"{len(summary['rolled_back'])} files rolled back:")
+        click.echo("\n".join(summary["rolled_back"]))
+
+
+@cli.command()
+@click.option(
+    "--upstream-uri",
+    type=str,
+    required=True,
+    help="URI of the MLflow gateway to forward requests to.",
+)
+@click.option(
+    "--address",
+    type=str,
+    default="http://127.0.0.1:5001",
+    help="http://host:port address to serve on; use it as --deploy-uri.",
+)
+@click.option(
+    "--cache-path",
+    type=str,
+    required=False,
+    default=None,
+    help="JSON lines file persisting cached temperature-0 responses.",
+)
+@click.option(
+    "--rate-limit",
+    type=float,
+    required=False,
+    default=None,
+    help="Maximum requests per second forwarded upstream, shared by all callers.",
+)
+@click.option(
+    "--max-concurrency",
+    type=click.IntRange(min=1),
+    required=False,
+    default=32,
+    help="Upper bound of the adaptive limit on in-flight upstream requests.",
+)
+def proxy(upstream_uri, address, cache_path, rate_limit, max_concurrency):
+    """
+    Serve a caching, rate-limiting reverse proxy in front of a shared gateway.
+    """
+    from llm_documentation_modifier.proxy import CachingProxy
+
+    host, port = parse_address(address)
+    server = CachingProxy(
+        upstream_uri,
+        host,
+        port,
+        cache_path=cache_path,
+        rate_limit=rate_limit,
+        max_concurrency=max_concurrency,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+@cli.command(name="pre-commit")
+@click.argument("paths", nargs=-1)
+@click.option(
+    "--budget",
+    type=click.FloatRange(min=0, min_open=True),
+    default=30.0,
+    help=(
+        "Wall-clock budget in seconds. Docstrings not converted in time are reported"
+        " and left unchanged instead of blocking the commit."
+    ),
+)
+@click.pass_obj
+def pre_commit(run_kwargs, paths, budget):
+    """
+    Convert only the docstrings in the staged hunks of staged python files.
+
+    PATHS (as passed by the pre-commit framework) restrict the staged files further.
+    The staged and working tree versions are expected to match, which pre-commit
+    ensures by stashing unstaged changes. Predictions are cached in the git directory
+    unless --cache-path is given, so re-running a hook mostly answers from the cache.
     """
-    Run(read_file_path, write_file_path, deploy_uri, deploy_route_name).run()
+    from utils.git import git_dir, staged_changed_lines, staged_files
+
+    files = staged_files()
+    if paths:
+        files = [f for f in files if f in {os.path.normpath(p) for p in paths}]
+    changed_lines = {
+        path: lines for path, lines in staged_changed_lines(files).items() if lines
+    }
+    if not changed_lines:
+        return
+
+    if run_kwargs["cache_path"] is None:
+        run_kwargs["cache_path"] = os.path.join(git_dir(), "llm-docstring-cache.jsonl")
+    # Each request's timeout is bounded by the budget left when it is sent
+    run_kwargs.update(deadline=budget)
+    summary = Run(None, None, **run_kwargs).run(changed_lines)
+
+    click.echo(
+        f"Converted staged docstrings changed {len(summary['files'])} files; review"
+        " and stage the changes."
+    )
+    for name in ["unfinished", "failed"]:
+        if summary[name]:
+            click.echo(f"{len(summary[name])} docstrings {name} (left unchanged):")
+            click.echo("\n".join(summary[name]))
+    if summary["rolled_back"]:
+        click.echo(
+            f"{len(summary['rolled_back'])} files rolled back (they would no longer"
+            " compile):"
+        )
+        click.echo("\n".join(summary["rolled_back"]))
 
 
 if __name__ == "__main__":
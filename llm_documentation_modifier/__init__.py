@@ -1 +1,2 @@
 from .run import Run
+from .api import Converter, ConversionResult
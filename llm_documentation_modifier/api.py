@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import List, Union
+
+from llm_documentation_modifier.run import Run
+from utils.doc_manipulation import DocstringMap
+
+
+@dataclass
+class ConversionResult:
+    """
+    Outcome of converting one source text in memory. The schema is as follows:
+
+    - source: the source text with its converted docstrings substituted
+    - docstrings: the docstrings that were sent, with `predicted_text` set when
+                  converted
+    - unfinished: start lines of docstrings left unchanged by a timeout or deadline
+    - failed: start lines of docstrings whose conversion failed validation
+    - rolled_back: whether the converted source no longer compiled and was discarded
+
+    """
+
+    source: str
+    docstrings: List[DocstringMap] = field(default_factory=list)
+    unfinished: List[int] = field(default_factory=list)
+    failed: List[int] = field(default_factory=list)
+    rolled_back: bool = False
+
+
+class Converter:
+    """
+    Convert docstrings of source texts without touching disk, e.g. to embed the
+    converter in a service. One Converter shares its gateway clients, concurrency
+    limiters and cache across all calls, including concurrent ones, so a server can
+    multiplex many requests through it.
+
+    Example:
+        converter = Converter("http://localhost:5000", "chat-gpt-4")
+        result = converter.convert(source)
+        results = await converter.aconvert_batch([source_a, source_b])
+    """
+
+    def __init__(
+        self,
+        deploy_uri: str,
+        deploy_route_name: Union[str, List[str]],
+        cache: bool = True,
+        **run_kwargs,
+    ):
+        """
+        Args:
+            deploy_uri: URI of the MLflow gateway.
+            deploy_route_name: route(s), as for `Run`.
+            cache: keep converted docstrings in memory across calls.
+            run_kwargs: other `Run` options, e.g. `section_only=True`.
+        """
+        self.run = Run(
+            None, None, deploy_uri, deploy_route_name, cache=cache, **run_kwargs
+        )
+        self._names = itertools.count()
+
+    def convert(self, source: str) -> ConversionResult:
+        return self.convert_batch([source])[0]
+
+    def convert_batch(self, sources: List[str]) -> List[ConversionResult]:
+        """Convert several source texts, scheduling all their docstrings together."""
+        # Unique names keep the docstrings of concurrent calls apart
+        names = [f"<source-{next(self._names)}>" for _ in sources]
+
+        def start_lines(keys: List[str], name: str) -> List[int]:
+            prefix = f"{name}:"
+            return sorted(int(k[len(prefix) :]) for k in keys if k.startswith(prefix))
+
+        try:
+            results = self.run.convert_sources(dict(zip(names, sources)))
+            return [
+                ConversionResult(
+                    source=results[name][0],
+                    docstrings=results[name][1],
+                    unfinished=start_lines(self.run.unfinished, name),
+                    failed=start_lines(self.run.failed, name),
+                    rolled_back=name in self.run.rolled_back,
+                )
+                for name in names
+            ]
+        finally:
+            # The run outlives the call, so it must not keep the state of every call
+            self.run.discard_sources(names)
+
+    async def aconvert(self, source: str) -> ConversionResult:
+        return await asyncio.to_thread(self.convert, source)
+
+    async def aconvert_batch(self, sources: List[str]) -> List[ConversionResult]:
+        return await asyncio.to_thread(self.convert_batch, sources)
@@ -0,0 +1,184 @@
+import json
+import logging
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from utils.cache import PredictionCache
+from utils.concurrency import AdaptiveConcurrencyLimiter, SingleFlight, TokenBucket
+from utils.metrics import Metrics
+
+_logger = logging.getLogger()
+
+_INVOCATIONS_PATH = re.compile(r"^/endpoints/([^/]+)/invocations$")
+_HOP_BY_HOP_HEADERS = {"connection", "transfer-encoding", "content-length"}
+
+
+def _is_cacheable(inputs: Dict) -> bool:
+    """Only deterministic requests are cached: explicit temperature 0, one choice."""
+    return (
+        inputs.get("temperature") == 0
+        and inputs.get("n", 1) == 1
+        and not inputs.get("stream")
+    )
+
+
+class CachingProxy:
+    """
+    Reverse proxy in front of an MLflow gateway, speaking the same `llm/v1/chat`
+    invocations API as the gateway so `--deploy-uri` can point at it.
+
+    Chat invocations are rate limited by a shared token bucket and an adaptive limit on
+    in-flight upstream requests. Concurrent identical requests are forwarded once
+    (single-flight) and temperature-0 answers are cached. Streaming chat invocations
+    are passed through within the same rate limits, holding their in-flight slot until
+    the stream ends. Other requests are passed through as they are.
+    """
+
+    def __init__(
+        self,
+        upstream_uri: str,
+        host: str = "127.0.0.1",
+        port: int = 5001,
+        cache_path: Optional[str] = None,
+        rate_limit: Optional[float] = None,
+        max_concurrency: int = 32,
+        request_timeout: Optional[float] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.upstream_uri = upstream_uri.rstrip("/")
+        self.request_timeout = request_timeout
+        self.metrics = Metrics() if metrics is None else metrics
+        self.cache = PredictionCache(cache_path, "proxy", self.metrics)
+        self.rate_limiter = None if rate_limit is None else TokenBucket(rate_limit)
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=min(4, max_concurrency),
+            max_limit=max_concurrency,
+            metrics=self.metrics,
+        )
+        self._single_flight = SingleFlight()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _forward(self, path: str, inputs: Dict) -> bytes:
+        """Forward a chat invocation upstream within the shared rate limits."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        with self.limiter.slot(), self.metrics.timer("proxy.upstream"):
+            response = requests.post(
+                self.upstream_uri + path, json=inputs, timeout=self.request_timeout
+            )
+            self.metrics.increment("proxy.forwarded")
+            # Raising inside the slot lets 429/5xx shrink the in-flight limit
+            response.raise_for_status()
+        return response.content
+
+    def invoke(self, path: str, inputs: Dict) -> Tuple[int, bytes]:
+        """Answer a chat invocation from the cache, an in-flight call or upstream."""
+        if not _is_cacheable(inputs):
+            return 200, self._forward(path, inputs)
+
+        request_key = path + "\n" + json.dumps(inputs, sort_keys=True)
+        cached = self.cache.get(request_key)
+        if cached is not None:
+            return 200, cached.encode()
+
+        body, shared = self._single_flight.do(
+            request_key, lambda: self._forward(path, inputs)
+        )
+        if shared:
+            self.metrics.increment("proxy.deduplicated")
+        else:
+            self.cache.put(request_key, body.decode())
+        return 200, body
+
+    def _handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                _logger.debug(format % args)
+
+            def _respond(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _pass_through(self, method: str, body: Optional[bytes]):
+                """Relay a request and its (streamed) response as they are."""
+                headers = {"Content-Type": self.headers.get("Content-Type", "")}
+                with requests.request(
+                    method,
+                    proxy.upstream_uri + self.path,
+                    data=body,
+                    headers=headers,
+                    stream=True,
+                    timeout=proxy.request_timeout,
+                ) as response:
+                    self.send_response(response.status_code)
+                    for name, value in response.headers.items():
+                        if name.lower() not in _HOP_BY_HOP_HEADERS:
+                            self.send_header(name, value)
+                    self.end_headers()
+                    for chunk in response.iter_content(chunk_size=None):
+                        self.wfile.write(chunk)
+                        self.wfile.flush()
+                return response
+
+            def _stream(self, body: bytes):
+                """Relay a streaming chat invocation within the shared rate limits."""
+                if proxy.rate_limiter is not None:
+                    proxy.rate_limiter.acquire()
+                try:
+                    with proxy.limiter.slot(), proxy.metrics.timer("proxy.upstream"):
+                        response = self._pass_through("POST", body)
+                        proxy.metrics.increment("proxy.forwarded")
+                        # The response is relayed already; raising lets 429/5xx shrink
+                        # the in-flight limit
+                        response.raise_for_status()
+                except requests.HTTPError:
+                    pass
+
+            def do_GET(self):
+                self._pass_through("GET", None)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    inputs = json.loads(body)
+                except ValueError:
+                    inputs = None
+                if not isinstance(inputs, dict) or not _INVOCATIONS_PATH.match(
+                    self.path
+                ):
+                    self._pass_through("POST", body)
+                    return
+                if inputs.get("stream"):
+                    self._stream(body)
+                    return
+
+                try:
+                    self._respond(*proxy.invoke(self.path, inputs))
+                except requests.HTTPError as e:
+                    self._respond(e.response.status_code, e.response.content)
+                except requests.RequestException as e:
+                    _logger.warning(f"Upstream request failed: {e}")
+                    self._respond(502, json.dumps({"error": str(e)}).encode())
+
+        return Handler
+
+    def serve_forever(self):
+        _logger.info(f"Proxying {self.upstream_uri} on {self.address}")
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,17 +1,49 @@
+import json
+import logging
 import os
-from typing import List, Dict, Optional, Set
+import threading
+import time
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from typing import List, Dict, Optional, Set, Union, Tuple, Callable
 
+from utils.budget import Budget, BudgetGovernor
+from utils.cache import PredictionCache
+from utils.concurrency import AdaptiveConcurrencyLimiter
 from utils.llm import OpenAI
 from utils.doc_manipulation import (
     get_docstrings_from_file,
+    get_docstrings_from_source,
     transform_file_lines,
+    transform_source,
     DocstringMap,
 )
 from utils.log import init_logger
-from utils.general import get_file_paths_in_directory
+from utils.general import get_file_paths_in_directory, lines_are_equal
+from utils.memo import ParamMemo
+from utils.metrics import Metrics, profile, profile_thread
+from utils.progress import Progress
+from utils.routing import Route, Router, parse_route
+from utils.scheduling import Job, order_jobs
+from utils.usage import Usage, UsageTracker, load_price_table
+from utils.validation import ConversionError, check_source_syntax
 
 _logger = init_logger()
 
+_DEFAULT_STATE_PATH = "llm-docstring-state.json"
+# Latency samples per stage kept across the calls of `convert_paths`, for hedging
+_RESIDENT_SAMPLES = 1000
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
 
 class Run:
     def __init__(
@@ -19,58 +51,776 @@ class Run:
         read_file_path: str,
         write_file_path: Optional[str],
         deploy_uri: str,
-        deploy_route_name: str,
+        deploy_route_name: Union[str, List[str]],
+        profile_path: Optional[str] = None,
+        metrics_out: Optional[str] = None,
+        price_table_path: Optional[str] = None,
+        compaction: str = "none",
+        initial_concurrency: int = 4,
+        max_concurrency: int = 32,
+        deadline: Optional[float] = None,
+        request_timeout: Optional[float] = None,
+        hedge_percentile: Optional[float] = None,
+        routing_strategy: str = "least-outstanding",
+        cascade_route_name: Optional[Union[str, List[str]]] = None,
+        elide_verbatim: bool = True,
+        section_only: bool = False,
+        param_memo: bool = False,
+        candidates: int = 1,
+        stream: bool = False,
+        schedule: str = "longest-first",
+        cache: bool = False,
+        cache_path: Optional[str] = None,
+        progress_interval: float = 30.0,
+        max_tokens: Optional[int] = None,
+        max_requests: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        state_path: Optional[str] = None,
+        retry_failures: bool = False,
+        verify_writes: bool = True,
     ):
         self.read_file_path = read_file_path
         self.write_file_path = (
             read_file_path if write_file_path is None else write_file_path
         )
-        self.llm = OpenAI(deploy_uri, deploy_route_name)
+        self.profile_path = profile_path
+        self.metrics_out = metrics_out
+        self.deadline_seconds = deadline
+        self.schedule = schedule
+        self.retry_failures = retry_failures
+        self.verify_writes = verify_writes
+        self._deadline: Optional[float] = None
+        self.unfinished: List[str] = []
+        self.failed: List[str] = []
+        self.changed_files: List[str] = []
+        # Files, or sources, whose converted text no longer compiled and was discarded
+        self.rolled_back: List[str] = []
+        # Name -> docstring count of the sources of `convert_sources` not yet discarded
+        self._source_jobs: Dict[str, int] = {}
+        self._file_stamps: Dict[str, Tuple[int, int]] = {}
+        # Process pool compiling converted files before they are written, if any
+        self._verifier: Optional[ProcessPoolExecutor] = None
+        # Syntax check -> (read path, write path, lines, converted docstrings) of a file
+        self._pending_writes: Dict[
+            Future, Tuple[str, str, List[str], List[DocstringMap]]
+        ] = {}
+        budget = Budget(max_tokens, max_requests, max_cost)
+        self.governor = BudgetGovernor(budget) if budget else None
+        self.state_path = (
+            _DEFAULT_STATE_PATH if state_path is None and budget else state_path
+        )
+        # Read path -> write path of the files with docstrings deferred by the budget
+        self._deferred_files: Dict[str, str] = {}
+        # Whether the state file was left by a previous run of the same paths
+        self._resumed = False
+        self.metrics = Metrics()
+        self.usage = UsageTracker()
+        routes = self._parse_routes(deploy_route_name, deploy_uri)
+        cascade_routes = self._parse_routes(cascade_route_name, deploy_uri)
+        is_multi_route = len(routes) + len(cascade_routes) > 1
+
+        def build_router(_routes):
+            return Router(
+                _routes,
+                strategy=routing_strategy,
+                metrics=self.metrics,
+                limiter_factory=lambda route: AdaptiveConcurrencyLimiter(
+                    initial_limit=min(initial_concurrency, max_concurrency),
+                    max_limit=max_concurrency,
+                    metrics=self.metrics,
+                    label=route.name if is_multi_route else None,
+                ),
+            )
+
+        self.router = build_router(routes)
+        self.cascade_router = build_router(cascade_routes) if cascade_routes else None
+        self.llm = OpenAI(
+            deploy_uri,
+            routes[0].name,
+            metrics=self.metrics,
+            price_table=load_price_table(price_table_path),
+            compaction=compaction,
+            request_timeout=request_timeout,
+            hedge_percentile=hedge_percentile,
+            router=self.router,
+            cascade_router=self.cascade_router,
+            elide_verbatim=elide_verbatim,
+            section_only=section_only or param_memo,
+            param_memo=ParamMemo(self.metrics) if param_memo else None,
+            candidates=candidates,
+            stream=stream,
+        )
+        self.cache = (
+            PredictionCache(cache_path, self.llm.fingerprint(), self.metrics)
+            if cache or cache_path is not None
+            else None
+        )
+        self.progress = Progress(
+            tokens=lambda: self.usage.run.total_tokens,
+            in_flight=lambda: sum(r.limiter.in_flight for r in self.all_routes),
+            cache_hit_rate=lambda: (
+                None if self.cache is None else self.cache.hit_rate()
+            ),
+            errors=lambda: (
+                len(self.failed) + len(self.unfinished) + len(self.rolled_back)
+            ),
+            log_interval=progress_interval,
+        )
+
+    @staticmethod
+    def _parse_routes(
+        route_specs: Optional[Union[str, List[str]]], deploy_uri: str
+    ) -> List[Route]:
+        if route_specs is None:
+            return []
+        if isinstance(route_specs, str):
+            route_specs = [route_specs]
+        return [parse_route(spec, deploy_uri) for spec in route_specs]
+
+    @property
+    def all_routes(self) -> List[Route]:
+        cascade_routes = (
+            [] if self.cascade_router is None else self.cascade_router.routes
+        )
+        return cascade_routes + self.router.routes
+
+    def _parse_jobs(
+        self,
+        _read_file_path: str,
+        changed_lines: Optional[Set[int]] = None,
+        to_change_key: str = "function",
+        source: Optional[str] = None,
+    ) -> List[Job]:
+        """Parse the docstrings of a file, or of `source` named `_read_file_path`."""
+        with self.metrics.timer("file.parse", key=_read_file_path):
+            if source is None:
+                self._file_stamps[_read_file_path] = _file_stamp(_read_file_path)
+                docstring_map = get_docstrings_from_file(_read_file_path, to_change_key)
+            else:
+                docstring_map = get_docstrings_from_source(source, to_change_key)
+        return [
+            Job(_read_file_path, d)
+            for d in docstring_map
+            if changed_lines is None
+            or not changed_lines.isdisjoint(
+                range(d.start_line_number, d.end_line_number + 1)
+            )
+        ]
 
-    def _extract_and_convert_docstring(
-        self, _read_file_path: str, to_change_key: str = "function"
-    ) -> List[DocstringMap]:
-        """Iterate through file and return the modified DocstringMap list."""
-        docstring_map = list(get_docstrings_from_file(_read_file_path, to_change_key))
+    def _run_jobs(
+        self,
+        jobs_by_file: Dict[str, List[Job]],
+        on_file_done: Callable[[str, List[DocstringMap]], None],
+    ):
+        """Convert the jobs of several files with one shared pool of workers.
 
+        Jobs from all files are ordered by `self.schedule`, and `on_file_done` is called
+        with a file's docstrings as soon as its last one is converted.
+        """
+        jobs = [job for file_jobs in jobs_by_file.values() for job in file_jobs]
+        self.progress.add_total(len(jobs))
         _logger.info(
-            f"Converting {len(docstring_map)} docstrings from {_read_file_path}..."
+            f"Converting {len(jobs)} docstrings from {len(jobs_by_file)} files "
+            f"({self.schedule} schedule)..."
+        )
+        for path, file_jobs in jobs_by_file.items():
+            if not file_jobs:
+                on_file_done(path, [])
+
+        # Gateway calls are gated by the limiters, so the pool only bounds their maximum
+        max_workers = sum(r.limiter.max_limit for r in self.all_routes)
+        aborted = threading.Event()
+
+        def convert(job: Job):
+            # Workers may pick up queued jobs before the error reaches this thread
+            if aborted.is_set():
+                return
+            try:
+                self._convert_docstring(job.file_path, job.docstring)
+            except BaseException:
+                aborted.set()
+                raise
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, initializer=profile_thread
+        ) as executor:
+            futures = {
+                executor.submit(convert, job): job
+                for job in order_jobs(jobs, self.schedule)
+            }
+            remaining = {
+                path: len(file_jobs) for path, file_jobs in jobs_by_file.items()
+            }
+            try:
+                for i, future in enumerate(as_completed(futures)):
+                    future.result()
+                    self.progress.advance()
+                    _logger.debug(f"Converted {i + 1} / {len(jobs)} docstrings.")
+                    path = futures[future].file_path
+                    remaining[path] -= 1
+                    if remaining[path] == 0:
+                        on_file_done(
+                            path, [job.docstring for job in jobs_by_file[path]]
+                        )
+            except BaseException:
+                # Do not convert, and pay for, the rest of the queue before raising
+                aborted.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def _convert_files(
+        self,
+        file_paths: List[Tuple[str, str]],
+        changed_lines: Optional[Dict[str, Set[int]]] = None,
+    ):
+        """Convert the docstrings of several files, writing each as soon as it is done.
+
+        Args:
+            file_paths: (read path, write path) pairs
+            changed_lines: if set, only docstrings overlapping these 1-indexed lines of
+                           their read path are converted
+        """
+        start = time.perf_counter()
+        write_paths = dict(file_paths)
+        jobs_by_file = {
+            read_path: self._parse_jobs(
+                read_path, None if changed_lines is None else changed_lines[read_path]
+            )
+            for read_path, _ in file_paths
+        }
+        # Compiling is CPU bound, so the files of a batch are checked in parallel
+        if self.verify_writes and len(file_paths) > 1:
+            self._verifier = ProcessPoolExecutor(
+                max_workers=min(len(file_paths), os.cpu_count() or 1)
+            )
+        try:
+            self._run_jobs(
+                jobs_by_file,
+                lambda read_path, docstring_map: self._write_file(
+                    read_path, write_paths[read_path], docstring_map, start
+                ),
+            )
+            if self._verifier is not None:
+                with self.metrics.timer("file.verify"):
+                    self._finish_writes(wait_all=True)
+        finally:
+            # Files still being checked on an error are not written
+            self._pending_writes.clear()
+            if self._verifier is not None:
+                self._verifier.shutdown(cancel_futures=True)
+                self._verifier = None
+        if self.governor is not None and self.governor.exhausted is not None:
+            for read_path, file_jobs in jobs_by_file.items():
+                if any(job.docstring.predicted_text is None for job in file_jobs):
+                    self._deferred_files[read_path] = write_paths[read_path]
+
+    def convert_sources(
+        self, sources: Dict[str, str]
+    ) -> Dict[str, Tuple[str, List[DocstringMap]]]:
+        """Convert source texts in memory, without reading or writing files.
+
+        Args:
+            sources: source code by name; names key the metrics and the unfinished and
+                     failed docstrings, like file paths do
+
+        Returns:
+            The converted source and its docstrings (with `predicted_text` set if
+            converted) by name.
+        """
+        jobs_by_file = {
+            name: self._parse_jobs(name, source=source)
+            for name, source in sources.items()
+        }
+        self._source_jobs.update(
+            {name: len(jobs) for name, jobs in jobs_by_file.items()}
         )
+        results = {}
+
+        def transform(name: str, docstring_map: List[DocstringMap]):
+            converted = [d for d in docstring_map if d.predicted_text is not None]
+            source = transform_source(sources[name], converted)
+            if self.verify_writes:
+                error = check_source_syntax(source, name)
+                if error is not None:
+                    self._roll_back(
+                        name,
+                        converted,
+                        error,
+                        lambda docstrings: transform_source(sources[name], docstrings),
+                    )
+                    for d in converted:
+                        d.predicted_text = None
+                    source = sources[name]
+            results[name] = (source, docstring_map)
+
+        self._run_jobs(jobs_by_file, transform)
+        return results
 
-        for i, d in enumerate(docstring_map):
-            _logger.info(f"Converting {i + 1} / {len(docstring_map)} docstrings.")
+    def discard_sources(self, names: List[str]):
+        """Forget the unfinished and failed docstrings, rollbacks, metrics, usage and
+        progress of sources converted by `convert_sources`, once their results were
+        collected.
+
+        Args:
+            names: names of the sources
+        """
+        for name in names:
+            prefix = f"{name}:"
+            for keys in [self.unfinished, self.failed, self.rolled_back]:
+                # Removed one by one, as other calls may append concurrently
+                for key in [k for k in keys if k == name or k.startswith(prefix)]:
+                    keys.remove(key)
+            self.metrics.discard_key(name)
+            self.usage.discard(name)
+            self.progress.discard(self._source_jobs.pop(name, 0))
+
+    def _convert_docstring(self, _read_file_path: str, d: DocstringMap):
+        docstring_key = f"{_read_file_path}:{d.start_line_number}"
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            # Past the deadline, docstrings that have not started are left untouched
+            self.unfinished.append(docstring_key)
+            return
+        if self.cache is not None:
+            d.predicted_text = self.cache.get(d.text)
+            if d.predicted_text is not None:
+                return
+            failure = None if self.retry_failures else self.cache.get_failure(d.text)
+            if failure is not None:
+                self.failed.append(docstring_key)
+                self.metrics.increment("cache.failures_skipped")
+                _logger.warning(
+                    f"Skipping {docstring_key}, which failed {failure.attempts} times "
+                    f"({failure.reason}); pass --retry-failures to try it again."
+                )
+                return
+
+        if self.governor is not None and not self.governor.admit():
+            # Deferred docstrings are left untouched for a resumed run to convert
+            self.unfinished.append(docstring_key)
+            return
+
+        usage = Usage()
+        try:
+            with self.metrics.timer("docstring.predict", key=docstring_key):
+                d.predicted_text = self.llm.predict(d.text, usage, self._deadline)
+        except TimeoutError as e:
+            # Timed out docstrings keep predicted_text=None and are left untouched
+            self.unfinished.append(docstring_key)
+            _logger.warning(f"Leaving {docstring_key} unchanged: {e}")
+            return
+        except ConversionError as e:
+            self.failed.append(docstring_key)
+            _logger.error(
+                f"Failed to convert {docstring_key}, leaving it unchanged: {e}"
+            )
+            if self.cache is not None:
+                self.cache.put_failure(d.text, str(e))
+            return
+        finally:
+            self.usage.add(usage, _read_file_path, docstring_key)
+            if self.governor is not None:
+                self.governor.release(usage)
+        if self.cache is not None:
+            self.cache.put(d.text, d.predicted_text)
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug(
+                f"Predicted text for {docstring_key}:\n\n{d.predicted_text}\n"
+            )
 
-            docstring_map[i].predicted_text = self.llm.predict(d.text)
-            _logger.info("Predicted text:\n\n" + docstring_map[i].predicted_text + "\n")
-            _logger.info(f"Converted {i + 1} / {len(docstring_map)} docstrings.")
-        return docstring_map
+    def _write_file(
+        self,
+        _read_file_path: str,
+        _write_file_path: str,
+        docstring_map: List[DocstringMap],
+        start: float,
+    ):
+        """Write the converted docstrings of a single file, unless nothing changed.
 
-    def _single_file_run(self, _read_file_path: str, _write_file_path: str):
-        """Perform docstring substitution for a single file.
+        With `verify_writes`, the file is only written once its converted text compiles,
+        which is checked in the verifier pool while other files are still converting.
 
         Args:
             _read_file_path: path of the file to read from
             _write_file_path: path of the file to write to
+            docstring_map: the file's docstrings; unconverted ones are left untouched
+            start: `time.perf_counter()` at the start of the conversion, used to record
+                   the file's total time
 
         """
+        if _file_stamp(_read_file_path) != self._file_stamps.get(_read_file_path):
+            # The parsed line numbers no longer match, e.g. the file was saved meanwhile
+            self.unfinished.append(_read_file_path)
+            _logger.warning(
+                f"{_read_file_path} changed during its conversion, leaving it unchanged."
+            )
+            return
+
+        converted = [d for d in docstring_map if d.predicted_text is not None]
+        file_lines = transform_file_lines(_read_file_path, converted)
+        self.metrics.record("file.total", time.perf_counter() - start, _read_file_path)
+
+        # Rewriting identical content would only bump the mtime and trigger rebuilds
+        if os.path.exists(_write_file_path):
+            with open(_write_file_path, "r") as f:
+                if lines_are_equal(f.readlines(), file_lines, ignore_whitespace=False):
+                    _logger.info(f"{_write_file_path} is unchanged, not writing it.")
+                    self.metrics.increment("files.unchanged")
+                    return
+
+        if not self.verify_writes:
+            self._finish_write(_read_file_path, _write_file_path, file_lines, converted)
+        elif self._verifier is None:
+            with self.metrics.timer("file.verify"):
+                error = check_source_syntax("".join(file_lines), _write_file_path)
+            self._finish_write(
+                _read_file_path, _write_file_path, file_lines, converted, error
+            )
+        else:
+            future = self._verifier.submit(
+                check_source_syntax, "".join(file_lines), _write_file_path
+            )
+            self._pending_writes[future] = (
+                _read_file_path,
+                _write_file_path,
+                file_lines,
+                converted,
+            )
+            self._finish_writes()
+
+    def _finish_writes(self, wait_all: bool = False):
+        """Write the files whose syntax check is done, or all of them once checked."""
+        if wait_all:
+            wait(self._pending_writes)
+        for future in [f for f in self._pending_writes if f.done()]:
+            self._finish_write(*self._pending_writes.pop(future), future.result())
+
+    def _finish_write(
+        self,
+        _read_file_path: str,
+        _write_file_path: str,
+        file_lines: List[str],
+        converted: List[DocstringMap],
+        error: Optional[str] = None,
+    ):
+        """Write a converted file, unless its syntax check failed.
 
-        docstring_map = self._extract_and_convert_docstring(_read_file_path)
-        file_lines = transform_file_lines(_read_file_path, docstring_map)
+        Splicing a predicted docstring can leave a file that no longer parses, so the
+        converted text is compiled before the file is touched.
+        """
+        if error is not None:
+            self._roll_back(
+                _write_file_path,
+                converted,
+                error,
+                lambda docstrings: "".join(
+                    transform_file_lines(_read_file_path, docstrings)
+                ),
+            )
+            return
 
         _logger.info(f"Writing to {_write_file_path}")
-        with open(_write_file_path, "w+") as f:
-            f.writelines(file_lines)
+        with self.metrics.timer("file.write", key=_read_file_path):
+            with open(_write_file_path, "w+") as f:
+                f.writelines(file_lines)
+        self.changed_files.append(_write_file_path)
 
-    def run(self):
-        if os.path.isdir(self.read_file_path):
-            files_to_modify = get_file_paths_in_directory(self.read_file_path, ".py")
+    def _roll_back(
+        self,
+        name: str,
+        converted: List[DocstringMap],
+        error: str,
+        splice: Callable[[List[DocstringMap]], str],
+    ):
+        """Discard the converted docstrings of a file or source that no longer compiles.
+
+        The docstrings that break the syntax on their own, found by splicing each
+        prediction alone, are recorded as failures in the cache, evicting their cached
+        predictions; the predictions of the others are kept.
+
+        Args:
+            name: file or source name
+            converted: the docstrings with a prediction
+            error: syntax error of the source with all predictions spliced
+            splice: the source with only the given docstrings converted
+        """
+        self.rolled_back.append(name)
+        self.metrics.increment("files.rolled_back")
+        _logger.error(f"Not writing {name}, which no longer compiles: {error}")
+        if self.cache is None:
+            return
+
+        for d in converted:
+            if len(converted) > 1:
+                error = check_source_syntax(splice([d]), name)
+            if error is not None:
+                self.cache.put_failure(
+                    d.text,
+                    f"{name}:{d.start_line_number} no longer compiles: {error}",
+                )
+
+    def _report(self):
+        _logger.info("Stage latencies (seconds):\n" + self.metrics.format_table())
+        _logger.info("Token usage:\n" + self.usage.format_totals())
+        for route in self.all_routes:
+            _logger.info(
+                f"Route {route.label}: concurrency limit {route.limiter.limit} "
+                f"(range {route.limiter.min_limit} - {route.limiter.max_limit}), "
+                f"{self.metrics.counter(f'route.{route.name}.requests')} requests, "
+                f"{self.metrics.counter(f'route.{route.name}.errors')} errors"
+            )
+        if self.cascade_router is not None:
+            _logger.info(
+                f"Cascade: {self.metrics.counter('cascade.escalated')} / "
+                f"{self.metrics.counter('cascade.docstrings')} docstrings escalated "
+                f"({self.llm.escalation_rate():.1%})."
+            )
+        if self.cache is not None:
+            _logger.info(
+                f"Prediction cache: {len(self.cache)} entries, "
+                f"{self.cache.hit_rate():.1%} hit rate, {self.cache.failures} known "
+                f"failures ({self.metrics.counter('cache.failures_skipped')} skipped)."
+            )
+        if self.llm.param_memo is not None:
+            _logger.info(
+                f"Parameter memo: {len(self.llm.param_memo)} unique fields, "
+                f"{self.llm.param_memo.hit_rate():.1%} hit rate."
+            )
+        if self.governor is not None and self.governor.exhausted is not None:
+            _logger.warning(
+                f"Budget reached ({self.governor.exhausted}): "
+                f"{len(self._deferred_files)} files have docstrings left to convert."
+            )
+        if self.changed_files:
+            _logger.info(
+                f"{len(self.changed_files)} files changed:\n"
+                + "\n".join(self.changed_files)
+            )
+        else:
+            _logger.info("No files changed.")
+        if self.unfinished:
+            _logger.warning(
+                f"{len(self.unfinished)} docstrings were left unchanged:\n"
+                + "\n".join(self.unfinished)
+            )
+        if self.failed:
+            _logger.warning(
+                f"{len(self.failed)} docstrings failed to convert:\n"
+                + "\n".join(self.failed)
+            )
+        if self.rolled_back:
+            _logger.warning(
+                f"{len(self.rolled_back)} files were left unchanged as they would no "
+                "longer compile:\n" + "\n".join(self.rolled_back)
+            )
+        if self.metrics_out is not None:
+            self.metrics.write_json(
+                self.metrics_out,
+                {
+                    "usage": self.usage.to_dict(),
+                    "changed_files": self.changed_files,
+                    "unfinished": self.unfinished,
+                    "failed": self.failed,
+                    "rolled_back": self.rolled_back,
+                },
+            )
+            _logger.info(f"Wrote metrics to {self.metrics_out}")
+
+    def run(
+        self, changed_lines: Optional[Dict[str, Set[int]]] = None
+    ) -> Dict[str, List[str]]:
+        """Convert the read path, or only `changed_lines` (see `convert_changed`).
+
+        The deadline, profile and report cover the whole conversion. Runs of
+        `changed_lines` neither resume nor record a budget state: the changed lines are
+        only known to the caller, which converts the deferred docstrings by running again
+        with the same changed lines.
+        """
+        if self.deadline_seconds is not None:
+            self._deadline = time.monotonic() + self.deadline_seconds
+        resumed = self._load_state() if changed_lines is None else None
+        with profile(self.profile_path), self.progress:
+            if resumed is not None:
+                summary = self._convert_and_summarize(resumed)
+            elif changed_lines is None:
+                summary = self.convert(self.read_file_path, self.write_file_path)
+            else:
+                summary = self.convert_changed(changed_lines)
+        if changed_lines is None:
+            self._save_state()
+        self._report()
+        return summary
+
+    def _run_paths(self) -> Dict[str, str]:
+        return {
+            "read_path": os.path.abspath(self.read_file_path),
+            "write_path": os.path.abspath(self.write_file_path),
+        }
+
+    def _load_state(self) -> Optional[List[Tuple[str, str]]]:
+        """(read path, write path) pairs left by a run of the same paths stopped by its
+        budget, if any. A state left by a run of other paths is ignored.
+        """
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, "r") as f:
+            state = json.load(f)
+        if state.get("run") != self._run_paths():
+            _logger.warning(
+                f"Ignoring {self.state_path}, which a run of "
+                f"{state.get('run', {}).get('read_path')} left unfinished."
+            )
+            return None
+
+        self._resumed = True
+        _logger.info(
+            f"Resuming {len(state['files'])} files from {self.state_path}, which a run "
+            f"stopped by its budget ({state['reason']}) left unfinished after "
+            f"{state['usage']['total_tokens']} tokens, {state['usage']['requests']} "
+            f"requests and {state['usage']['cost']:.4f} USD. The budget of this run "
+            "applies to this run alone."
+        )
+        return [(x["read_path"], x["write_path"]) for x in state["files"]]
+
+    def _save_state(self):
+        """Record the files left by the budget, or clear the state once none are left.
+
+        Converted docstrings were written out, so a resumed run reads each file from
+        its write path and only finds the docstrings that are left to convert.
+        """
+        if self.state_path is None:
+            return
+        if not self._deferred_files:
+            if self._resumed:
+                os.remove(self.state_path)
+            return
+
+        files = [
+            {
+                "read_path": write_path if os.path.exists(write_path) else read_path,
+                "write_path": write_path,
+            }
+            for read_path, write_path in self._deferred_files.items()
+        ]
+        with open(self.state_path, "w+") as f:
+            json.dump(
+                {
+                    "run": self._run_paths(),
+                    "reason": self.governor.exhausted,
+                    "usage": self.governor.spent.to_dict(),
+                    "files": files,
+                },
+                f,
+                indent=2,
+            )
+        _logger.warning(
+            f"Wrote resumable state to {self.state_path}; rerun to continue converting."
+        )
+
+    def convert(
+        self, read_file_path: str, write_file_path: Optional[str] = None
+    ) -> Dict[str, List[str]]:
+        """Convert a file or, in place, every python file of a directory.
+
+        Can be called repeatedly on the same Run, e.g. by the `serve` daemon, reusing its
+        clients, limiters and cache.
+
+        Args:
+            read_file_path: file or directory to convert
+            write_file_path: path to write a converted file to; defaults to
+                             `read_file_path` and is ignored for directories
+
+        Returns:
+            The files written, the docstrings left unfinished or failed and the files
+            rolled back by this call.
+        """
+        if os.path.isdir(read_file_path):
+            files_to_modify = get_file_paths_in_directory(read_file_path, ".py")
             _logger.info(
                 "The read path is detected to be a directory. The write path parameter will be "
                 "ignored and all files in the read directory will be transformed in place."
             )
             _logger.info(f"There are {len(files_to_modify)} files.")
-            for file_path in files_to_modify:
-                _logger.info(f"Modifying {file_path}")
-                self._single_file_run(file_path, file_path)
+            file_paths = [(path, path) for path in files_to_modify]
         else:
-            self._single_file_run(self.read_file_path, self.write_file_path)
+            file_paths = [(read_file_path, write_file_path or read_file_path)]
+
+        return self._convert_and_summarize(file_paths)
+
+    def convert_paths(self, paths: List[str]) -> Dict[str, List[str]]:
+        """Convert files or directories in place as one request of a long-lived run,
+        e.g. of the `serve` daemon.
+
+        The deadline, budget, profile and report apply to this call alone, after which
+        `reset` forgets its results so that the run does not grow with every call.
+
+        Args:
+            paths: files or directories to convert
+
+        Returns:
+            The files written, the docstrings left unfinished or failed and the files
+            rolled back by this call.
+        """
+        if self.deadline_seconds is not None:
+            self._deadline = time.monotonic() + self.deadline_seconds
+        summary = {"files": [], "unfinished": [], "failed": [], "rolled_back": []}
+        try:
+            with profile(self.profile_path):
+                for path in paths:
+                    for name, values in self.convert(path).items():
+                        summary[name].extend(values)
+            self._report()
+        finally:
+            self.reset()
+        return summary
+
+    def reset(self):
+        """Forget the results, usage, progress and budget spent of the previous calls,
+        keeping the clients, limiters, cache and the latest latency samples.
+        """
+        for results in [
+            self.changed_files,
+            self.unfinished,
+            self.failed,
+            self.rolled_back,
+        ]:
+            results.clear()
+        self._file_stamps.clear()
+        self._deferred_files.clear()
+        self._deadline = None
+        self.metrics.trim(_RESIDENT_SAMPLES)
+        self.usage.reset()
+        self.progress.reset()
+        if self.governor is not None:
+            self.governor = BudgetGovernor(self.governor.budget)
+
+    def convert_changed(
+        self, changed_lines: Dict[str, Set[int]]
+    ) -> Dict[str, List[str]]:
+        """Convert, in place, only the docstrings overlapping changed lines.
+
+        Args:
+            changed_lines: 1-indexed changed lines per file path, e.g. from the staged
+                           hunks of a commit
+
+        Returns:
+            The files written, the docstrings left unfinished or failed and the files
+            rolled back by this call.
+        """
+        return self._convert_and_summarize(
+            [(path, path) for path in changed_lines], changed_lines
+        )
+
+    def _convert_and_summarize(
+        self,
+        file_paths: List[Tuple[str, str]],
+        changed_lines: Optional[Dict[str, Set[int]]] = None,
+    ) -> Dict[str, List[str]]:
+        unfinished, failed = len(self.unfinished), len(self.failed)
+        changed, rolled_back = len(self.changed_files), len(self.rolled_back)
+        self._convert_files(file_paths, changed_lines)
+        return {
+            "files": self.changed_files[changed:],
+            "unfinished": self.unfinished[unfinished:],
+            "failed": self.failed[failed:],
+            "rolled_back": self.rolled_back[rolled_back:],
+        }
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional, Tuple
+
+_logger = logging.getLogger()
+
+DEFAULT_ADDRESS = "http://127.0.0.1:8765"
+
+
+class ConversionServer:
+    """
+    Local HTTP daemon keeping a `Run` resident, so its deploy clients, concurrency
+    limiters and prediction cache stay warm across conversions.
+
+    - GET /health: `{"status": "ok"}`
+    - POST /convert with `{"paths": [...]}`: converts each file or directory in place
+      and responds with the files written, the unfinished/failed docstrings and the
+      files rolled back.
+
+    Conversions are serialized so that two requests never write the same file at once.
+    The deadline, budget, profile and metrics output of the run apply to each request.
+    """
+
+    def __init__(self, run, host: str = "127.0.0.1", port: int = 8765):
+        self.run = run
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def convert(self, paths: List[str]) -> Dict[str, List[str]]:
+        with self._lock:
+            return self.run.convert_paths(paths)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                _logger.debug(format % args)
+
+            def _respond(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._respond(200, {"status": "ok"})
+                else:
+                    self._respond(404, {"error": f"Unknown path {self.path}."})
+
+            def do_POST(self):
+                if self.path != "/convert":
+                    self._respond(404, {"error": f"Unknown path {self.path}."})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    paths = json.loads(self.rfile.read(length))["paths"]
+                except (ValueError, KeyError, TypeError):
+                    self._respond(400, {"error": 'Expected a {"paths": [...]} body.'})
+                    return
+
+                missing = [p for p in paths if not os.path.exists(p)]
+                if missing:
+                    self._respond(404, {"error": f"Paths do not exist: {missing}."})
+                    return
+                try:
+                    self._respond(200, server.convert(paths))
+                except Exception as e:
+                    _logger.exception(f"Failed to convert {paths}.")
+                    self._respond(500, {"error": str(e)})
+
+        return Handler
+
+    def serve_forever(self):
+        _logger.info(f"Serving conversions on {self.address}")
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Host and port of an `http://host:port` address."""
+    host, _, port = address.removeprefix("http://").rstrip("/").rpartition(":")
+    return host, int(port)
+
+
+def convert_remote(
+    paths: List[str], address: str = DEFAULT_ADDRESS, timeout: Optional[float] = None
+) -> Dict[str, List[str]]:
+    """Ask a running `serve` daemon to convert `paths` (made absolute) in place."""
+    import requests
+
+    response = requests.post(
+        f"{address.rstrip('/')}/convert",
+        json={"paths": [os.path.abspath(p) for p in paths]},
+        timeout=timeout,
+    )
+    if response.status_code != 200:
+        raise RuntimeError(
+            f"Conversion server returned {response.status_code}: "
+            f"{response.json().get('error')}"
+        )
+    return response.json()
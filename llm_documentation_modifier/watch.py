@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Set
+
+from utils.doc_manipulation import get_docstrings_from_file
+from utils.general import get_file_paths_in_directory
+
+_logger = logging.getLogger()
+
+_DEBOUNCE_SECONDS = 0.5
+_POLL_INTERVAL_SECONDS = 0.25
+
+
+class PollingSource:
+    """Detect changed .py files by comparing their modification times and sizes."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, tuple]:
+        snapshot = {}
+        for path in get_file_paths_in_directory(self.directory, ".py"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changes(self) -> Set[str]:
+        snapshot = self._scan()
+        changed = {p for p, stamp in snapshot.items() if self._snapshot.get(p) != stamp}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class WatchdogSource:
+    """Collect .py file events from watchdog, which uses inotify on Linux."""
+
+    def __init__(self, directory: str):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self._lock = threading.Lock()
+        self._changed: Set[str] = set()
+        source = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                path = getattr(event, "dest_path", "") or event.src_path
+                if not event.is_directory and path.endswith(".py"):
+                    with source._lock:
+                        source._changed.add(path)
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), directory, recursive=True)
+        self._observer.start()
+
+    def changes(self) -> Set[str]:
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return changed
+
+    def close(self):
+        self._observer.stop()
+        self._observer.join()
+
+
+def make_source(directory: str, polling: bool = False):
+    """Watch `directory` with watchdog if it is installed, else by polling."""
+    if not polling:
+        try:
+            return WatchdogSource(directory)
+        except ImportError:
+            _logger.info("watchdog is not installed, polling for changes instead.")
+    return PollingSource(directory)
+
+
+def debounced_changes(
+    source,
+    stop: threading.Event,
+    debounce: float = _DEBOUNCE_SECONDS,
+    poll_interval: float = _POLL_INTERVAL_SECONDS,
+) -> Iterator[Set[str]]:
+    """Yield the files changed in each burst, once nothing changed for `debounce`s.
+
+    Files saved several times in a burst are only yielded once.
+    """
+    pending: Set[str] = set()
+    last_change = 0.0
+    while not stop.is_set():
+        changed = source.changes()
+        if changed:
+            pending |= changed
+            last_change = time.monotonic()
+        elif pending and time.monotonic() - last_change >= debounce:
+            yield pending
+            pending = set()
+        stop.wait(poll_interval)
+
+
+class DocstringTracker:
+    """
+    Texts of the sphinx-style docstrings already seen in each file, so that only new or
+    edited docstrings are sent after a save. A docstring is seen once it was sent, even
+    if its conversion failed, so saving a file never resends it unless it is edited.
+    """
+
+    def __init__(self, to_change_key: str = "function"):
+        self.to_change_key = to_change_key
+        self._seen: Dict[str, Set[str]] = {}
+        self._last_sent: Dict[str, Set[str]] = {}
+
+    def _docstrings(self, path: str):
+        try:
+            return get_docstrings_from_file(path, self.to_change_key)
+        except (SyntaxError, ValueError, UnicodeDecodeError) as e:
+            # Usually a half-written file; it is re-read on its next save
+            _logger.debug(f"Cannot parse {path} yet: {e}")
+            return None
+
+    def track(self, path: str):
+        docstrings = self._docstrings(path)
+        if docstrings is not None:
+            self._seen[path] = {d.text for d in docstrings}
+
+    def changed_lines(self, path: str) -> Set[int]:
+        """1-indexed lines of the unseen docstrings of `path`, marking them as seen."""
+        docstrings = self._docstrings(path)
+        if docstrings is None:
+            return set()
+
+        seen = self._seen.setdefault(path, set())
+        sent = self._last_sent[path] = set()
+        lines = set()
+        for d in docstrings:
+            if d.text not in seen:
+                sent.add(d.text)
+                lines.update(range(d.start_line_number, d.end_line_number + 1))
+        seen |= sent
+        return lines
+
+    def unsee_last(self, path: str):
+        """Send the docstrings last returned for `path` again after its next save."""
+        self._seen.get(path, set()).difference_update(self._last_sent.pop(path, set()))
+
+
+def watch(
+    run,
+    directory: str,
+    stop: Optional[threading.Event] = None,
+    polling: bool = False,
+    debounce: float = _DEBOUNCE_SECONDS,
+    poll_interval: float = _POLL_INTERVAL_SECONDS,
+):
+    """Convert new or edited docstrings of the .py files in `directory` as they are saved.
+
+    Docstrings present when watching starts are left alone. Each burst of saves is
+    converted in one `Run.convert_changed` call, and changes made meanwhile are
+    coalesced into the next one.
+
+    Args:
+        run: the `Run` converting the docstrings; it should have a cache
+        directory: directory to watch recursively
+        stop: event ending the watch; runs until interrupted if not given
+        polling: poll for changes even if watchdog is installed
+        debounce: seconds without changes that end a burst
+        poll_interval: seconds between checks for changes
+    """
+    stop = threading.Event() if stop is None else stop
+    tracker = DocstringTracker()
+    for path in get_file_paths_in_directory(directory, ".py"):
+        tracker.track(path)
+
+    source = make_source(directory, polling)
+    _logger.info(f"Watching {directory} for changed docstrings...")
+    try:
+        for paths in debounced_changes(source, stop, debounce, poll_interval):
+            changed_lines = {
+                path: lines
+                for path in sorted(paths)
+                if os.path.exists(path) and (lines := tracker.changed_lines(path))
+            }
+            if not changed_lines:
+                continue
+            summary = run.convert_changed(changed_lines)
+            for path in changed_lines:
+                # Files saved during their conversion are not written, retry them
+                if path in summary["unfinished"]:
+                    tracker.unsee_last(path)
+            _logger.info(
+                f"Patched {len(summary['files'])} files, "
+                f"{len(summary['unfinished']) + len(summary['failed'])} docstrings "
+                "left unchanged."
+            )
+    finally:
+        source.close()
@@ -0,0 +1,31 @@
+import copy
+from typing import List, Dict, Optional
+
+
+class FakeDeployClient:
+    """Stand-in for the mlflow deploy client that replays canned chat responses."""
+
+    def __init__(
+        self,
+        responses: Optional[List[str]] = None,
+        default: str = "",
+        usage: Optional[Dict] = None,
+    ):
+        self.responses = list(responses or [])
+        self.default = default
+        self.usage = usage
+        self.requests: List[Dict] = []
+
+    def predict(self, endpoint=None, inputs=None, timeout=None):
+        self.requests.append(
+            {"endpoint": endpoint, "inputs": copy.deepcopy(inputs), "timeout": timeout}
+        )
+        # With `n` completions requested, consecutive canned responses form the choices
+        choices = []
+        for _ in range((inputs or {}).get("n", 1)):
+            content = self.responses.pop(0) if self.responses else self.default
+            choices.append({"message": {"role": "assistant", "content": content}})
+        response = {"choices": choices}
+        if self.usage is not None:
+            response["usage"] = self.usage
+        return response
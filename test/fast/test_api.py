@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import utils.llm
+from llm_documentation_modifier.api import Converter
+from test.fakes import FakeDeployClient
+from test.fast.test_run import _SOURCE, _PREDICTED
+
+_OTHER = _SOURCE.replace("add", "plus").replace("Add", "Sum")
+
+
+################# Helpers #############
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeDeployClient(default=_PREDICTED)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    return client
+
+
+################# Tests #############
+def test_convert_returns_source_and_docstrings(fake_client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = Converter("uri", "gpt-4").convert(_SOURCE)
+
+    assert "    Args:\n        a: first number\n" in result.source
+    assert [d.start_line_number for d in result.docstrings] == [2]
+    assert result.docstrings[0].predicted_text == _PREDICTED
+    assert result.unfinished == result.failed == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_convert_batch_keeps_order(fake_client):
+    results = Converter("uri", "gpt-4").convert_batch([_OTHER, "x = 1\n", _SOURCE])
+
+    assert [len(r.docstrings) for r in results] == [1, 0, 1]
+    assert results[1].source == "x = 1\n"
+    assert "def plus" in results[0].source and "def add" in results[2].source
+
+
+def test_convert_reports_failures(fake_client):
+    # The prediction drops the placeholder of the elided code block
+    source = _SOURCE.replace(
+        "the sum\n", "the sum\n\n    .. code-block:: python\n\n        add(1, 2)\n"
+    )
+    result = Converter("uri", "gpt-4").convert(source)
+
+    assert result.source == source
+    assert result.failed == [2]
+
+
+def test_aconvert_multiplexes_one_client(fake_client):
+    converter = Converter("uri", "gpt-4")
+
+    async def convert_all():
+        first = await converter.aconvert(_SOURCE)
+        return [first] + await asyncio.gather(
+            converter.aconvert(_SOURCE), converter.aconvert_batch([_OTHER])
+        )
+
+    first, second, batch = asyncio.run(convert_all())
+    assert first.source == second.source
+    assert "Args:" in batch[0].source
+    # Repeated docstrings are answered from the shared cache
+    assert converter.run.metrics.counter("cache.hits") >= 1
+
+
+def test_converter_does_not_keep_state_of_finished_calls(fake_client):
+    converter = Converter("uri", "gpt-4")
+    source = _SOURCE.replace(
+        "the sum\n", "the sum\n\n    .. code-block:: python\n\n        add(1, 2)\n"
+    )
+    for _ in range(3):
+        assert converter.convert(source).failed == [2]
+        assert converter.convert(_OTHER).failed == []
+
+    run = converter.run
+    assert run.unfinished == run.failed == []
+    assert run.metrics.to_dict()["keys"] == {}
+    assert run.usage.files == run.usage.docstrings == {}
+    assert run.progress.snapshot().total == 0
+    assert run.usage.run.requests > 0
+
+
+def test_convert_discards_source_that_does_not_compile(monkeypatch):
+    client = FakeDeployClient(default='"""Add two numbers.""" x """"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    result = Converter("uri", "gpt-4").convert(_SOURCE)
+
+    assert result.rolled_back
+    assert result.source == _SOURCE
+    assert result.docstrings[0].predicted_text is None
@@ -0,0 +1,65 @@
+import threading
+
+from utils.budget import Budget, BudgetGovernor
+from utils.usage import Usage
+
+
+################# Helpers #############
+def docstring_usage(tokens: int = 100, requests: int = 3, cost: float = 0.01):
+    return Usage(prompt_tokens=tokens, requests=requests, cost=cost)
+
+
+################# Tests #############
+def test_budget_reports_first_exceeded_cap():
+    budget = Budget(max_tokens=100, max_cost=1.0)
+    assert budget
+    assert not Budget()
+    assert budget.exceeded_by(100, 50, 1.0) is None
+    assert budget.exceeded_by(101, 50, 2.0) == "max tokens (100)"
+    assert budget.exceeded_by(10, 50, 2.0) == "max cost (1.0 USD)"
+
+
+def test_governor_stops_when_next_docstring_would_exceed():
+    governor = BudgetGovernor(Budget(max_tokens=250))
+    assert governor.admit()
+    governor.release(docstring_usage())
+    assert governor.admit()
+    governor.release(docstring_usage())
+
+    assert not governor.admit()
+    assert governor.exhausted == "max tokens (250)"
+    assert governor.spent.total_tokens == 200
+
+
+def test_governor_admits_one_docstring_until_usage_is_known():
+    governor = BudgetGovernor(Budget(max_requests=100))
+    assert governor.admit()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(governor.admit()))
+    waiter.start()
+    waiter.join(timeout=0.1)
+    assert waiter.is_alive()
+
+    governor.release(docstring_usage())
+    waiter.join(timeout=5)
+    assert admitted == [True]
+
+
+def test_governor_waits_for_in_flight_docstrings_before_giving_up():
+    governor = BudgetGovernor(Budget(max_requests=9))
+    governor.admit()
+    governor.release(docstring_usage())
+    # 3 spent + 3 in flight + 3 for the next one
+    assert governor.admit()
+    assert governor.admit()
+    blocked = []
+    waiter = threading.Thread(target=lambda: blocked.append(governor.admit()))
+    waiter.start()
+    waiter.join(timeout=0.1)
+    assert waiter.is_alive()
+
+    governor.release(docstring_usage())
+    governor.release(docstring_usage())
+    waiter.join(timeout=5)
+    assert blocked == [False]
+    assert governor.exhausted == "max requests (9)"
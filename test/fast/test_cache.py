@@ -0,0 +1,59 @@
+from utils.cache import PredictionCache
+
+
+################# Tests #############
+def test_cache_hits_and_misses():
+    cache = PredictionCache(namespace="settings")
+    assert cache.get(":param x: y") is None
+    cache.put(":param x: y", '"""converted"""')
+    assert cache.get(":param x: y") == '"""converted"""'
+    assert cache.hit_rate() == 0.5
+
+
+def test_cache_namespaces_are_separate():
+    cache = PredictionCache(namespace="a")
+    cache.put("doc", "predicted")
+    assert PredictionCache(namespace="b").key("doc") != cache.key("doc")
+
+
+def test_cache_persists_to_disk(tmp_path):
+    path = tmp_path / "cache" / "predictions.jsonl"
+    PredictionCache(str(path), "settings").put("doc", "predicted")
+
+    reloaded = PredictionCache(str(path), "settings")
+    assert len(reloaded) == 1
+    assert reloaded.get("doc") == "predicted"
+    assert PredictionCache(str(path), "other").get("doc") is None
+
+
+def test_cache_skips_corrupt_lines(tmp_path):
+    path = tmp_path / "predictions.jsonl"
+    PredictionCache(str(path)).put("doc", "predicted")
+    with open(path, "a") as f:
+        f.write("{not json\n")
+
+    assert PredictionCache(str(path)).get("doc") == "predicted"
+
+
+def test_cache_records_failures(tmp_path):
+    path = tmp_path / "predictions.jsonl"
+    cache = PredictionCache(str(path), "settings")
+    assert cache.get_failure("doc") is None
+    cache.put_failure("doc", "malformed")
+    failure = cache.put_failure("doc", "still malformed")
+    assert (failure.reason, failure.attempts) == ("still malformed", 2)
+
+    reloaded = PredictionCache(str(path), "settings")
+    assert reloaded.failures == 1
+    assert reloaded.get_failure("doc") == failure
+    assert reloaded.get("doc") is None
+
+
+def test_cache_success_clears_failure(tmp_path):
+    path = tmp_path / "predictions.jsonl"
+    cache = PredictionCache(str(path))
+    cache.put_failure("doc", "malformed")
+    cache.put("doc", "predicted")
+    assert cache.get_failure("doc") is None
+
+    assert PredictionCache(str(path)).get_failure("doc") is None
@@ -0,0 +1,82 @@
+import os
+import subprocess
+
+import pytest
+from click.testing import CliRunner
+
+import utils.llm
+from cli import cli
+from test.fakes import FakeDeployClient
+from test.fast.test_run import _SOURCE, _PREDICTED
+
+
+################# Helpers #############
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeDeployClient(default=_PREDICTED)
+    monkeypatch.delenv("MLFLOW_DEPLOYMENT_PREDICT_TIMEOUT", raising=False)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    return client
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "test")
+    (tmp_path / "module.py").write_text(_SOURCE)
+    git("add", ".")
+    git("commit", "-q", "-m", "init")
+    monkeypatch.chdir(tmp_path)
+    return git
+
+
+################# Tests #############
+def test_cli_requires_read_file_path():
+    result = CliRunner().invoke(cli, ["--deploy-route-name", "gpt-4"])
+    assert result.exit_code != 0
+    assert "--read-file-path" in result.output
+
+
+def test_pre_commit_converts_staged_hunks(fake_client, repo, tmp_path):
+    other = _SOURCE.replace("add", "plus").replace("Add", "Sum")
+    (tmp_path / "module.py").write_text(_SOURCE + "\n\n" + other)
+    repo("add", "module.py")
+
+    result = CliRunner().invoke(
+        cli, ["--deploy-route-name", "gpt-4", "pre-commit", "--budget", "10"]
+    )
+
+    assert result.exit_code == 0, result.output
+    observed = (tmp_path / "module.py").read_text()
+    assert observed.count("    Args:\n") == 1
+    assert observed.index("Args:") > observed.index("def plus")
+    assert (tmp_path / ".git" / "llm-docstring-cache.jsonl").exists()
+    # Requests are bounded by the budget left, without changing the environment
+    assert "MLFLOW_DEPLOYMENT_PREDICT_TIMEOUT" not in os.environ
+    for request in fake_client.requests:
+        assert request["timeout"] <= 10 + utils.llm._CLIENT_TIMEOUT_GRACE_SECONDS
+
+
+def test_pre_commit_with_a_budget_cap(fake_client, repo, tmp_path):
+    other = _SOURCE.replace("add", "plus").replace("Add", "Sum")
+    (tmp_path / "two.py").write_text(_SOURCE + "\n\n" + other)
+    repo("add", "two.py")
+
+    result = CliRunner().invoke(
+        cli, ["--deploy-route-name", "gpt-4", "--max-requests", "4", "pre-commit"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "two.py").read_text().count("    Args:\n") == 1
+    assert "1 docstrings unfinished" in result.output
+    assert not (tmp_path / "llm-docstring-state.json").exists()
+
+
+def test_pre_commit_without_staged_files(fake_client, repo):
+    result = CliRunner().invoke(cli, ["--deploy-route-name", "gpt-4", "pre-commit"])
+    assert result.exit_code == 0
+    assert fake_client.requests == []
@@ -0,0 +1,210 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from requests import HTTPError, Response
+
+from utils.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    DaemonExecutor,
+    DeadlineExceeded,
+    get_status_code,
+    hedged_call,
+    is_overload_error,
+    remaining_time,
+    SingleFlight,
+    TokenBucket,
+)
+from utils.metrics import Metrics
+
+
+################# Helpers #############
+def http_error(status_code: int) -> HTTPError:
+    response = Response()
+    response.status_code = status_code
+    return HTTPError(f"{status_code} error", response=response)
+
+
+################# Tests #############
+def test_overload_classification():
+    assert get_status_code(http_error(429)) == 429
+    assert is_overload_error(http_error(429))
+    assert is_overload_error(http_error(503))
+    assert is_overload_error(TimeoutError())
+    assert not is_overload_error(http_error(400))
+    assert not is_overload_error(ValueError())
+
+
+def test_additive_increase():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=4)
+    for _ in range(4):
+        limiter.on_success(1.0)
+    assert limiter.limit == 3
+
+
+def test_multiplicative_decrease_on_throttle():
+    metrics = Metrics()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, metrics=metrics)
+    limiter.on_error(http_error(429))
+    assert limiter.limit == 4
+    limiter.on_error(http_error(400))
+    assert limiter.limit == 4
+    assert metrics.gauge("concurrency.limit") == 4
+
+
+def test_one_decrease_per_round_trip():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16)
+    started = time.perf_counter()
+    for _ in range(4):
+        limiter.on_error(http_error(429), started)
+    assert limiter.limit == 8
+
+    limiter.on_error(http_error(429), time.perf_counter())
+    assert limiter.limit == 4
+
+
+def test_decrease_on_latency_spike():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, latency_tolerance=2.0)
+    limiter.on_success(1.0)
+    limiter.on_success(5.0)
+    assert limiter.limit == 4
+
+
+def test_limit_bounds():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_limit=1)
+    limiter.on_error(http_error(500))
+    assert limiter.limit == 1
+    limiter.on_success(1.0)
+    assert limiter.limit == 1
+
+
+def test_slot_blocks_at_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def worker():
+        with limiter.slot():
+            acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.in_flight == 0
+
+
+def test_slot_reports_errors():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+    with pytest.raises(HTTPError):
+        with limiter.slot():
+            raise http_error(503)
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+
+
+def test_remaining_time():
+    assert remaining_time(None) is None
+    assert 0 < remaining_time(time.monotonic() + 10) <= 10
+    with pytest.raises(DeadlineExceeded):
+        remaining_time(time.monotonic() - 1)
+    assert not is_overload_error(DeadlineExceeded())
+
+
+def test_daemon_executor_does_not_block_exit():
+    started = threading.Event()
+    future = DaemonExecutor().submit(
+        lambda: started.set() or threading.current_thread()
+    )
+    assert started.wait(1)
+    assert future.result(timeout=1).daemon
+
+
+def test_hedged_call_abandons_daemon_call():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        hedged_call(DaemonExecutor(), lambda: time.sleep(5), timeout=0.05)
+    assert time.monotonic() - start < 1
+
+
+def test_hedged_call_times_out():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(TimeoutError):
+            hedged_call(executor, lambda: time.sleep(0.5), timeout=0.05)
+
+
+def test_hedged_call_first_answer_wins():
+    calls = []
+    hedges = []
+
+    def fn():
+        calls.append(None)
+        # Only the first call is slow
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        start = time.monotonic()
+        result = hedged_call(
+            executor, fn, hedge_after=0.05, on_hedge=lambda: hedges.append(None)
+        )
+        assert result == "fast"
+        assert time.monotonic() - start < 0.4
+    assert len(hedges) == 1
+
+
+def test_hedged_call_falls_back_to_other_attempt_on_error():
+    calls = []
+
+    def fn():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.1)
+            raise ValueError()
+        time.sleep(0.2)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert hedged_call(executor, fn, hedge_after=0.05) == "ok"
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two tokens are available at once, the other two take 1 / 20 seconds each
+    assert time.monotonic() - start >= 0.09
+
+
+def test_single_flight_shares_result():
+    single_flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda _: single_flight.do("key", slow), range(3)))
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert all(result == "result" for result, _ in results)
+
+
+def test_single_flight_shares_errors():
+    single_flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        single_flight.do("key", fail)
+    assert single_flight.do("key", lambda: "retried") == ("retried", False)
@@ -8,6 +8,10 @@ from utils.doc_manipulation import (
     _get_list_chunks_not_in_index,
     DocstringMap,
     _remove_docstrings_without_args_or_returns,
+    get_docstrings_from_file,
+    get_docstrings_from_source,
+    transform_file_lines,
+    transform_source,
 )
 
 _PMDARIMA_PATH = "./test/test_resources/pmdarima.py"
@@ -233,3 +237,13 @@ def test_remove_no_args_or_returns():
     docstring_map = [DocstringMap(text="Some docstring")]
     output = _remove_docstrings_without_args_or_returns(docstring_map)
     assert len(output) == 0
+
+
+def test_source_helpers_match_file_helpers(pmdarima_docs):
+    from_source = get_docstrings_from_source(pmdarima_docs, "function")
+    assert from_source == get_docstrings_from_file(_PMDARIMA_PATH, "function")
+
+    from_source[0].predicted_text = '"""\nConverted.\n"""'
+    assert transform_source(pmdarima_docs, from_source[:1]) == "".join(
+        transform_file_lines(_PMDARIMA_PATH, from_source[:1])
+    )
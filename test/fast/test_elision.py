@@ -0,0 +1,91 @@
+import pytest
+
+from utils.doc_manipulation import _get_docstrings_map
+from utils.elision import ElidedDocstring
+
+_PMDARIMA_PATH = "./test/test_resources/pmdarima.py"
+
+_DOCSTRING = """Description.
+
+:param x: Some param. For example:
+
+    .. code-block:: python
+        :caption: Example
+
+        import mlflow
+
+        print(mlflow.__version__)
+
+    More text.
+:return: Nothing.
+
+.. math::
+
+    x^2
+"""
+
+
+################# Helpers #############
+@pytest.fixture
+def pmdarima_docstrings():
+    with open(_PMDARIMA_PATH, "r") as f:
+        return list(_get_docstrings_map(f.read(), to_change_key="all"))
+
+
+################# Tests #############
+def test_elide_replaces_blocks():
+    elided = ElidedDocstring.from_text(_DOCSTRING)
+    assert len(elided.blocks) == 2
+    assert "import mlflow" not in elided.text
+    assert "    <<VERBATIM_0>>\n\n    More text." in elided.text
+    assert "\n<<VERBATIM_1>>\n" in elided.text
+    assert elided.blocks[0][:2] == [".. code-block:: python", "    :caption: Example"]
+
+
+def test_restore_round_trip():
+    elided = ElidedDocstring.from_text(_DOCSTRING)
+    assert elided.restore(elided.text) == _DOCSTRING
+
+
+def test_restore_reindents_to_placeholder():
+    elided = ElidedDocstring.from_text(_DOCSTRING)
+    predicted = (
+        "Args:\n    x: Some param. For example:\n\n        <<VERBATIM_0>>\n\n"
+        "<<VERBATIM_1>>"
+    )
+    restored = elided.restore(predicted)
+    assert "        .. code-block:: python\n            :caption: Example\n" in restored
+    assert "\n            print(mlflow.__version__)" in restored
+    assert restored.endswith(".. math::\n\n    x^2")
+
+
+@pytest.mark.parametrize(
+    "predicted",
+    [
+        "<<VERBATIM_0>>",
+        "<<VERBATIM_0>>\n<<VERBATIM_0>>\n<<VERBATIM_1>>",
+        "see <<VERBATIM_0>>\n<<VERBATIM_1>>",
+        "<<VERBATIM_0>>\n<<VERBATIM_1>>\n<<VERBATIM_2>>",
+    ],
+)
+def test_restore_rejects_bad_placeholders(predicted):
+    with pytest.raises(ValueError):
+        ElidedDocstring.from_text(_DOCSTRING).restore(predicted)
+
+
+def test_no_blocks_is_a_no_op():
+    elided = ElidedDocstring.from_text(":param x: y")
+    assert elided.blocks == []
+    assert elided.restore("anything") == "anything"
+
+
+def test_pmdarima_docstrings_round_trip(pmdarima_docstrings):
+    for docstring in pmdarima_docstrings:
+        elided = ElidedDocstring.from_text(docstring.text)
+        assert elided.restore(elided.text) == docstring.text
+
+
+def test_pmdarima_module_docstring_shrinks(pmdarima_docstrings):
+    module_docstring = pmdarima_docstrings[0].text
+    elided = ElidedDocstring.from_text(module_docstring)
+    assert len(elided.text) < len(module_docstring) / 3
@@ -0,0 +1,51 @@
+import subprocess
+
+import pytest
+
+from utils.git import parse_changed_lines, staged_changed_lines, staged_files
+
+_DIFF = """diff --git a/module.py b/module.py
+--- a/module.py
++++ b/module.py
+@@ -3 +3 @@ def add(a, b):
+-    old
++    new
+@@ -10,0 +11,2 @@ def plus(a, b):
++    added
++    added
+@@ -20,3 +22,0 @@ def minus(a, b):
+-    removed
+"""
+
+
+################# Helpers #############
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "test")
+    (tmp_path / "a.py").write_text("one\ntwo\nthree\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    git("add", ".")
+    git("commit", "-q", "-m", "init")
+    monkeypatch.chdir(tmp_path)
+    return git
+
+
+################# Tests #############
+def test_parse_changed_lines():
+    assert parse_changed_lines(_DIFF) == {3, 11, 12, 22}
+
+
+def test_staged_changed_lines(repo, tmp_path):
+    (tmp_path / "a.py").write_text("one\nTWO\nthree\nfour\n")
+    (tmp_path / "b.py").write_text("new\n")
+    (tmp_path / "notes.txt").write_text("changed\n")
+    (tmp_path / "unstaged.py").write_text("x\n")
+    repo("add", "a.py", "b.py", "notes.txt")
+
+    assert sorted(staged_files()) == ["a.py", "b.py"]
+    assert staged_changed_lines(["a.py", "b.py"]) == {"a.py": {2, 4}, "b.py": {1}}
@@ -0,0 +1,39 @@
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Set
+
+import pytest
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+_IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+\d+ \|\s*(\S+)$")
+# Importing mlflow alone took seconds, so heavy dependencies are only loaded when used
+_DEFERRED_MODULES = ["mlflow", "yaml", "requests"]
+
+
+################# Helpers #############
+def imported_modules(module: str) -> Set[str]:
+    """Every module imported by importing `module` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {
+        match.group(1)
+        for line in result.stderr.splitlines()
+        if (match := _IMPORT_TIME_PATTERN.match(line))
+    }
+
+
+################# Tests #############
+@pytest.mark.parametrize("module", ["cli", "utils", "llm_documentation_modifier"])
+def test_heavy_dependencies_are_deferred(module):
+    imported = imported_modules(module)
+    for deferred in _DEFERRED_MODULES:
+        assert not [
+            name for name in imported if name.split(".")[0] == deferred
+        ], f"Importing {module} imports {deferred}."
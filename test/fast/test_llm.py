@@ -0,0 +1,452 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from requests import HTTPError, Response
+
+import utils.llm
+from utils.llm import OpenAI, DocstringReformatContext, GatewayClient, TargetClient
+from utils.usage import Usage
+from utils.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    DeadlineExceeded,
+    is_transient_error,
+)
+from utils.routing import Router, parse_route
+from utils.validation import ConversionError
+from utils.memo import ParamMemo
+from utils.elision import PLACEHOLDER_RULE
+from test.fakes import FakeDeployClient
+from test.stub_gateway import StubGateway
+
+
+################# Helpers #############
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeDeployClient(["first", "second", '"""third"""'])
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    return client
+
+
+################# Tests #############
+def test_predict_runs_all_turns(fake_client):
+    llm = OpenAI("http://localhost:5000", "gpt-4")
+    assert llm.predict(":param x: some param") == '"""third"""'
+    assert len(fake_client.requests) == 3
+    assert all(r["endpoint"] == "gpt-4" for r in fake_client.requests)
+
+
+def test_predict_records_turn_latencies(fake_client):
+    llm = OpenAI("http://localhost:5000", "gpt-4")
+    llm.predict(":param x: some param")
+    assert set(llm.metrics.summary()) == {"llm.turn_1", "llm.turn_2", "llm.turn_3"}
+
+
+def test_predict_accumulates_reported_usage(monkeypatch):
+    client = FakeDeployClient(
+        default='"""done"""', usage={"prompt_tokens": 1000, "completion_tokens": 10}
+    )
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    llm = OpenAI("http://localhost:5000", "gpt-4")
+
+    usage = Usage()
+    llm.predict(":param x: some param", usage)
+    assert usage.requests == 3
+    assert usage.prompt_tokens == 3000
+    assert usage.completion_tokens == 30
+    assert usage.estimated_requests == 0
+    assert usage.cost == pytest.approx(3 * (1000 * 0.03 + 10 * 0.06) / 1000)
+    # The rules block is resent on every turn
+    assert 0 < usage.rules_tokens < usage.prompt_tokens
+
+
+def test_predict_estimates_missing_usage(fake_client):
+    llm = OpenAI("http://localhost:5000", "unpriced-route")
+    usage = Usage()
+    llm.predict(":param x: some param", usage)
+    assert usage.estimated_requests == 3
+    assert usage.prompt_tokens > 0
+    assert usage.cost == 0.0
+
+
+def test_context_without_compaction_keeps_history():
+    context = DocstringReformatContext(
+        docstring="doc", system_prompt="sys", rules="rules", request_to_llm="req"
+    )
+    context.increment_prompt()
+    context.increment_prompt(response="answer 1")
+    context.increment_prompt(response="answer 2")
+    contents = [m["content"] for m in context.messages]
+    assert contents[:4] == ["sys", context.rules_prompt, "req", "doc"]
+    assert "answer 1" in contents and "answer 2" in contents
+
+
+def test_context_latest_compaction():
+    context = DocstringReformatContext(
+        docstring="doc",
+        system_prompt="sys",
+        rules="rules",
+        request_to_llm="req",
+        rules_digest="digest",
+        compaction="latest",
+    )
+    context.increment_prompt()
+    assert len(context.messages) == 4
+
+    context.increment_prompt(response="answer 1")
+    context.increment_prompt(response="answer 2")
+    roles_and_contents = [(m["role"], m["content"]) for m in context.messages]
+    assert roles_and_contents[:3] == [
+        ("system", "sys"),
+        ("user", context.rules_digest_prompt),
+        ("assistant", "answer 2"),
+    ]
+    assert len(context.messages) == 4
+    assert context.rules_tokens() > 0
+
+
+def test_context_rejects_unknown_compaction():
+    with pytest.raises(AssertionError):
+        DocstringReformatContext(compaction="everything")
+
+
+def test_compaction_reduces_prompt_tokens(monkeypatch):
+    def total_prompt_tokens(compaction):
+        client = FakeDeployClient(default='"""' + "x" * 400 + '"""')
+        monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+        usage = Usage()
+        OpenAI("uri", "gpt-4", compaction=compaction).predict(":param x: y", usage)
+        return usage.prompt_tokens
+
+    assert total_prompt_tokens("latest") < total_prompt_tokens("none") * 0.6
+
+
+def test_chat_retries_overload_errors(fake_client, monkeypatch):
+    monkeypatch.setattr(utils.llm, "_RETRY_BACKOFF_SECONDS", 0.0)
+    response = Response()
+    response.status_code = 429
+    predict = fake_client.predict
+    calls = []
+
+    def flaky_predict(endpoint=None, inputs=None, timeout=None):
+        calls.append(endpoint)
+        if len(calls) == 1:
+            raise HTTPError("429", response=response)
+        return predict(endpoint=endpoint, inputs=inputs)
+
+    fake_client.predict = flaky_predict
+    llm = OpenAI("http://localhost:5000", "gpt-4")
+    assert llm.predict(":param x: y") == '"""third"""'
+    assert len(calls) == 4
+    assert llm.limiter.limit < 4
+
+
+def test_gateway_overload_reaches_the_limiter(monkeypatch):
+    monkeypatch.setattr(utils.llm, "_RETRY_BACKOFF_SECONDS", 0)
+    with StubGateway(status=429) as gateway:
+        llm = OpenAI(gateway.uri, "gpt-4")
+        with pytest.raises(HTTPError):
+            llm.predict(":param x: y")
+
+    # One request per attempt, none hidden behind mlflow's own retries
+    assert len(gateway.requests) == utils.llm._MAX_ATTEMPTS
+    assert llm.limiter.limit < 4
+
+
+def test_predict_request_timeout(fake_client, monkeypatch):
+    monkeypatch.setattr(utils.llm, "_RETRY_BACKOFF_SECONDS", 0.0)
+    fake_client.predict = lambda endpoint=None, inputs=None, timeout=None: time.sleep(
+        0.3
+    )
+    llm = OpenAI("http://localhost:5000", "gpt-4", request_timeout=0.05)
+    with pytest.raises(TimeoutError):
+        llm.predict(":param x: y")
+
+
+def test_timed_out_requests_waiting_for_a_slot_are_not_sent(fake_client, monkeypatch):
+    monkeypatch.setattr(utils.llm, "_MAX_ATTEMPTS", 1)
+    sent = []
+
+    def slow_predict(endpoint=None, inputs=None, timeout=None):
+        sent.append(None)
+        time.sleep(0.3)
+
+    fake_client.predict = slow_predict
+    llm = OpenAI(
+        "http://localhost:5000",
+        "gpt-4",
+        request_timeout=0.1,
+        limiter=AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1),
+    )
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(llm.predict, ":param x: y") for _ in range(4)]
+        for future in futures:
+            with pytest.raises(TimeoutError):
+                future.result()
+    sent_by_callers = len(sent)
+    time.sleep(1.0)
+
+    # Requests queued behind the slot when their caller gave up are dropped
+    assert len(sent) == sent_by_callers
+    assert llm.limiter.in_flight == 0
+
+
+def test_predict_passes_request_timeout_to_client(fake_client):
+    OpenAI("http://localhost:5000", "gpt-4", request_timeout=5).predict(":param x: y")
+    # The client times out shortly after the caller stops waiting, never before
+    for request in fake_client.requests:
+        assert 5 < request["timeout"] <= 5 + utils.llm._CLIENT_TIMEOUT_GRACE_SECONDS
+
+
+def test_gateway_client_timeout():
+    with StubGateway(default='"""x"""', delay=1.0) as gateway:
+        client = GatewayClient(gateway.uri)
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            client.predict("gpt-4", {"messages": []}, timeout=0.1)
+        assert time.monotonic() - start < 0.9
+
+
+def test_gateway_client_sends_mlflow_credentials(monkeypatch):
+    monkeypatch.setenv("MLFLOW_TRACKING_TOKEN", "secret")
+    with StubGateway(default='"""x"""') as gateway:
+        GatewayClient(gateway.uri).predict("gpt-4", {"messages": []})
+    assert gateway.requests[0]["headers"]["Authorization"] == "Bearer secret"
+
+
+def test_gateway_client_unreachable():
+    with pytest.raises(requests.ConnectionError) as e:
+        GatewayClient("http://127.0.0.1:1").predict("gpt-4", {"messages": []})
+    assert is_transient_error(e.value)
+
+
+def test_non_http_targets_use_the_mlflow_client(monkeypatch):
+    import mlflow.deployments
+
+    client = FakeDeployClient(default='"""x"""')
+    monkeypatch.setattr(mlflow.deployments, "get_deploy_client", lambda uri: client)
+    target_client = utils.llm.get_deploy_client("databricks")
+
+    assert isinstance(target_client, TargetClient)
+    target_client.predict("gpt-4", {"messages": []}, timeout=1)
+    assert client.requests[0]["endpoint"] == "gpt-4"
+
+
+def test_predict_past_deadline(fake_client):
+    llm = OpenAI("http://localhost:5000", "gpt-4")
+    with pytest.raises(DeadlineExceeded):
+        llm.predict(":param x: y", deadline=time.monotonic() - 1)
+    assert fake_client.requests == []
+
+
+def test_predict_hedges_slow_turns(fake_client):
+    llm = OpenAI("http://localhost:5000", "gpt-4", hedge_percentile=50)
+    for _ in range(10):
+        llm.metrics.record("llm.turn_1", 0.01)
+    predict = fake_client.predict
+    calls = []
+
+    in_flight = []
+
+    def slow_first_call(endpoint=None, inputs=None, timeout=None):
+        calls.append(None)
+        in_flight.append(llm.limiter.in_flight)
+        if len(calls) == 1:
+            time.sleep(0.3)
+        return predict(endpoint=endpoint, inputs=inputs)
+
+    fake_client.predict = slow_first_call
+    llm.predict(":param x: y")
+    assert llm.metrics.counter("llm.hedged") == 1
+    # The hedged duplicate held its own limiter slot
+    assert in_flight[1] == 2
+
+
+def test_predict_spreads_across_routes(monkeypatch):
+    clients = {
+        "http://a": FakeDeployClient(default='"""a"""'),
+        "http://b": FakeDeployClient(default='"""b"""'),
+    }
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: clients[uri])
+    router = Router(
+        [
+            parse_route("gpt-4@http://a", "http://a"),
+            parse_route("gpt-3.5-turbo@http://b", "http://a"),
+        ]
+    )
+    llm = OpenAI("http://a", "gpt-4", router=router)
+
+    def failing_predict(endpoint=None, inputs=None, timeout=None):
+        raise ConnectionError()
+
+    clients["http://a"].predict = failing_predict
+    usage = Usage()
+    assert llm.predict(":param x: y", usage) == '"""b"""'
+    assert clients["http://b"].requests[0]["endpoint"] == "gpt-3.5-turbo"
+    assert usage.cost > 0
+
+
+_VALID = '"""\nArgs:\n    x: some param\n"""'
+
+
+def test_cascade_keeps_valid_cheap_output(monkeypatch):
+    clients = {
+        "http://cheap": FakeDeployClient(default=_VALID),
+        "http://main": FakeDeployClient(default='"""main"""'),
+    }
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: clients[uri])
+    llm = OpenAI(
+        "http://main",
+        "gpt-4",
+        cascade_router=Router([parse_route("gpt-3.5-turbo", "http://cheap")]),
+    )
+
+    assert llm.predict(":param x: some param") == _VALID
+    assert clients["http://main"].requests == []
+    assert llm.escalation_rate() == 0.0
+
+
+def test_cascade_escalates_invalid_output(monkeypatch):
+    clients = {
+        "http://cheap": FakeDeployClient(default="not a docstring"),
+        "http://main": FakeDeployClient(default=_VALID),
+    }
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: clients[uri])
+    llm = OpenAI(
+        "http://main",
+        "gpt-4",
+        cascade_router=Router([parse_route("gpt-3.5-turbo", "http://cheap")]),
+    )
+
+    assert llm.predict(":param x: some param") == _VALID
+    assert len(clients["http://cheap"].requests) == 3
+    assert len(clients["http://main"].requests) == 3
+    assert llm.escalation_rate() == 1.0
+    assert "llm.cascade.turn_1" in llm.metrics.summary()
+
+
+def test_predict_elides_verbatim_blocks(monkeypatch):
+    client = FakeDeployClient(default='"""\nArgs:\n    x: y\n\n    <<VERBATIM_0>>\n"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    docstring = ":param x: y\n\n.. code-block:: python\n\n    print('elided')"
+
+    observed = OpenAI("uri", "gpt-4").predict(docstring)
+    assert observed == (
+        '"""\nArgs:\n    x: y\n\n    .. code-block:: python\n\n        print(\'elided\')\n"""'
+    )
+    sent = " ".join(m["content"] for m in client.requests[0]["inputs"]["messages"])
+    assert "print('elided')" not in sent
+    assert "<<VERBATIM_0>>" in sent
+
+
+def test_compacted_turns_keep_placeholder_rule(monkeypatch):
+    client = FakeDeployClient(default='"""\nArgs:\n    x: y\n\n    <<VERBATIM_0>>\n"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    docstring = ":param x: y\n\n.. code-block:: python\n\n    print('elided')"
+
+    OpenAI("uri", "gpt-4", compaction="latest").predict(docstring)
+    for request in client.requests:
+        sent = " ".join(m["content"] for m in request["inputs"]["messages"])
+        assert PLACEHOLDER_RULE in sent
+
+
+def test_predict_raises_when_placeholder_dropped(monkeypatch):
+    client = FakeDeployClient(default='"""\nArgs:\n    x: y\n"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    docstring = ":param x: y\n\n.. code-block:: python\n\n    print('elided')"
+
+    with pytest.raises(ConversionError):
+        OpenAI("uri", "gpt-4").predict(docstring)
+    assert OpenAI("uri", "gpt-4", elide_verbatim=False).predict(docstring)
+
+
+def test_predict_raises_when_output_is_unquoted(monkeypatch):
+    client = FakeDeployClient(default="Args:\n    x: y")
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+
+    with pytest.raises(ConversionError, match="triple quotes"):
+        OpenAI("uri", "gpt-4").predict(":param x: y")
+
+
+def test_predict_section_only(monkeypatch):
+    client = FakeDeployClient(default='"""\nArgs:\n    x: y\n"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    docstring = (
+        "A long description.\n\n:param x: y\n\n.. code-block:: python\n\n    f()"
+    )
+
+    observed = OpenAI("uri", "gpt-4", section_only=True).predict(docstring)
+    assert observed == (
+        '"""A long description.\n\nArgs:\n    x: y\n\n'
+        '.. code-block:: python\n\n    f()\n"""'
+    )
+    sent = [m["content"] for m in client.requests[0]["inputs"]["messages"]]
+    assert sent[-1] == ":param x: y"
+
+
+def test_predict_reuses_memoized_params(monkeypatch):
+    client = FakeDeployClient(
+        [
+            *(['"""\nArgs:\n    shared: the shared one\n    a: first\n"""'] * 3),
+            *(['"""\nArgs:\n    b: second\n"""'] * 3),
+        ]
+    )
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    llm = OpenAI("uri", "gpt-4", section_only=True, param_memo=ParamMemo())
+
+    first = llm.predict("Doc.\n\n:param shared: the shared one\n:param a: first")
+    assert first == '"""Doc.\n\nArgs:\n    shared: the shared one\n    a: first\n"""'
+
+    second = llm.predict("Other.\n\n:param b: second\n:param shared:  the shared one")
+    assert (
+        second == '"""Other.\n\nArgs:\n    b: second\n    shared: the shared one\n"""'
+    )
+    assert client.requests[3]["inputs"]["messages"][-1]["content"] == ":param b: second"
+    assert llm.param_memo.hit_rate() == 1 / 4
+
+
+def test_predict_memo_falls_back_on_unparseable_output(monkeypatch):
+    client = FakeDeployClient(default='"""\nArgs:\n    x: y\n"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    llm = OpenAI("uri", "gpt-4", section_only=True, param_memo=ParamMemo())
+
+    llm.predict(":param x: y\n:param z: w")
+    assert len(client.requests) == 6
+    assert llm.metrics.counter("memo.fallbacks") == 1
+
+
+def test_context_single_turn_merges_prompts():
+    context = DocstringReformatContext(
+        docstring=":param x: y",
+        system_prompt="system",
+        rules="rules",
+        request_to_llm="request",
+        rules_digest="digest",
+        single_turn=True,
+    )
+    assert len(context.prompts) == 1
+    assert context.prompts[0][-1][1].startswith("Only display the docstring")
+
+
+def test_predict_picks_valid_candidate(monkeypatch):
+    client = FakeDeployClient(["not a docstring", _VALID, '"""other"""'])
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    llm = OpenAI("uri", "gpt-4", candidates=3)
+
+    assert llm.predict(":param x: some param") == _VALID
+    assert len(client.requests) == 1
+    assert client.requests[0]["inputs"]["n"] == 3
+    assert client.requests[0]["inputs"]["temperature"] > 0
+    assert llm.metrics.counter("candidates.received") == 3
+    assert llm.metrics.counter("candidates.none_valid") == 0
+
+
+def test_predict_falls_back_to_least_invalid_candidate(monkeypatch):
+    least_invalid = '"""\nArgs:\n    y: z\n"""'
+    client = FakeDeployClient(["not a docstring", least_invalid])
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    llm = OpenAI("uri", "gpt-4", candidates=2)
+
+    assert llm.predict(":param x: some param") == least_invalid
+    assert llm.metrics.counter("candidates.none_valid") == 1
@@ -0,0 +1,74 @@
+import io
+import json
+import logging
+
+import pytest
+
+from utils.log import init_logger, _HANDLER_NAME
+
+
+################# Helpers #############
+@pytest.fixture(autouse=True)
+def restore_logger():
+    yield
+    init_logger()
+
+
+def own_handlers():
+    return [h for h in logging.getLogger().handlers if h.get_name() == _HANDLER_NAME]
+
+
+################# Tests #############
+def test_init_logger_is_idempotent():
+    stream = io.StringIO()
+    init_logger()
+    logger = init_logger(stream=stream)
+    logger.error("once")
+
+    assert len(own_handlers()) == 1
+    assert stream.getvalue().count("once") == 1
+
+
+def test_init_logger_verbosity():
+    stream = io.StringIO()
+    logger = init_logger(logging.WARNING, stream=stream)
+    logger.info("hidden")
+    logger.warning("shown")
+
+    assert "hidden" not in stream.getvalue()
+    assert "WARNING - shown" in stream.getvalue()
+
+
+def test_structured_logging_writes_json_lines():
+    stream = io.StringIO()
+    logger = init_logger(structured=True, stream=stream)
+    logger.info("hello %s", "world")
+    init_logger()  # Stops the listener, flushing the queue
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+
+
+def test_structured_logging_keeps_exceptions():
+    stream = io.StringIO()
+    logger = init_logger(structured=True, stream=stream)
+    try:
+        raise ValueError("bad value")
+    except ValueError:
+        logger.exception("conversion of %s failed", "module.py:2")
+    init_logger()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "conversion of module.py:2 failed"
+    assert entry["exception"].startswith("Traceback")
+    assert "ValueError: bad value" in entry["exception"]
+
+
+def test_large_messages_are_truncated():
+    stream = io.StringIO()
+    logger = init_logger(max_message_chars=10, stream=stream)
+    logger.info("x" * 25)
+
+    assert "x" * 10 + "... [15 more characters]" in stream.getvalue()
+    assert "x" * 11 not in stream.getvalue()
@@ -0,0 +1,14 @@
+from utils.memo import ParamMemo
+
+
+################# Tests #############
+def test_memo_hit_rate():
+    memo = ParamMemo()
+    assert memo.get("param:x") is None
+    memo.put("param:x", "x: converted")
+    assert memo.get("param:x") == "x: converted"
+    assert memo.get("param:x") == "x: converted"
+
+    assert len(memo) == 1
+    assert memo.hit_rate() == 2 / 3
+    assert memo.metrics.counter("memo.misses") == 1
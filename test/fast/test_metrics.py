@@ -0,0 +1,74 @@
+import json
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.metrics import Metrics, percentile, profile, profile_thread
+
+
+################# Tests #############
+def test_percentile_interpolates():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 100) == 5.0
+    assert percentile(values, 95) == pytest.approx(4.8)
+
+
+def test_percentile_empty():
+    assert percentile([], 99) == 0.0
+
+
+def test_metrics_summary_and_keys():
+    metrics = Metrics()
+    metrics.record("llm.turn_1", 1.0, key="a.py:1")
+    metrics.record("llm.turn_1", 3.0, key="a.py:1")
+    metrics.record("file.write", 0.5)
+
+    summary = metrics.summary()
+    assert summary["llm.turn_1"]["count"] == 2
+    assert summary["llm.turn_1"]["p50"] == 2.0
+    assert summary["file.write"]["max"] == 0.5
+    assert metrics.to_dict()["keys"] == {"a.py:1": {"llm.turn_1": 4.0}}
+
+
+def test_metrics_timer_records_on_error():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.timer("file.parse"):
+            raise ValueError()
+    assert len(metrics.samples("file.parse")) == 1
+
+
+def test_metrics_write_json(tmp_path):
+    metrics = Metrics()
+    metrics.record("docstring.predict", 2.0)
+    path = tmp_path / "metrics.json"
+    metrics.write_json(str(path), extra={"run": {"files": 1}})
+
+    observed = json.loads(path.read_text())
+    assert observed["stages"]["docstring.predict"]["p99"] == 2.0
+    assert observed["run"] == {"files": 1}
+    assert "docstring.predict" in metrics.format_table()
+
+
+def test_profile_dumps_stats(tmp_path):
+    path = tmp_path / "run.pstats"
+    with profile(str(path)):
+        sum(range(10))
+    assert path.exists()
+
+
+def _worker_task() -> int:
+    return sum(range(10))
+
+
+def test_profile_covers_worker_threads(tmp_path):
+    path = tmp_path / "run.pstats"
+    with profile(str(path)):
+        with ThreadPoolExecutor(max_workers=2, initializer=profile_thread) as executor:
+            assert list(executor.map(lambda _: _worker_task(), range(4))) == [45] * 4
+
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_worker_task" in functions
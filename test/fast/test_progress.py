@@ -0,0 +1,90 @@
+import io
+import logging
+import time
+
+from utils.progress import Progress, ProgressSnapshot
+
+
+################# Helpers #############
+class FakeTTY(io.StringIO):
+    def isatty(self):
+        return True
+
+
+################# Tests #############
+def test_snapshot_rates_and_eta():
+    snapshot = ProgressSnapshot(
+        done=10,
+        total=30,
+        elapsed=5.0,
+        tokens=1000,
+        in_flight=3,
+        cache_hit_rate=0.25,
+        errors=1,
+    )
+    assert snapshot.docstrings_per_second == 2.0
+    assert snapshot.tokens_per_second == 200.0
+    assert snapshot.eta == 10.0
+    assert snapshot.format() == (
+        "10 / 30 docstrings | 2.00 docstrings/s | 200 tokens/s | 3 in flight | "
+        "25% cache hits | 1 errors | ETA 0:00:10"
+    )
+
+
+def test_snapshot_without_progress_has_no_eta():
+    snapshot = ProgressSnapshot(0, 5, 1.0, 0, 0, None, 0)
+    assert snapshot.eta is None
+    assert snapshot.format().endswith("ETA ?")
+    assert "cache" not in snapshot.format()
+
+
+def test_progress_counts_concurrent_updates():
+    progress = Progress(tokens=lambda: 42, in_flight=lambda: 2, errors=lambda: 1)
+    progress.add_total(4)
+    for _ in range(3):
+        progress.advance()
+
+    snapshot = progress.snapshot()
+    assert (snapshot.done, snapshot.total) == (3, 4)
+    assert (snapshot.tokens, snapshot.in_flight, snapshot.errors) == (42, 2, 1)
+
+
+def test_progress_redraws_tty_line():
+    stream = FakeTTY()
+    progress = Progress(stream=stream)
+    progress.add_total(1)
+    with progress:
+        progress.advance()
+
+    assert stream.getvalue().startswith("\r\x1b[K1 / 1 docstrings")
+    assert stream.getvalue().endswith("\n")
+
+
+def test_progress_logs_periodically_without_tty(caplog):
+    caplog.set_level(logging.INFO)
+    progress = Progress(stream=io.StringIO(), log_interval=0.02)
+    progress.add_total(2)
+    with progress:
+        time.sleep(0.1)
+
+    lines = [r.message for r in caplog.records if r.message.startswith("Progress:")]
+    assert len(lines) >= 2
+    assert "0 / 2 docstrings" in lines[0]
+
+
+def test_log_lines_clear_the_tty_line():
+    stream = FakeTTY()
+    handler = logging.StreamHandler(stream)
+    logger = logging.getLogger()
+    logger.addHandler(handler)
+    progress = Progress(stream=stream)
+    progress.add_total(1)
+    try:
+        with progress:
+            progress._report()
+            logger.warning("retrying")
+    finally:
+        logger.removeHandler(handler)
+
+    assert "ETA ?\r\x1b[Kretrying\n" in stream.getvalue()
+    assert handler.stream is stream
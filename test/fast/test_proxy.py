@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from mlflow.deployments import get_deploy_client
+
+from llm_documentation_modifier.proxy import CachingProxy
+from test.stub_gateway import StubGateway
+
+_MESSAGES = [{"role": "user", "content": "convert me"}]
+
+
+################# Helpers #############
+@pytest.fixture
+def gateway():
+    with StubGateway(default='"""converted"""', delay=0.2) as gateway:
+        yield gateway
+
+
+@pytest.fixture
+def proxy(gateway):
+    proxy = CachingProxy(gateway.uri, port=0)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+    yield proxy
+    proxy.shutdown()
+
+
+def _invoke(proxy, **inputs):
+    return requests.post(
+        f"{proxy.address}/endpoints/gpt-4/invocations",
+        json={"messages": _MESSAGES, **inputs},
+    ).json()
+
+
+################# Tests #############
+def test_proxy_speaks_deploy_client_protocol(proxy):
+    client = get_deploy_client(proxy.address)
+    response = client.predict(
+        endpoint="gpt-4", inputs={"messages": _MESSAGES, "temperature": 0.0}
+    )
+    assert response["choices"][0]["message"]["content"] == '"""converted"""'
+
+
+def test_proxy_caches_temperature_zero(proxy, gateway):
+    first = _invoke(proxy, temperature=0.0)
+    assert _invoke(proxy, temperature=0.0) == first
+    assert len(gateway.requests) == 1
+    assert proxy.metrics.counter("cache.hits") == 1
+
+
+def test_proxy_forwards_sampled_requests(proxy, gateway):
+    _invoke(proxy, temperature=0.7)
+    _invoke(proxy, temperature=0.7)
+    assert len(gateway.requests) == 2
+
+
+def test_proxy_deduplicates_concurrent_requests(proxy, gateway):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(
+            executor.map(lambda _: _invoke(proxy, temperature=0.0), range(4))
+        )
+
+    assert all(r == responses[0] for r in responses)
+    assert len(gateway.requests) == 1
+    assert (
+        proxy.metrics.counter("proxy.deduplicated")
+        + proxy.metrics.counter("cache.hits")
+        == 3
+    )
+
+
+def test_proxy_passes_streams_through(proxy, gateway):
+    response = requests.post(
+        f"{proxy.address}/endpoints/gpt-4/invocations",
+        json={"messages": _MESSAGES, "stream": True},
+    )
+    assert "data: [DONE]" in response.text
+    assert gateway.requests[0]["inputs"]["stream"] is True
+
+
+def test_proxy_throttles_streams(gateway):
+    proxy = CachingProxy(gateway.uri, port=0, max_concurrency=1)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+
+    def stream(_):
+        return requests.post(
+            f"{proxy.address}/endpoints/gpt-4/invocations",
+            json={"messages": _MESSAGES, "stream": True},
+        ).text
+
+    try:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            responses = list(executor.map(stream, range(3)))
+    finally:
+        proxy.shutdown()
+
+    assert all("data: [DONE]" in r for r in responses)
+    assert proxy.metrics.counter("proxy.forwarded") == 3
+    assert proxy.metrics.to_dict()["gauges"]["concurrency.in_flight"]["max"] == 1
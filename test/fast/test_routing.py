@@ -0,0 +1,120 @@
+import pytest
+from requests import HTTPError, Response
+
+from utils.concurrency import DeadlineExceeded
+from utils.routing import Route, Router, parse_route
+
+
+################# Helpers #############
+def http_error(status_code: int) -> HTTPError:
+    response = Response()
+    response.status_code = status_code
+    return HTTPError(f"{status_code} error", response=response)
+
+
+################# Tests #############
+def test_parse_route():
+    route = parse_route("gpt-4:2.5@http://other:5000", "http://localhost:5000")
+    assert (route.name, route.weight, route.deploy_uri) == (
+        "gpt-4",
+        2.5,
+        "http://other:5000",
+    )
+
+    route = parse_route("gpt-3.5-turbo", "http://localhost:5000")
+    assert (route.name, route.weight, route.deploy_uri) == (
+        "gpt-3.5-turbo",
+        1.0,
+        "http://localhost:5000",
+    )
+
+
+def test_parse_route_requires_name():
+    with pytest.raises(ValueError):
+        parse_route(":2", "http://localhost:5000")
+
+
+def test_least_outstanding_respects_weights():
+    router = Router([Route("a", "uri", weight=2.0), Route("b", "uri", weight=1.0)])
+    chosen = [router.choose().name for _ in range(3)]
+    assert sorted(chosen) == ["a", "a", "b"]
+
+
+def test_latency_strategy_prefers_fast_route():
+    slow, fast = Route("slow", "uri", latency=5.0), Route("fast", "uri", latency=1.0)
+    router = Router([slow, fast], strategy="latency")
+    assert router.choose().name == "fast"
+
+
+def test_call_fails_over():
+    router = Router([Route("a", "uri"), Route("b", "uri")], cooldown_seconds=60)
+    tried = []
+
+    def fn(route):
+        tried.append(route.name)
+        if route.name == "a":
+            raise ConnectionError()
+        return route.name
+
+    assert router.call(fn) == "b"
+    assert tried == ["a", "b"]
+    # The failing route is in cooldown, so the next call goes straight to b
+    assert router.call(fn) == "b"
+    assert tried == ["a", "b", "b"]
+    assert router.metrics.counter("route.a.errors") == 1
+    assert all(r.outstanding == 0 for r in router.routes)
+
+
+def test_call_raises_when_all_routes_fail():
+    router = Router([Route("a", "uri"), Route("b", "uri")])
+
+    def fn(route):
+        raise ConnectionError(route.name)
+
+    with pytest.raises(ConnectionError, match="b"):
+        router.call(fn)
+
+
+def test_call_does_not_fail_over_past_deadline():
+    router = Router([Route("a", "uri"), Route("b", "uri")])
+    tried = []
+
+    def fn(route):
+        tried.append(route.name)
+        raise DeadlineExceeded()
+
+    with pytest.raises(DeadlineExceeded):
+        router.call(fn)
+    assert tried == ["a"]
+    assert router.routes[0].consecutive_failures == 0
+
+
+def test_call_does_not_fail_over_on_bad_requests():
+    router = Router([Route("a", "uri"), Route("b", "uri")])
+    tried = []
+
+    def fn(route):
+        tried.append(route.name)
+        raise http_error(400)
+
+    with pytest.raises(HTTPError):
+        router.call(fn)
+    assert tried == ["a"]
+    assert router.metrics.counter("route.a.errors") == 0
+    assert router.routes[0].consecutive_failures == 0
+
+
+def test_call_fails_over_on_server_errors():
+    router = Router([Route("a", "uri"), Route("b", "uri")])
+
+    def fn(route):
+        if route.name == "a":
+            raise http_error(503)
+        return route.name
+
+    assert router.call(fn) == "b"
+
+
+def test_routes_get_their_own_limiters():
+    router = Router([Route("a", "uri"), Route("b", "uri")])
+    assert router.routes[0].limiter is not router.routes[1].limiter
@@ -0,0 +1,344 @@
+import json
+import pstats
+import time
+
+import pytest
+
+import utils.llm
+from llm_documentation_modifier.run import Run
+from utils.doc_manipulation import get_docstrings_from_file
+from test.fakes import FakeDeployClient
+
+_SOURCE = '''def add(a, b):
+    """
+    Add two numbers.
+
+    :param a: first number
+    :param b: second number
+    :return: the sum
+    """
+    return a + b
+'''
+
+_PREDICTED = '''"""Add two numbers.
+
+Args:
+    a: first number
+    b: second number
+
+Returns:
+    the sum
+"""'''
+
+
+################# Helpers #############
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeDeployClient(default=_PREDICTED)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    return client
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text(_SOURCE)
+    return path
+
+
+################# Tests #############
+def test_run_rewrites_file(fake_client, source_file):
+    Run(str(source_file), None, "http://localhost:5000", "gpt-4").run()
+
+    observed = source_file.read_text()
+    assert '    """Add two numbers.\n' in observed
+    assert "    Args:\n        a: first number\n" in observed
+    assert ":param" not in observed
+    assert len(fake_client.requests) == 3
+
+
+def test_run_writes_metrics(fake_client, source_file, tmp_path):
+    metrics_out = tmp_path / "metrics.json"
+    profile_path = tmp_path / "run.pstats"
+    Run(
+        str(source_file),
+        None,
+        "http://localhost:5000",
+        "gpt-4",
+        profile_path=str(profile_path),
+        metrics_out=str(metrics_out),
+    ).run()
+
+    observed = json.loads(metrics_out.read_text())
+    for stage in ["file.parse", "file.write", "docstring.predict", "llm.turn_3"]:
+        assert stage in observed["stages"]
+    assert str(source_file) in observed["keys"]
+    assert observed["usage"]["run"]["requests"] == 3
+    assert str(source_file) in observed["usage"]["files"]
+    # Docstrings are converted on worker threads, which are profiled too
+    functions = {name for _, _, name in pstats.Stats(str(profile_path)).stats}
+    assert "_convert_docstring" in functions
+
+
+def test_run_deadline_leaves_file_untouched(fake_client, source_file):
+    run = Run(str(source_file), None, "http://localhost:5000", "gpt-4", deadline=0)
+    run.run()
+
+    assert source_file.read_text() == _SOURCE
+    assert fake_client.requests == []
+    assert run.unfinished == [f"{source_file}:2"]
+
+
+def test_run_converts_directory(fake_client, tmp_path):
+    paths = [tmp_path / "a.py", tmp_path / "b.py", tmp_path / "empty.py"]
+    for path in paths[:2]:
+        path.write_text(_SOURCE + "\n\n" + _SOURCE.replace("add", "plus"))
+    paths[2].write_text("x = 1\n")
+
+    run = Run(str(tmp_path), None, "uri", "gpt-4", schedule="file-priority")
+    run.run()
+
+    for path in paths[:2]:
+        assert path.read_text().count("    Args:\n") == 2
+    assert paths[2].read_text() == "x = 1\n"
+    assert len(fake_client.requests) == 12
+    assert set(run.metrics.to_dict()["keys"]) >= {str(p) for p in paths}
+
+
+def test_run_converts_only_changed_docstrings(fake_client, source_file):
+    source_file.write_text(_SOURCE + "\n\n" + _SOURCE.replace("add", "plus"))
+    # Line 15 is inside the docstring of `plus`
+    summary = Run(None, None, "uri", "gpt-4").run({str(source_file): {15}})
+
+    observed = source_file.read_text()
+    assert observed.count("    Args:\n") == 1
+    assert observed.index("Args:") > observed.index("def plus")
+    assert summary == {
+        "files": [str(source_file)],
+        "unfinished": [],
+        "failed": [],
+        "rolled_back": [],
+    }
+
+
+def test_run_skips_files_changed_during_conversion(monkeypatch, source_file):
+    class EditingClient(FakeDeployClient):
+        def predict(self, endpoint=None, inputs=None, timeout=None):
+            source_file.write_text(_SOURCE + "\n# edited meanwhile\n")
+            return super().predict(endpoint, inputs)
+
+    client = EditingClient(default=_PREDICTED)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    run = Run(str(source_file), None, "uri", "gpt-4")
+    run.run()
+
+    assert source_file.read_text() == _SOURCE + "\n# edited meanwhile\n"
+    assert run.unfinished == [str(source_file)]
+
+
+def test_run_skips_unchanged_files(fake_client, source_file, tmp_path):
+    untouched = tmp_path / "untouched.py"
+    untouched.write_text("x = 1\n")
+    run = Run(str(tmp_path), None, "uri", "gpt-4")
+    run.run()
+    assert run.changed_files == [str(source_file)]
+
+    stamps = {p: p.stat().st_mtime_ns for p in [source_file, untouched]}
+    run = Run(str(tmp_path), None, "uri", "gpt-4")
+    run.run()
+
+    assert run.changed_files == []
+    assert run.metrics.counter("files.unchanged") == 2
+    assert {p: p.stat().st_mtime_ns for p in stamps} == stamps
+
+
+def test_run_reports_progress(fake_client, source_file):
+    run = Run(str(source_file), None, "uri", "gpt-4")
+    run.run()
+
+    snapshot = run.progress.snapshot()
+    assert (snapshot.done, snapshot.total, snapshot.errors) == (1, 1, 0)
+    assert snapshot.tokens > 0
+    assert snapshot.cache_hit_rate is None
+
+
+def test_run_budget_defers_docstrings_and_resumes(fake_client, tmp_path):
+    directory = tmp_path / "package"
+    directory.mkdir()
+    for name in ["a", "b", "c"]:
+        (directory / f"{name}.py").write_text(_SOURCE)
+    state_path = tmp_path / "state.json"
+
+    run = Run(
+        str(directory),
+        None,
+        "http://localhost:5000",
+        "gpt-4",
+        max_requests=4,
+        state_path=str(state_path),
+    )
+    summary = run.run()
+
+    assert len(fake_client.requests) == 3
+    assert len(summary["files"]) == 1
+    assert len(summary["unfinished"]) == 2
+    state = json.loads(state_path.read_text())
+    assert state["reason"] == "max requests (4)"
+    assert state["usage"]["requests"] == 3
+    pending = sorted(x["read_path"] for x in state["files"])
+    assert set(pending) | set(summary["files"]) == {
+        str(directory / f"{name}.py") for name in ["a", "b", "c"]
+    }
+
+    other = tmp_path / "other.py"
+    other.write_text(_SOURCE)
+    Run(str(other), None, "uri", "gpt-4", state_path=str(state_path)).run()
+    # The state of another read path is neither resumed nor cleared
+    assert len(fake_client.requests) == 6
+    assert state_path.exists()
+
+    resumed = Run(
+        str(directory), None, "uri", "gpt-4", state_path=str(state_path)
+    ).run()
+
+    assert sorted(resumed["files"]) == pending
+    assert len(fake_client.requests) == 12
+    assert not state_path.exists()
+    for name in ["a", "b", "c"]:
+        assert ":param" not in (directory / f"{name}.py").read_text()
+
+
+def test_run_skips_known_failures(monkeypatch, source_file, tmp_path):
+    client = FakeDeployClient(default="Args:\n    a: first number")
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    cache_path = str(tmp_path / "cache.jsonl")
+
+    def run(**kwargs):
+        run = Run(
+            str(source_file), None, "uri", "gpt-4", cache_path=cache_path, **kwargs
+        )
+        assert len(run.run()["failed"]) == 1
+        return run
+
+    run()
+    assert len(client.requests) == 3
+
+    run()
+    assert len(client.requests) == 3
+
+    retried = run(retry_failures=True)
+    assert len(client.requests) == 6
+    failure = retried.cache.get_failure(
+        get_docstrings_from_file(str(source_file))[0].text
+    )
+    assert failure.attempts == 2
+    assert "triple quotes" in failure.reason
+    assert source_file.read_text() == _SOURCE
+
+
+@pytest.fixture
+def broken_client(monkeypatch):
+    client = FakeDeployClient(default='"""Add two numbers.""" x """"""')
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    return client
+
+
+def test_run_rolls_back_files_that_no_longer_compile(broken_client, tmp_path):
+    directory = tmp_path / "package"
+    directory.mkdir()
+    paths = [directory / f"{name}.py" for name in ["a", "b"]]
+    for path in paths:
+        path.write_text(_SOURCE)
+    stamps = {p: p.stat().st_mtime_ns for p in paths}
+
+    run = Run(str(directory), None, "uri", "gpt-4", cache=True)
+    summary = run.run()
+
+    assert summary["files"] == summary["failed"] == []
+    assert sorted(summary["rolled_back"]) == [str(p) for p in paths]
+    assert run.metrics.counter("files.rolled_back") == 2
+    # The files are never written
+    assert {p: p.stat().st_mtime_ns for p in paths} == stamps
+    # The predictions are evicted and recorded as failures, so they are not reused
+    docstring = get_docstrings_from_file(str(paths[0]))[0].text
+    assert run.cache.get(docstring) is None
+    assert "no longer compiles" in run.cache.get_failure(docstring).reason
+
+
+def test_run_blames_only_the_docstring_that_breaks_the_file(monkeypatch, source_file):
+    class BreakingClient(FakeDeployClient):
+        def predict(self, endpoint=None, inputs=None, timeout=None):
+            response = super().predict(endpoint, inputs)
+            if "Sum two numbers" in json.dumps(inputs):
+                response["choices"][0]["message"]["content"] = '"""Sum.""" x """"""'
+            return response
+
+    client = BreakingClient(default=_PREDICTED)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    other = _SOURCE.replace("add", "plus").replace("Add", "Sum")
+    source_file.write_text(_SOURCE + "\n\n" + other)
+
+    run = Run(str(source_file), None, "uri", "gpt-4", cache=True)
+    assert run.run()["rolled_back"] == [str(source_file)]
+
+    good, bad = [d.text for d in get_docstrings_from_file(str(source_file))]
+    assert run.cache.get(good) == _PREDICTED
+    assert run.cache.get_failure(good) is None
+    assert run.cache.get(bad) is None
+    assert f"{source_file}:13 no longer compiles" in run.cache.get_failure(bad).reason
+
+
+def test_run_does_not_create_file_that_does_not_compile(broken_client, source_file):
+    write_path = source_file.parent / "converted.py"
+    summary = Run(str(source_file), str(write_path), "uri", "gpt-4").run()
+
+    assert summary["rolled_back"] == [str(write_path)]
+    assert not write_path.exists()
+
+
+def test_run_without_write_verification(broken_client, source_file):
+    Run(str(source_file), None, "uri", "gpt-4", verify_writes=False).run()
+    assert source_file.read_text() != _SOURCE
+
+
+def test_run_stops_queued_jobs_on_unexpected_error(monkeypatch, tmp_path):
+    client = FakeDeployClient(default=_PREDICTED)
+
+    def bad_request(endpoint=None, inputs=None, timeout=None):
+        client.requests.append(inputs)
+        raise ValueError("bad request")
+
+    client.predict = bad_request
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    directory = tmp_path / "package"
+    directory.mkdir()
+    for i in range(8):
+        (directory / f"module_{i}.py").write_text(_SOURCE)
+
+    run = Run(str(directory), None, "uri", "gpt-4", max_concurrency=1)
+    with pytest.raises(ValueError):
+        run.run()
+    # Jobs picked up by the workers after the error are skipped
+    assert len(client.requests) == 1
+
+
+def test_run_leaves_jobs_after_deadline_untouched(monkeypatch, tmp_path):
+    client = FakeDeployClient(default=_PREDICTED)
+    calls = []
+
+    def slow_predict(endpoint=None, inputs=None, timeout=None):
+        calls.append(endpoint)
+        time.sleep(0.2)
+
+    client.predict = slow_predict
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    directory = tmp_path / "package"
+    directory.mkdir()
+    for i in range(3):
+        (directory / f"module_{i}.py").write_text(_SOURCE)
+
+    summary = Run(
+        str(directory), None, "uri", "gpt-4", max_concurrency=1, deadline=0.1
+    ).run()
+    assert len(calls) == 1
+    assert len(summary["unfinished"]) == 3
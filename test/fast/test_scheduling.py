@@ -0,0 +1,46 @@
+import pytest
+
+from utils.doc_manipulation import DocstringMap
+from utils.scheduling import Job, order_jobs
+
+
+################# Helpers #############
+def _job(file_path: str, size: int) -> Job:
+    return Job(file_path, DocstringMap(text=":param x: " + "y" * size))
+
+
+def _sizes(jobs):
+    return [
+        (job.file_path, len(job.docstring.text) - len(":param x: ")) for job in jobs
+    ]
+
+
+_JOBS = [_job("a.py", 10), _job("a.py", 400), _job("b.py", 40), _job("b.py", 20)]
+
+
+################# Tests #############
+def test_order_jobs_fifo():
+    assert order_jobs(_JOBS, "fifo") == _JOBS
+
+
+def test_order_jobs_longest_first():
+    assert _sizes(order_jobs(_JOBS, "longest-first")) == [
+        ("a.py", 400),
+        ("b.py", 40),
+        ("b.py", 20),
+        ("a.py", 10),
+    ]
+
+
+def test_order_jobs_file_priority():
+    assert _sizes(order_jobs(_JOBS, "file-priority")) == [
+        ("b.py", 40),
+        ("b.py", 20),
+        ("a.py", 400),
+        ("a.py", 10),
+    ]
+
+
+def test_order_jobs_rejects_unknown_schedule():
+    with pytest.raises(AssertionError):
+        order_jobs(_JOBS, "random")
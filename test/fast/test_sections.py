@@ -0,0 +1,120 @@
+import pytest
+
+from utils.doc_manipulation import _get_docstrings_map
+from utils.sections import (
+    DocstringSections,
+    Field,
+    assemble_google_fields,
+    parse_google_fields,
+    split_fields,
+)
+
+_PMDARIMA_PATH = "./test/test_resources/pmdarima.py"
+
+_DOCSTRING = """Load a model.
+
+More description.
+
+:param model_uri: The location of the model. For example:
+
+                  - ``/Users/me/path/to/local/model``
+
+                  For more information, see the docs.
+:param dst_path: The local path.
+
+:return: A model instance
+
+.. code-block:: python
+
+    load_model("uri")
+"""
+
+
+################# Helpers #############
+@pytest.fixture
+def pmdarima_docstrings():
+    with open(_PMDARIMA_PATH, "r") as f:
+        return list(_get_docstrings_map(f.read(), to_change_key="all"))
+
+
+################# Tests #############
+def test_split_sections():
+    sections = DocstringSections.from_text(_DOCSTRING)
+    assert sections.head == "Load a model.\n\nMore description."
+    assert sections.fields.startswith(":param model_uri:")
+    assert "For more information, see the docs." in sections.fields
+    assert sections.fields.endswith(":return: A model instance")
+    assert sections.tail == '.. code-block:: python\n\n    load_model("uri")'
+
+
+def test_no_fields():
+    assert DocstringSections.from_text("Just a description.") is None
+
+
+def test_fields_only():
+    sections = DocstringSections.from_text(":param x: y\n:return: z")
+    assert sections.head == ""
+    assert sections.tail == ""
+    assert sections.splice('"""\nArgs:\n    x: y\n"""') == '"""Args:\n    x: y\n"""'
+
+
+def test_splice():
+    sections = DocstringSections.from_text(_DOCSTRING)
+    observed = sections.splice('"""\nArgs:\n    model_uri: x\n\nReturns:\n    y\n"""')
+    assert observed == (
+        '"""Load a model.\n\nMore description.\n\nArgs:\n    model_uri: x\n\n'
+        'Returns:\n    y\n\n.. code-block:: python\n\n    load_model("uri")\n"""'
+    )
+
+
+def test_pmdarima_fields_are_much_smaller(pmdarima_docstrings):
+    load_model = pmdarima_docstrings[5]
+    sections = DocstringSections.from_text(load_model.text)
+    assert sections.fields.startswith(":param model_uri:")
+    assert sections.fields.endswith(":return: A ``pmdarima`` model instance")
+    assert len(sections.fields) < len(load_model.text) / 3
+
+
+def test_split_fields_groups_types():
+    fields = split_fields(
+        ":param x: desc\n    more\n:type x: int\n:param y: other\n:return: r\n:rtype: str"
+    )
+    assert [(f.kind, f.name) for f in fields] == [
+        ("param", "x"),
+        ("param", "y"),
+        ("return", None),
+    ]
+    assert fields[0].text == ":param x: desc\n    more\n:type x: int"
+    assert fields[2].text == ":return: r\n:rtype: str"
+
+
+def test_split_fields_rejects_unknown_fields():
+    assert split_fields(":param x: y\n:raises ValueError: z") is None
+
+
+def test_field_key_normalizes_whitespace():
+    a = Field("param", "x", ":param x: some\n      description")
+    b = Field("param", "x", ":param x:  some description")
+    assert a.key == b.key
+
+
+def test_parse_and_assemble_google_fields():
+    converted = (
+        '"""\nArgs:\n    x: desc\n        more\n    y (optional): other\n\n'
+        'Returns:\n    thing\n"""'
+    )
+    entries = parse_google_fields(converted)
+    assert entries == {
+        ("param", "x"): "x: desc\n    more",
+        ("param", "y"): "y (optional): other",
+        ("return", None): "thing",
+    }
+
+    fields = [
+        Field("param", "y", ""),
+        Field("param", "x", ""),
+        Field("return", None, ""),
+    ]
+    assert assemble_google_fields(fields, entries) == (
+        "Args:\n    y (optional): other\n    x: desc\n        more\n\nReturns:\n    thing"
+    )
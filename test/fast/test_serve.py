@@ -0,0 +1,122 @@
+import json
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+import utils.llm
+from cli import cli
+from llm_documentation_modifier.run import Run
+from llm_documentation_modifier.serve import (
+    ConversionServer,
+    convert_remote,
+    parse_address,
+)
+from test.fakes import FakeDeployClient
+from test.fast.test_run import _SOURCE, _PREDICTED
+
+
+################# Helpers #############
+@pytest.fixture
+def serve(monkeypatch):
+    """Start a server of a Run built with the given keyword arguments."""
+    client = FakeDeployClient(default=_PREDICTED)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    servers = []
+
+    def start(**run_kwargs) -> ConversionServer:
+        server = ConversionServer(
+            Run(None, None, "uri", "gpt-4", cache=True, **run_kwargs), port=0
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def server(serve):
+    return serve()
+
+
+################# Tests #############
+def test_parse_address():
+    assert parse_address("http://127.0.0.1:8765/") == ("127.0.0.1", 8765)
+
+
+def test_server_converts_and_caches(server, tmp_path):
+    paths = [tmp_path / "a.py", tmp_path / "b.py"]
+    for path in paths:
+        path.write_text(_SOURCE)
+
+    first = convert_remote([str(paths[0])], server.address)
+    second = convert_remote([str(paths[1])], server.address)
+
+    assert first == {
+        "files": [str(paths[0])],
+        "unfinished": [],
+        "failed": [],
+        "rolled_back": [],
+    }
+    assert second["files"] == [str(paths[1])]
+    assert all("    Args:\n" in path.read_text() for path in paths)
+    # The second file is served from the warm cache
+    assert server.run.metrics.counter("route.gpt-4.requests") == 3
+    assert server.run.cache.hit_rate() == 0.5
+
+
+def test_server_rejects_missing_paths(server, tmp_path):
+    with pytest.raises(RuntimeError, match="404"):
+        convert_remote([str(tmp_path / "missing.py")], server.address)
+
+
+def test_server_forgets_the_results_of_each_request(server, tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text(_SOURCE)
+
+    convert_remote([str(path)], server.address)
+
+    run = server.run
+    assert run.changed_files == [] and run.unfinished == [] and run._file_stamps == {}
+    assert run.usage.docstrings == {} and run.usage.run.requests == 0
+    assert run.metrics.to_dict()["keys"] == {}
+    assert run.progress.snapshot().total == 0
+    # Latency samples are kept to compute the hedge delays of the next requests
+    assert run.metrics.samples("docstring.predict")
+
+
+def test_server_applies_the_budget_per_request(serve, tmp_path):
+    server = serve(max_requests=1)
+    paths = [tmp_path / "a.py", tmp_path / "b.py"]
+    paths[0].write_text(_SOURCE)
+    # Not served from the cache, which would bypass the budget
+    paths[1].write_text(_SOURCE.replace("Add two", "Sum two"))
+
+    summaries = [convert_remote([str(path)], server.address) for path in paths]
+
+    assert [summary["files"] for summary in summaries] == [[str(p)] for p in paths]
+
+
+def test_server_writes_the_profile_and_metrics_of_each_request(serve, tmp_path):
+    profile_path, metrics_path = tmp_path / "run.pstats", tmp_path / "metrics.json"
+    server = serve(profile_path=str(profile_path), metrics_out=str(metrics_path))
+    paths = [tmp_path / "a.py", tmp_path / "b.py"]
+    for path in paths:
+        path.write_text(_SOURCE)
+
+    for path in paths:
+        convert_remote([str(path)], server.address)
+        assert json.loads(metrics_path.read_text())["changed_files"] == [str(path)]
+    assert profile_path.exists()
+
+
+def test_serve_rejects_state_path():
+    result = CliRunner().invoke(
+        cli, ["--deploy-route-name", "gpt-4", "--state-path", "state.json", "serve"]
+    )
+
+    assert result.exit_code != 0
+    assert "--state-path is not supported by serve" in result.output
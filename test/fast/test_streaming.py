@@ -0,0 +1,52 @@
+import pytest
+
+from utils.llm import OpenAI
+from utils.streaming import stream_chat
+from utils.validation import IncrementalValidator, validate_conversion
+from test.stub_gateway import StubGateway
+
+_VALID = '"""\nArgs:\n    x: some param\n"""'
+
+
+################# Tests #############
+def test_stream_chat_yields_deltas():
+    with StubGateway(default="hello world", chunk_size=3) as gateway:
+        chunks = list(stream_chat(gateway.uri, "gpt-4", {"messages": []}))
+
+    assert chunks == ["hel", "lo ", "wor", "ld"]
+    assert gateway.requests[0]["path"] == "/endpoints/gpt-4/invocations"
+    assert gateway.requests[0]["inputs"]["stream"] is True
+
+
+def test_incremental_validator_stops_at_closing_quotes():
+    validator = IncrementalValidator(":param x: some param")
+    assert not validator.feed('Sure:\n"""\nArgs:\n')
+    assert validator.feed('    x: some param\n"""\nHope this helps!')
+    assert validator.text == "Sure:\n" + _VALID
+    assert validator.feed("more chatter")
+    assert validator.text == "Sure:\n" + _VALID
+
+
+def test_incremental_validator_checks_completed_lines():
+    validator = IncrementalValidator("original", max_line_length=10)
+    validator.feed('"""\n' + "x" * 20)
+    assert validator.errors == []
+    validator.feed('\n"""')
+    assert len(validator.errors) == 1
+    assert validator.result() == validate_conversion("original", validator.text, 10)
+
+
+def test_predict_streams_and_drops_trailing_chatter():
+    responses = ["first", "second", _VALID + "\nLet me know if you need more."]
+    with StubGateway(responses, chunk_size=2) as gateway:
+        llm = OpenAI(gateway.uri, "gpt-4", stream=True)
+        assert llm.predict(":param x: some param") == _VALID
+
+    assert len(gateway.requests) == 3
+    assert all(r["inputs"]["stream"] for r in gateway.requests)
+    assert llm.metrics.counter("stream.closed_early") == 1
+
+
+def test_stream_rejects_candidates():
+    with pytest.raises(AssertionError, match="Streaming"):
+        OpenAI("http://localhost:5000", "gpt-4", stream=True, candidates=2)
@@ -0,0 +1,60 @@
+import pytest
+
+from utils.usage import (
+    Usage,
+    UsageTracker,
+    estimate_tokens,
+    estimate_message_tokens,
+    load_price_table,
+)
+
+
+################# Tests #############
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_estimate_message_tokens():
+    messages = [{"role": "user", "content": "abcd"}, {"role": "user", "content": ""}]
+    assert estimate_message_tokens(messages) == 4 + 1 + 4
+
+
+def test_usage_from_reported_response():
+    response = {"usage": {"prompt_tokens": 1000, "completion_tokens": 500}}
+    usage = Usage.from_response(response, [], "ignored", price=(0.01, 0.02))
+    assert usage.total_tokens == 1500
+    assert usage.estimated_requests == 0
+    assert usage.cost == pytest.approx(0.02)
+
+
+def test_usage_from_response_without_usage():
+    messages = [{"role": "user", "content": "a" * 40}]
+    usage = Usage.from_response({}, messages, "b" * 8, rules_tokens=3)
+    assert usage.prompt_tokens == 14
+    assert usage.completion_tokens == 2
+    assert usage.estimated_requests == 1
+    assert usage.rules_tokens == 3
+
+
+def test_usage_tracker_aggregates():
+    tracker = UsageTracker()
+    tracker.add(Usage(prompt_tokens=10, requests=1), "a.py", "a.py:1")
+    tracker.add(Usage(prompt_tokens=5, requests=1), "a.py", "a.py:9")
+    tracker.add(Usage(prompt_tokens=1, requests=1), "b.py", "b.py:1")
+
+    observed = tracker.to_dict()
+    assert observed["run"]["prompt_tokens"] == 16
+    assert observed["files"]["a.py"]["requests"] == 2
+    assert observed["docstrings"]["a.py:9"]["prompt_tokens"] == 5
+    assert "total tokens:      16" in tracker.format_totals()
+
+
+def test_load_price_table_override(tmp_path):
+    path = tmp_path / "prices.yaml"
+    path.write_text("gpt-4:\n  prompt: 0.1\n  completion: 0.2\n")
+    prices = load_price_table(str(path))
+    assert prices["gpt-4"] == (0.1, 0.2)
+    assert "gpt-3.5-turbo" in prices
@@ -1,4 +1,4 @@
-from utils.general import get_file_paths_in_directory
+from utils.general import get_file_paths_in_directory, lines_are_equal
 
 
 def test_empty_directory(tmp_path):
@@ -32,3 +32,12 @@ def test_directory_with_py_files(tmp_path):
 
     assert len(py_files) == 2
     assert all(file.endswith(".py") for file in py_files)
+
+
+def test_lines_are_equal():
+    assert lines_are_equal(["a\n", "  b\n"], ["a\n", "b\n"])
+    assert not lines_are_equal(
+        ["a\n", "  b\n"], ["a\n", "b\n"], ignore_whitespace=False
+    )
+    assert lines_are_equal(["a\n"], ["a\n"], ignore_whitespace=False)
+    assert not lines_are_equal(["a\n"], ["a\n", "b\n"])
@@ -0,0 +1,74 @@
+from utils.validation import (
+    check_source_syntax,
+    get_param_names,
+    strip_triple_quotes,
+    validate_conversion,
+)
+
+_ORIGINAL = """Load a model.
+
+:param model_uri: The location of the model.
+:param dst_path: The local path.
+:return: A model instance
+"""
+
+_CONVERTED = '''"""
+Load a model.
+
+Args:
+    model_uri: The location of the model.
+    dst_path: The local path.
+
+Returns:
+    A model instance
+"""'''
+
+
+################# Tests #############
+def test_get_param_names():
+    docstring = ":param a: x\n    :param str b: y\n:param **kwargs: z\n:type a: int"
+    assert get_param_names(docstring) == ["a", "b", "**kwargs"]
+
+
+def test_strip_triple_quotes():
+    assert strip_triple_quotes('  """\ntext\n"""  ') == "\ntext\n"
+
+
+def test_valid_conversion():
+    assert validate_conversion(_ORIGINAL, _CONVERTED).ok
+
+
+def test_missing_triple_quotes():
+    result = validate_conversion(_ORIGINAL, _CONVERTED.strip('"'))
+    assert not result.ok
+    assert "triple quotes" in result.errors[0]
+
+
+def test_missing_parameter():
+    predicted = _CONVERTED.replace("    dst_path: The local path.\n", "")
+    result = validate_conversion(_ORIGINAL, predicted)
+    assert result.errors == ["Parameter 'dst_path' is missing from the output."]
+
+
+def test_missing_sections_and_leftover_fields():
+    predicted = '"""\nLoad a model.\n\n:param model_uri: x\n"""'
+    errors = " ".join(validate_conversion(_ORIGINAL, predicted).errors)
+    assert "sphinx" in errors
+    assert "Args" in errors
+    assert "Returns" in errors
+
+
+def test_line_length():
+    long_line = "    dst_path: " + "word " * 30
+    predicted = _CONVERTED.replace("    dst_path: The local path.", long_line)
+    assert not validate_conversion(_ORIGINAL, predicted).ok
+
+    # Long lines carried over from the original are allowed
+    original = _ORIGINAL + "\n" + long_line.strip()
+    assert validate_conversion(original, predicted).ok
+
+
+def test_check_source_syntax():
+    assert check_source_syntax('def f():\n    """Doc."""\n') is None
+    error = check_source_syntax('def f():\n    """Doc.""" x\n', "module.py")
+    assert error.startswith("SyntaxError") and "module.py" in error
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+import utils.llm
+from llm_documentation_modifier.run import Run
+from llm_documentation_modifier.watch import (
+    DocstringTracker,
+    PollingSource,
+    debounced_changes,
+    watch,
+)
+from test.fakes import FakeDeployClient
+from test.fast.test_run import _SOURCE, _PREDICTED
+
+_PLUS = _SOURCE.replace("add", "plus").replace("Add", "Sum")
+
+
+################# Helpers #############
+class ScriptedSource:
+    def __init__(self, changes):
+        self._changes = list(changes)
+
+    def changes(self):
+        return self._changes.pop(0) if self._changes else set()
+
+
+def wait_for(condition, timeout: float = 5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "Timed out waiting for the watcher."
+        time.sleep(0.05)
+
+
+################# Tests #############
+def test_debounced_changes_coalesces_bursts():
+    stop = threading.Event()
+    source = ScriptedSource([{"a.py"}, {"a.py"}, {"b.py"}, set(), set(), {"c.py"}])
+    batches = debounced_changes(source, stop, debounce=0.02, poll_interval=0.01)
+
+    assert next(batches) == {"a.py", "b.py"}
+    assert next(batches) == {"c.py"}
+
+
+def test_polling_source_detects_changes(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text("x = 1\n")
+    source = PollingSource(str(tmp_path))
+    assert source.changes() == set()
+
+    path.write_text("x = 22\n")
+    (tmp_path / "notes.txt").write_text("ignored")
+    assert source.changes() == {str(path)}
+
+
+def test_tracker_returns_only_edited_docstrings(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text(_SOURCE)
+    tracker = DocstringTracker()
+    tracker.track(str(path))
+    assert tracker.changed_lines(str(path)) == set()
+
+    path.write_text(_SOURCE + "\n\n" + _PLUS)
+    # The docstring of `plus` spans lines 13 to 19
+    assert tracker.changed_lines(str(path)) == set(range(13, 20))
+    assert tracker.changed_lines(str(path)) == set()
+
+    tracker.unsee_last(str(path))
+    assert tracker.changed_lines(str(path)) == set()
+
+
+def test_tracker_ignores_unparseable_files(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text("def broken(:\n")
+    assert DocstringTracker().changed_lines(str(path)) == set()
+
+
+def test_watch_patches_saved_docstrings(monkeypatch, tmp_path):
+    client = FakeDeployClient(default=_PREDICTED)
+    monkeypatch.setattr(utils.llm, "get_deploy_client", lambda uri: client)
+    path = tmp_path / "module.py"
+    path.write_text(_SOURCE)
+
+    stop = threading.Event()
+    run = Run(None, None, "uri", "gpt-4", cache=True)
+    thread = threading.Thread(
+        target=watch,
+        args=(run, str(tmp_path), stop),
+        kwargs={"polling": True, "debounce": 0.05, "poll_interval": 0.02},
+    )
+    thread.start()
+    try:
+        time.sleep(0.1)
+        path.write_text(_SOURCE + "\n\n" + _PLUS)
+        wait_for(lambda: "Args:" in path.read_text())
+    finally:
+        stop.set()
+        thread.join()
+
+    observed = path.read_text()
+    # Only the new docstring of `plus` was sent; `add` existed before watching
+    assert observed.index("Args:") > observed.index("def plus")
+    assert len(client.requests) == 3
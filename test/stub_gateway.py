@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional
+
+
+class StubGateway:
+    """
+    Local HTTP server speaking the MLflow gateway chat API, replaying canned responses.
+
+    Streaming requests get the content as server-sent events of `chunk_size` characters
+    followed by `data: [DONE]`. Each response is delayed by `delay` seconds. With an
+    error `status`, every request is answered with that status instead. Use as a
+    context manager; `uri` is the deploy URI.
+    """
+
+    def __init__(
+        self,
+        responses: Optional[List[str]] = None,
+        default: str = "",
+        chunk_size: int = 4,
+        delay: float = 0.0,
+        status: int = 200,
+    ):
+        self.responses = list(responses or [])
+        self.default = default
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.status = status
+        self._lock = threading.Lock()
+        self.requests: List[Dict] = []
+        self.chunks_sent = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def uri(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _next_content(self) -> str:
+        with self._lock:
+            return self.responses.pop(0) if self.responses else self.default
+
+    def _handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                gateway.requests.append(
+                    {"path": self.path, "inputs": body, "headers": dict(self.headers)}
+                )
+                time.sleep(gateway.delay)
+                if gateway.status != 200:
+                    self.send_response(gateway.status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                content = gateway._next_content()
+                if body.get("stream"):
+                    self._send_stream(content)
+                else:
+                    self._send_json(content)
+
+            def _send_json(self, content: str):
+                payload = json.dumps(
+                    {
+                        "choices": [
+                            {"message": {"role": "assistant", "content": content}}
+                        ]
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_stream(self, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                size = gateway.chunk_size
+                try:
+                    for i in range(0, len(content), size):
+                        delta = {
+                            "choices": [{"delta": {"content": content[i : i + size]}}]
+                        }
+                        self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+                        self.wfile.flush()
+                        gateway.chunks_sent += 1
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    def __enter__(self) -> "StubGateway":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -2,6 +2,16 @@ from .general import *
 from .doc_manipulation import (
     DocstringMap,
     get_docstrings_from_file,
+    get_docstrings_from_source,
     transform_file_lines,
+    transform_source,
 )
-from .llm import OpenAI
+
+
+def __getattr__(name):
+    # utils.llm is only imported once OpenAI is used, to keep CLI startup fast
+    if name == "OpenAI":
+        from .llm import OpenAI
+
+        return OpenAI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
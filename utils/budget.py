@@ -0,0 +1,93 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from utils.usage import Usage
+
+_logger = logging.getLogger()
+
+
+@dataclass
+class Budget:
+    """
+    Hard caps on the usage of a run; None leaves a dimension uncapped. A run resumed
+    from the state of one stopped by its budget gets the full budget again.
+    """
+
+    max_tokens: Optional[int] = None
+    max_requests: Optional[int] = None
+    max_cost: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return any(
+            cap is not None
+            for cap in (self.max_tokens, self.max_requests, self.max_cost)
+        )
+
+    def exceeded_by(self, tokens: float, requests: float, cost: float) -> Optional[str]:
+        """Describe the first cap the given usage exceeds, or None if within budget."""
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return f"max tokens ({self.max_tokens})"
+        if self.max_requests is not None and requests > self.max_requests:
+            return f"max requests ({self.max_requests})"
+        if self.max_cost is not None and cost > self.max_cost:
+            return f"max cost ({self.max_cost} USD)"
+        return None
+
+
+class BudgetGovernor:
+    """Admission control keeping a run's usage within a Budget.
+
+    A docstring is admitted if the usage spent so far, plus the estimated usage of the
+    docstrings in flight and of the new one, stays within the budget. The estimate is
+    the mean usage of the docstrings converted so far, so until the first one completes
+    docstrings are admitted one at a time. While the projection is over budget, callers
+    wait for in-flight docstrings to complete; once nothing is in flight and the next
+    docstring still does not fit, the budget is exhausted and nothing is admitted again.
+
+    Caps can still be overshot by docstrings that cost more than the mean.
+    """
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self.spent = Usage()
+        self.exhausted: Optional[str] = None
+        self._completed = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def _projected_exceeded(self) -> Optional[str]:
+        mean = 1 / self._completed
+        n = self._in_flight + 1
+        return self.budget.exceeded_by(
+            self.spent.total_tokens + self.spent.total_tokens * mean * n,
+            self.spent.requests + self.spent.requests * mean * n,
+            self.spent.cost + self.spent.cost * mean * n,
+        )
+
+    def admit(self) -> bool:
+        """Block until a docstring fits in the budget; False once it is exhausted."""
+        with self._condition:
+            while self.exhausted is None:
+                reason = None if self._completed == 0 else self._projected_exceeded()
+                if reason is None and (self._completed or not self._in_flight):
+                    self._in_flight += 1
+                    return True
+                if reason is not None and self._in_flight == 0:
+                    self.exhausted = reason
+                    _logger.warning(
+                        f"Budget reached: {reason}. No new docstrings will be started."
+                    )
+                    self._condition.notify_all()
+                else:
+                    self._condition.wait()
+            return False
+
+    def release(self, usage: Usage):
+        """Record the usage of an admitted docstring once it is done."""
+        with self._condition:
+            self.spent.add(usage)
+            self._completed += 1
+            self._in_flight -= 1
+            self._condition.notify_all()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+from utils.metrics import Metrics
+
+_logger = logging.getLogger()
+
+
+@dataclass
+class Failure:
+    """A docstring that failed to convert: the last failure reason and the attempts."""
+
+    reason: str
+    attempts: int = 1
+
+
+class PredictionCache:
+    """
+    Thread-safe cache of predicted docstrings keyed by a hash of the original docstring
+    and a `namespace` describing the conversion settings (see `OpenAI.fingerprint`).
+
+    When `path` is set, entries are loaded from and appended to that JSON lines file,
+    so the cache survives restarts and is shared by runs with the same settings.
+
+    Docstrings that failed to convert are recorded too (see `put_failure`), so that
+    later runs can skip them instead of spending requests on them again. A successful
+    conversion clears the failure, and a failure evicts the cached prediction.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        namespace: str = "",
+        metrics: Optional[Metrics] = None,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.metrics = Metrics() if metrics is None else metrics
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = {}
+        self._failures: Dict[str, Failure] = {}
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self, path: str):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if "failure" in entry:
+                        self._failures[entry["key"]] = Failure(**entry["failure"])
+                        self._entries.pop(entry["key"], None)
+                    else:
+                        self._entries[entry["key"]] = entry["predicted_text"]
+                        self._failures.pop(entry["key"], None)
+                except (ValueError, KeyError, TypeError):
+                    _logger.warning(f"Skipping corrupt cache entry in {path}.")
+        _logger.info(
+            f"Loaded {len(self._entries)} cached predictions and "
+            f"{len(self._failures)} failures from {path}."
+        )
+
+    def _append(self, entry: Dict):
+        """Persist an entry; must be called with the lock held."""
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def key(self, docstring: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{docstring}".encode()).hexdigest()
+
+    def get(self, docstring: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(self.key(docstring))
+        self.metrics.increment("cache.hits" if entry is not None else "cache.misses")
+        return entry
+
+    def put(self, docstring: str, predicted_text: str):
+        key = self.key(docstring)
+        with self._lock:
+            if self._entries.get(key) == predicted_text:
+                return
+            self._entries[key] = predicted_text
+            self._failures.pop(key, None)
+            self._append({"key": key, "predicted_text": predicted_text})
+
+    @property
+    def failures(self) -> int:
+        return len(self._failures)
+
+    def get_failure(self, docstring: str) -> Optional[Failure]:
+        with self._lock:
+            return self._failures.get(self.key(docstring))
+
+    def put_failure(self, docstring: str, reason: str) -> Failure:
+        """Record a failed conversion, counting the attempts of the same docstring."""
+        key = self.key(docstring)
+        with self._lock:
+            self._entries.pop(key, None)
+            previous = self._failures.get(key)
+            failure = Failure(reason, 1 if previous is None else previous.attempts + 1)
+            self._failures[key] = failure
+            self._append({"key": key, "failure": asdict(failure)})
+        return failure
+
+    def hit_rate(self) -> float:
+        hits = self.metrics.counter("cache.hits")
+        lookups = hits + self.metrics.counter("cache.misses")
+        return hits / lookups if lookups else 0.0
@@ -0,0 +1,367 @@
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Executor, FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from typing import Optional, Iterator, Callable, Any, Tuple
+
+from utils.metrics import Metrics
+
+_logger = logging.getLogger()
+
+_THROTTLE_STATUS_CODES = {429}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the global run deadline has passed."""
+
+
+def remaining_time(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a `time.monotonic()` deadline, raising if it has passed."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("The run deadline has passed.")
+    return remaining
+
+
+def get_status_code(exc: BaseException) -> Optional[int]:
+    """Best-effort HTTP status code of an exception raised by the deploy client."""
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) is not None:
+        return response.status_code
+    if hasattr(exc, "get_http_status_code"):
+        return exc.get_http_status_code()
+    return getattr(exc, "status_code", None)
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """Whether the error signals an overloaded gateway (429, 5xx or a timeout)."""
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    if isinstance(exc, TimeoutError):
+        return True
+    status_code = get_status_code(exc)
+    return status_code is not None and (
+        status_code in _THROTTLE_STATUS_CODES or status_code >= 500
+    )
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Whether another route may succeed: overload or transport errors, not 4xx."""
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    return is_overload_error(exc) or (
+        isinstance(exc, OSError) and get_status_code(exc) is None
+    )
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on in-flight gateway
+    requests. Each success that stays within `latency_tolerance` times the baseline
+    latency grows the limit by 1 / limit, i.e. by roughly one slot per window of
+    requests. Overload errors and latency spikes multiply the limit by `backoff`, at
+    most once per round trip: failures of requests started before the last decrease
+    were sent under the previous limit and report the same overload.
+
+    The baseline is an exponentially weighted moving average of successful latencies
+    that only follows spikes slowly, so a sustained slowdown still counts as a spike.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.5,
+        smoothing: float = 0.1,
+        metrics: Optional[Metrics] = None,
+        label: Optional[str] = None,
+    ):
+        assert 1 <= min_limit <= initial_limit <= max_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.metrics = metrics
+        self.label = label
+        self._gauge_suffix = "" if label is None else f".{label}"
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+        self._set_gauges()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _set_gauges(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge(f"concurrency.limit{self._gauge_suffix}", self.limit)
+            self.metrics.set_gauge(
+                f"concurrency.in_flight{self._gauge_suffix}", self._in_flight
+            )
+
+    def _set_limit(self, limit: float, reason: str):
+        previous = self.limit
+        self._limit = min(max(limit, self.min_limit), self.max_limit)
+        if self.limit != previous:
+            _logger.info(
+                f"Concurrency limit{self._gauge_suffix} {previous} -> {self.limit} "
+                f"({reason})."
+            )
+        self._set_gauges()
+        self._condition.notify_all()
+
+    def _decrease(self, reason: str, started: float):
+        """Back off, unless the request started before the last decrease."""
+        if started < self._last_decrease:
+            return
+        self._last_decrease = time.perf_counter()
+        self._set_limit(self._limit * self.backoff, reason)
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            self._set_gauges()
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._set_gauges()
+            self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        with self._condition:
+            baseline = self._baseline_latency
+            if baseline is not None and latency > self.latency_tolerance * baseline:
+                self._decrease("latency spike", time.perf_counter() - latency)
+            else:
+                self._set_limit(self._limit + 1 / self._limit, "success")
+
+            if baseline is None:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency = baseline + self.smoothing * (
+                    latency - baseline
+                )
+
+    def on_error(self, exc: BaseException, started: Optional[float] = None):
+        """Back off on overload errors.
+
+        Args:
+            exc: error raised by the request.
+            started: `time.perf_counter()` when the request was sent; defaults to now.
+        """
+        if is_overload_error(exc):
+            with self._condition:
+                self._decrease(
+                    f"{type(exc).__name__}: overload",
+                    time.perf_counter() if started is None else started,
+                )
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one in-flight slot, reporting the outcome of the wrapped call."""
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.on_error(e, start)
+            raise
+        else:
+            self.on_success(time.perf_counter() - start)
+        finally:
+            self.release()
+
+
+class DaemonExecutor(Executor):
+    """
+    Runs each call on its own daemon thread. ThreadPoolExecutor workers are joined at
+    interpreter exit, so calls abandoned past a timeout would keep the process alive
+    until they return; daemon threads do not.
+    """
+
+    def __init__(self, thread_name_prefix: str = "daemon"):
+        self.thread_name_prefix = thread_name_prefix
+        self._counter = itertools.count()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        threading.Thread(
+            target=run,
+            name=f"{self.thread_name_prefix}_{next(self._counter)}",
+            daemon=True,
+        ).start()
+        return future
+
+
+def hedged_call(
+    executor: Executor,
+    fn: Callable[[], Any],
+    timeout: Optional[float] = None,
+    hedge_after: Optional[float] = None,
+    on_hedge: Optional[Callable[[], None]] = None,
+    abandoned: Optional[threading.Event] = None,
+) -> Any:
+    """Call `fn` on `executor` with an optional timeout and hedged duplicate.
+
+    Args:
+        executor: executor the call (and its duplicate) is submitted to.
+        fn: zero-argument callable to run.
+        timeout: seconds after which a TimeoutError is raised. The underlying call is
+                 abandoned, not interrupted.
+        hedge_after: seconds after which a duplicate call is fired if the first has not
+                     returned. The first successful result wins.
+        on_hedge: callback invoked when the duplicate is fired.
+        abandoned: set once the call returns or raises, so that calls still queued,
+                   e.g. waiting for a limiter slot, can give up instead of running for
+                   nobody (see `raise_if_abandoned`).
+
+    Returns:
+        The result of the first call to succeed.
+    """
+    try:
+        return _hedged_call(executor, fn, timeout, hedge_after, on_hedge)
+    finally:
+        if abandoned is not None:
+            abandoned.set()
+
+
+def raise_if_abandoned(abandoned: threading.Event):
+    """Raise CancelledError if the caller of `hedged_call` no longer waits."""
+    if abandoned.is_set():
+        raise CancelledError("The caller stopped waiting for this request.")
+
+
+def _hedged_call(
+    executor: Executor,
+    fn: Callable[[], Any],
+    timeout: Optional[float],
+    hedge_after: Optional[float],
+    on_hedge: Optional[Callable[[], None]],
+) -> Any:
+    start = time.monotonic()
+
+    def remaining() -> Optional[float]:
+        return (
+            None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+        )
+
+    pending = {executor.submit(fn)}
+    if hedge_after is not None and (timeout is None or hedge_after < timeout):
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done:
+            if on_hedge is not None:
+                on_hedge()
+            pending.add(executor.submit(fn))
+
+    errors = []
+    while pending:
+        done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            for future in pending:
+                future.cancel()
+            raise TimeoutError(f"Request did not complete within {timeout:.1f}s.")
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            errors.append(future.exception())
+    raise errors[0]
+
+
+class TokenBucket:
+    """
+    Shared request-rate limit: up to `burst` requests at once, refilled at `rate`
+    requests per second. `acquire` blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        assert rate > 0, "The rate must be positive."
+        self.rate = rate
+        self.burst = max(1, int(rate)) if burst is None else burst
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent identical calls: while a call for a key is in flight, other
+    callers with the same key wait for it and share its result (or error).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Call `fn` unless a call for `key` is in flight.
+
+        Returns:
+            The result and whether it was shared from another caller's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+
+        if not leader:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = fn()
+            except Exception as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call["done"].set()
+
+        if "error" in call:
+            raise call["error"]
+        return call["result"], not leader
@@ -1,4 +1,5 @@
 import ast
+import io
 from itertools import zip_longest
 from typing import List, Dict, Tuple, Optional, Union, Iterator, Any
 from dataclasses import dataclass
@@ -95,12 +96,18 @@ def _remove_docstrings_without_args_or_returns(
     return [x for x in docstring_map if ":param" in x.text or ":return:" in x.text]
 
 
+def get_docstrings_from_source(
+    source_code: str, to_change_key: str = "all"
+) -> List[DocstringMap]:
+    all_docstrings = _get_docstrings_map(source_code, to_change_key)
+    return _remove_docstrings_without_args_or_returns(all_docstrings)
+
+
 def get_docstrings_from_file(
     path: str, to_change_key: str = "all"
 ) -> List[DocstringMap]:
     with open(path, "r") as file:
-        all_docstrings = _get_docstrings_map(file.read(), to_change_key)
-        return _remove_docstrings_without_args_or_returns(all_docstrings)
+        return get_docstrings_from_source(file.read(), to_change_key)
 
 
 ####################### Write ###################
@@ -166,11 +173,24 @@ def _replace_lines(
         yield raw_file + comment_indented
 
 
+def _transform_lines(
+    old_file_lines: List[str], new_comments_line_mapping: Dict[DocstringMap, Any]
+) -> List[str]:
+    new_file_lines = list(_replace_lines(old_file_lines, new_comments_line_mapping))
+    return flatten(new_file_lines)
+
+
+def transform_source(
+    source_code: str, new_comments_line_mapping: Dict[DocstringMap, Any]
+) -> str:
+    old_file_lines = io.StringIO(source_code).readlines()
+    return "".join(_transform_lines(old_file_lines, new_comments_line_mapping))
+
+
 def transform_file_lines(
     read_file_path: str, new_comments_line_mapping: Dict[DocstringMap, Any]
 ) -> List[str]:
     with open(read_file_path, "r") as f:
         old_file_lines = f.readlines()
 
-    new_file_lines = list(_replace_lines(old_file_lines, new_comments_line_mapping))
-    return flatten(new_file_lines)
+    return _transform_lines(old_file_lines, new_comments_line_mapping)
@@ -0,0 +1,112 @@
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from utils.general import get_leading_whitespace
+
+_VERBATIM_DIRECTIVES = (
+    "code-block",
+    "code",
+    "sourcecode",
+    "parsed-literal",
+    "math",
+    "doctest",
+    "testcode",
+    "testoutput",
+)
+_DIRECTIVE_PATTERN = re.compile(
+    rf"^\s*\.\.\s+({'|'.join(map(re.escape, _VERBATIM_DIRECTIVES))})::", re.IGNORECASE
+)
+_PLACEHOLDER = "<<VERBATIM_{}>>"
+_PLACEHOLDER_PATTERN = re.compile(r"<<VERBATIM_(\d+)>>")
+
+PLACEHOLDER_RULE = (
+    "Lines like <<VERBATIM_0>> stand for verbatim blocks: keep each of them exactly once,"
+    " on its own line, where it belongs."
+)
+
+
+def _block_end(lines: List[str], start: int) -> int:
+    """Index after the last line of the directive block starting at `start`."""
+    indent = len(get_leading_whitespace(lines[start]))
+    end = start + 1
+    for i in range(start + 1, len(lines)):
+        if lines[i].strip() == "":
+            continue
+        if len(get_leading_whitespace(lines[i])) <= indent:
+            break
+        end = i + 1
+    return end
+
+
+def _dedent(lines: List[str], indent: int) -> List[str]:
+    return [line[indent:] if line.strip() else "" for line in lines]
+
+
+@dataclass
+class ElidedDocstring:
+    """
+    Docstring text with every verbatim directive block (e.g. `.. code-block::` and its
+    body) replaced by a single `<<VERBATIM_i>>` placeholder line. `blocks[i]` holds the
+    lines of block i, dedented relative to its directive line.
+    """
+
+    text: str
+    blocks: List[List[str]] = field(default_factory=list)
+
+    @classmethod
+    def from_text(cls, docstring: str) -> "ElidedDocstring":
+        lines = docstring.split("\n")
+        kept, blocks = [], []
+        i = 0
+        while i < len(lines):
+            if _DIRECTIVE_PATTERN.match(lines[i]):
+                end = _block_end(lines, i)
+                indent = get_leading_whitespace(lines[i])
+                kept.append(indent + _PLACEHOLDER.format(len(blocks)))
+                blocks.append(_dedent(lines[i:end], len(indent)))
+                i = end
+            else:
+                kept.append(lines[i])
+                i += 1
+        return cls(text="\n".join(kept), blocks=blocks)
+
+    @staticmethod
+    def has_placeholders(text: str) -> bool:
+        return _PLACEHOLDER_PATTERN.search(text) is not None
+
+    def restore(self, predicted: str) -> str:
+        """Replace the placeholders in `predicted` with their original blocks.
+
+        Each block is re-indented to the indentation of its placeholder line.
+
+        Raises:
+            ValueError: if a placeholder is missing, duplicated or shares its line with
+                        other text.
+        """
+        if not self.blocks:
+            return predicted
+
+        seen = set()
+        restored = []
+        for line in predicted.split("\n"):
+            match = _PLACEHOLDER_PATTERN.search(line)
+            if match is None:
+                restored.append(line)
+                continue
+
+            index = int(match.group(1))
+            if index >= len(self.blocks) or index in seen:
+                raise ValueError(f"Unexpected verbatim placeholder {match.group(0)}.")
+            if line.strip() != match.group(0):
+                raise ValueError(f"Verbatim placeholder {match.group(0)} was modified.")
+            seen.add(index)
+
+            indent = get_leading_whitespace(line)
+            restored.extend(indent + x if x else "" for x in self.blocks[index])
+
+        missing = set(range(len(self.blocks))) - seen
+        if missing:
+            placeholders = ", ".join(_PLACEHOLDER.format(i) for i in sorted(missing))
+            raise ValueError(f"Verbatim placeholders {placeholders} are missing.")
+        return "\n".join(restored)
@@ -1,5 +1,4 @@
 import os
-import yaml
 from typing import List, Any, Union, Dict
 
 
@@ -15,6 +14,8 @@ def get_file_paths_in_directory(directory: str, suffix: str = ""):
 
 
 def read_yaml(file_path: str) -> Union[Dict, List[Any], None]:
+    import yaml
+
     with open(file_path, "r") as f:
         return yaml.safe_load(f)
 
@@ -31,7 +32,9 @@ def clean_and_split_comment(comment: str) -> List[str]:
     return [x + "\n" for x in comment.split("\n") if x.strip() != '"""']
 
 
-def lines_are_equal(list1: list, list2: list) -> bool:
+def lines_are_equal(list1: list, list2: list, ignore_whitespace: bool = True) -> bool:
+    if not ignore_whitespace:
+        return list1 == list2
     return len(list1) == len(list2) and all(
         a.strip() == b.strip() for a, b in zip(list1, list2)
     )
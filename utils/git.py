@@ -0,0 +1,54 @@
+import os
+import re
+import subprocess
+from typing import List, Dict, Optional, Set
+
+_HUNK_HEADER_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+def _git(args: List[str], cwd: Optional[str] = None) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=cwd, capture_output=True, text=True, check=True
+    ).stdout
+
+
+def git_dir(cwd: Optional[str] = None) -> str:
+    return os.path.abspath(
+        os.path.join(cwd or ".", _git(["rev-parse", "--git-dir"], cwd).strip())
+    )
+
+
+def staged_files(suffix: str = ".py", cwd: Optional[str] = None) -> List[str]:
+    """Added, copied or modified staged files ending with `suffix`, relative to `cwd`."""
+    output = _git(
+        ["diff", "--cached", "--name-only", "--diff-filter=ACM", "--relative", "-z"],
+        cwd,
+    )
+    return [path for path in output.split("\0") if path.endswith(suffix)]
+
+
+def parse_changed_lines(diff: str) -> Set[int]:
+    """1-indexed lines of the new file touched by the hunks of a `-U0` diff.
+
+    A pure deletion counts as a change of the line it follows, so a docstring that only
+    lost lines is still picked up.
+    """
+    changed = set()
+    for line in diff.split("\n"):
+        if match := _HUNK_HEADER_PATTERN.match(line):
+            start = int(match.group(1))
+            count = 1 if match.group(2) is None else int(match.group(2))
+            changed.update(range(start, start + count) if count else [start])
+    return changed
+
+
+def staged_changed_lines(
+    paths: List[str], cwd: Optional[str] = None
+) -> Dict[str, Set[int]]:
+    """Changed lines of the staged version of each path, see `parse_changed_lines`."""
+    return {
+        path: parse_changed_lines(
+            _git(["diff", "--cached", "-U0", "--no-color", "--", path], cwd)
+        )
+        for path in paths
+    }
@@ -1,9 +1,40 @@
+import hashlib
+import json
 import logging
+import threading
+import time
 from dataclasses import dataclass, field
-from typing import List, Dict, Tuple
-
-from mlflow.deployments import get_deploy_client
-
+from typing import List, Dict, Tuple, Optional, Union
+from urllib.parse import urlparse
+
+from utils.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    DaemonExecutor,
+    DeadlineExceeded,
+    hedged_call,
+    is_overload_error,
+    raise_if_abandoned,
+    remaining_time,
+)
+from utils.metrics import Metrics, percentile
+from utils.routing import Route, Router
+from utils.usage import Usage, estimate_message_tokens, load_price_table
+from utils.elision import ElidedDocstring, PLACEHOLDER_RULE
+from utils.memo import ParamMemo
+from utils.sections import (
+    DocstringSections,
+    assemble_google_fields,
+    parse_google_fields,
+    split_fields,
+)
+from utils.streaming import stream_chat
+from utils.validation import (
+    ConversionError,
+    IncrementalValidator,
+    ValidationResult,
+    is_quoted,
+    validate_conversion,
+)
 
 _logger = logging.getLogger()
 
@@ -45,8 +76,126 @@ Returns:
 
 """
 '''
+# Condensed rules resent on compacted turns instead of the full _RULES block
+_RULES_DIGEST = """
+- Google style Args/Returns, max 100 chars per line, no types.
+- Keep all wording, .. blocks, bullet lists and code examples unchanged.
+- Continuation lines of an argument are indented 4 spaces.
+"""
 
 _TEMPERATURE = 0.0
+# Sampling temperature when several candidates are requested, so they differ
+_CANDIDATE_TEMPERATURE = 0.7
+_MAX_ATTEMPTS = 3
+_RETRY_BACKOFF_SECONDS = 1.0
+# Extra seconds given to the client past a request's timeout, so that the caller's own
+# timeout fires first and abandoned requests still end shortly after
+_CLIENT_TIMEOUT_GRACE_SECONDS = 1.0
+# Latency samples required for a turn before its percentile is used to hedge
+_MIN_HEDGE_SAMPLES = 10
+
+_ENDPOINT_PATH = "/endpoints/{endpoint}/invocations"
+_HTTP_SCHEMES = ("http", "https")
+
+# "none" resends the full history every turn; "latest" only carries the latest answer
+_COMPACTION_POLICIES = {"none", "latest"}
+
+
+class GatewayClient:
+    """
+    Chat client for an MLflow gateway that sends each request exactly once.
+
+    mlflow's deploy client retries 429 and 5xx responses internally, with exponential
+    backoff, while the caller holds a limiter slot. Overload then only surfaces after
+    minutes, as a single error. Requests here go through mlflow's `http_request`, with
+    the credentials mlflow resolves for the URI (e.g. `MLFLOW_TRACKING_TOKEN`), but
+    with its retries turned off: retries and backoff are left to `OpenAI._chat` and the
+    limiters, and the timeout is set per request.
+    """
+
+    def __init__(self, deploy_uri: str):
+        self.deploy_uri = deploy_uri.rstrip("/")
+
+    def predict(
+        self, endpoint: str, inputs: Dict, timeout: Optional[float] = None
+    ) -> Dict:
+        """Send a chat request.
+
+        Args:
+            endpoint: name of the route.
+            inputs: chat request payload.
+            timeout: seconds to wait for the response; defaults to
+                     `MLFLOW_DEPLOYMENT_PREDICT_TIMEOUT`.
+
+        Raises:
+            TimeoutError: if no response arrived within the timeout.
+            requests.HTTPError: on an error status, with the response attached.
+            requests.RequestException: if the gateway could not be reached.
+        """
+        import requests
+        from mlflow.environment_variables import MLFLOW_DEPLOYMENT_PREDICT_TIMEOUT
+        from mlflow.exceptions import MlflowException
+        from mlflow.utils.credentials import get_default_host_creds
+        from mlflow.utils.rest_utils import augmented_raise_for_status, http_request
+        from urllib3.exceptions import NewConnectionError
+        from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+        if timeout is None:
+            timeout = MLFLOW_DEPLOYMENT_PREDICT_TIMEOUT.get()
+        try:
+            response = http_request(
+                host_creds=get_default_host_creds(self.deploy_uri),
+                endpoint=_ENDPOINT_PATH.format(endpoint=endpoint),
+                method="POST",
+                json=inputs,
+                timeout=timeout,
+                max_retries=0,
+                raise_on_status=False,
+            )
+        except MlflowException as e:
+            # mlflow wraps transport errors, which hides what kind of error they are
+            cause = e.__cause__ or e.__context__
+            if not isinstance(cause, requests.RequestException):
+                raise
+            reason = getattr(cause.args[0] if cause.args else None, "reason", cause)
+            # NewConnectionError subclasses urllib3's TimeoutError, but is a refusal
+            if isinstance(cause, requests.Timeout) or (
+                isinstance(reason, Urllib3TimeoutError)
+                and not isinstance(reason, NewConnectionError)
+            ):
+                raise TimeoutError(f"No response within {timeout:.1f}s.") from cause
+            raise cause from None
+        augmented_raise_for_status(response)
+        return response.json()
+
+
+class TargetClient:
+    """
+    Deploy client of a non-HTTP mlflow deployment target, e.g. `databricks`. These
+    clients retry and time out requests on their own, so the per-request timeout is
+    not applied.
+    """
+
+    def __init__(self, target_uri: str):
+        from mlflow.deployments import get_deploy_client as get_mlflow_deploy_client
+
+        self.client = get_mlflow_deploy_client(target_uri)
+        _logger.warning(
+            f"Requests to {target_uri} are retried by mlflow and do not use the "
+            "request timeout."
+        )
+
+    def predict(
+        self, endpoint: str, inputs: Dict, timeout: Optional[float] = None
+    ) -> Dict:
+        return self.client.predict(endpoint=endpoint, inputs=inputs)
+
+
+def get_deploy_client(deploy_uri: str) -> Union[GatewayClient, TargetClient]:
+    """A client sending each request once for gateways, mlflow's for other targets."""
+    if urlparse(deploy_uri).scheme in _HTTP_SCHEMES:
+        return GatewayClient(deploy_uri)
+    return TargetClient(deploy_uri)
 
 
 @dataclass
@@ -86,18 +235,61 @@ class DocstringReformatContext(Context):
     system_prompt: str = field(default="")
     rules: str = field(default="")
     request_to_llm: str = field(default="")
+    rules_digest: str = field(default="")
+    compaction: str = field(default="none")
+    single_turn: bool = field(default=False)
 
     def __post_init__(self):
-        self.prompts = [
-            self._first_prompt(),
-            self._second_prompt(),
-            self._third_prompt(),
-        ]
+        assert (
+            self.compaction in _COMPACTION_POLICIES
+        ), f"{self.compaction} compaction is not supported."
+        if self.single_turn:
+            # The validation turn is replaced by local validation of the output
+            self.prompts = [self._first_prompt() + self._third_prompt()]
+        else:
+            self.prompts = [
+                self._first_prompt(),
+                self._second_prompt(),
+                self._third_prompt(),
+            ]
+
+    @property
+    def rules_prompt(self) -> str:
+        return f"Follow these rules:\n{self.rules}"
+
+    @property
+    def rules_digest_prompt(self) -> str:
+        return f"Follow these rules:\n{self.rules_digest}"
+
+    def rules_tokens(self) -> int:
+        """Estimated prompt tokens spent on the rules block in the current messages."""
+        rules_prompts = {self.rules_prompt, self.rules_digest_prompt}
+        return estimate_message_tokens(
+            [m for m in self.messages if m["content"] in rules_prompts]
+        )
+
+    def increment_prompt(self, response: str = None):
+        """
+        Advance to the next prompt. With "latest" compaction, the history is replaced
+        by the system prompt, the rules digest and the latest response before the next
+        prompt is appended.
+        """
+        if self.compaction == "latest" and response is not None:
+            self.messages = []
+            self.append_messages(
+                [
+                    ("system", self.system_prompt),
+                    ("user", self.rules_digest_prompt),
+                    ("assistant", response),
+                ]
+            )
+            response = None
+        super().increment_prompt(response=response)
 
     def _first_prompt(self):
         return [
             ("system", self.system_prompt),
-            ("user", f"Follow these rules:\n{self.rules}"),
+            ("user", self.rules_prompt),
             ("user", self.request_to_llm),
             ("user", self.docstring),
         ]
@@ -129,26 +321,429 @@ class DocstringReformatContext(Context):
 
 
 class OpenAI:
-    def __init__(self, deploy_uri: str, deploy_route_name: str):
-        self.client = get_deploy_client(deploy_uri)
-        self.deploy_route_name = deploy_route_name
+    def __init__(
+        self,
+        deploy_uri: str,
+        deploy_route_name: str,
+        metrics: Optional[Metrics] = None,
+        price_table: Optional[Dict[str, Tuple[float, float]]] = None,
+        compaction: str = "none",
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        request_timeout: Optional[float] = None,
+        hedge_percentile: Optional[float] = None,
+        router: Optional[Router] = None,
+        cascade_router: Optional[Router] = None,
+        elide_verbatim: bool = True,
+        section_only: bool = False,
+        param_memo: Optional[ParamMemo] = None,
+        candidates: int = 1,
+        stream: bool = False,
+    ):
+        """
+        Args:
+            deploy_uri: URI of the gateway serving `deploy_route_name`.
+            deploy_route_name: name of the route in the gateway.
+            router: if given, requests are spread across its routes instead of the
+                    single `deploy_uri`/`deploy_route_name` route.
+            cascade_router: if given, docstrings are first converted with its (cheap)
+                            routes and only escalated to `router` when the output
+                            fails local validation.
+            elide_verbatim: replace code blocks and other verbatim directives with
+                            placeholders before prompting and restore them afterwards.
+            section_only: only send the :param/:return: field region of a docstring
+                          and splice the converted section back into the description.
+            param_memo: memo of converted fields shared across docstrings. Only used
+                        with `section_only`.
+            candidates: when above 1, each conversion is a single call asking for this
+                        many completions (where the route supports `n`) instead of the
+                        three-turn prompt. The candidate that passes local validation
+                        is kept.
+            stream: stream completions from the gateway and stop reading as soon as
+                    the closing triple quotes of the docstring arrive. Cannot be
+                    combined with several candidates.
+        """
+        assert not (
+            stream and candidates > 1
+        ), "Streaming does not support several candidates."
+        self.metrics = Metrics() if metrics is None else metrics
+        if router is None:
+            route = Route(
+                name=deploy_route_name, deploy_uri=deploy_uri, limiter=limiter
+            )
+            router = Router([route], metrics=self.metrics)
+        self.router = router
+        self.cascade_router = cascade_router
+
+        routers = [r for r in (self.router, self.cascade_router) if r is not None]
+        clients = {}
+        for route in [route for r in routers for route in r.routes]:
+            if route.client is None:
+                if route.deploy_uri not in clients:
+                    clients[route.deploy_uri] = get_deploy_client(route.deploy_uri)
+                route.client = clients[route.deploy_uri]
+
+        self.client = self.router.routes[0].client
+        self.deploy_route_name = self.router.routes[0].name
+        self.limiter = self.router.routes[0].limiter
+        self.price_table = load_price_table() if price_table is None else price_table
+        self.compaction = compaction
+        self.elide_verbatim = elide_verbatim
+        self.section_only = section_only
+        self.param_memo = param_memo
+        self.candidates = candidates
+        self.stream = stream
+        self.request_timeout = request_timeout
+        self.hedge_percentile = hedge_percentile
+        # Requests only run on these threads when they need a timeout or a hedge
+        self._request_pool = DaemonExecutor(thread_name_prefix="gateway")
+
+    def _hedge_after(self, stage: str) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        samples = self.metrics.samples(stage)
+        if len(samples) < _MIN_HEDGE_SAMPLES:
+            return None
+        return percentile(samples, self.hedge_percentile)
+
+    def _request(
+        self,
+        route: Route,
+        messages: List[Dict],
+        stage: str,
+        deadline: Optional[float],
+        n: int = 1,
+        original: str = "",
+    ) -> Tuple[Dict, Route]:
+        timeout = self.request_timeout
+        remaining = remaining_time(deadline)
+        deadline_bound = remaining is not None and (
+            timeout is None or remaining < timeout
+        )
+        if deadline_bound:
+            timeout = remaining
+        hedge_after = self._hedge_after(stage)
+
+        inputs = {"messages": messages, "temperature": _TEMPERATURE}
+        if n > 1:
+            inputs.update({"n": n, "temperature": _CANDIDATE_TEMPERATURE})
+
+        client_timeout_at = (
+            None
+            if timeout is None
+            else time.monotonic() + timeout + _CLIENT_TIMEOUT_GRACE_SECONDS
+        )
+
+        abandoned = threading.Event()
+
+        def call():
+            # Every call, including a hedged duplicate, holds its own limiter slot
+            with route.limiter.slot():
+                # A call that got its slot after the caller gave up is never sent
+                raise_if_abandoned(abandoned)
+                client_timeout = (
+                    None
+                    if client_timeout_at is None
+                    else max(
+                        client_timeout_at - time.monotonic(),
+                        _CLIENT_TIMEOUT_GRACE_SECONDS,
+                    )
+                )
+                if self.stream:
+                    return self._stream(route, inputs, original, client_timeout), route
+                response = route.client.predict(
+                    endpoint=route.name, inputs=inputs, timeout=client_timeout
+                )
+                return response, route
+
+        with self.metrics.timer(stage):
+            if timeout is None and hedge_after is None:
+                return call()
+            try:
+                return hedged_call(
+                    self._request_pool,
+                    call,
+                    timeout=timeout,
+                    hedge_after=hedge_after,
+                    on_hedge=lambda: self.metrics.increment("llm.hedged"),
+                    abandoned=abandoned,
+                )
+            except TimeoutError as e:
+                if deadline_bound:
+                    raise DeadlineExceeded("The run deadline has passed.") from e
+                raise
+
+    def _stream(
+        self, route: Route, inputs: Dict, original: str, timeout: Optional[float]
+    ) -> Dict:
+        """Stream a completion, stopping as soon as the docstring is closed.
+
+        Returns:
+            The streamed content in the shape of a non-streaming chat response.
+        """
+        validator = IncrementalValidator(original)
+        chunks = stream_chat(route.deploy_uri, route.name, inputs, timeout)
+        try:
+            for chunk in chunks:
+                if validator.feed(chunk):
+                    self.metrics.increment("stream.closed_early")
+                    break
+        finally:
+            chunks.close()
+
+        if validator.errors:
+            _logger.debug(f"Streamed output failed line checks: {validator.errors}")
+        return {
+            "choices": [{"message": {"role": "assistant", "content": validator.text}}]
+        }
+
+    def _chat(
+        self,
+        messages: List[Dict],
+        stage: str,
+        deadline: Optional[float] = None,
+        router: Optional[Router] = None,
+        n: int = 1,
+        original: str = "",
+    ) -> Tuple[Dict, Route]:
+        """Send one chat request through the router and its routes' limiters.
+
+        Each attempt fails over across the routes. Overload errors (429/5xx, request
+        timeouts) shrink the route's limiter and are retried with a linear backoff up to
+        _MAX_ATTEMPTS times; any other error, including DeadlineExceeded, is raised
+        immediately.
+        """
+        router = self.router if router is None else router
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            remaining_time(deadline)
+            try:
+                return router.call(
+                    lambda route: self._request(
+                        route, messages, stage, deadline, n, original
+                    )
+                )
+            except Exception as e:
+                if attempt == _MAX_ATTEMPTS or not is_overload_error(e):
+                    raise
+                _logger.warning(
+                    f"Gateway overloaded ({e}), retrying {attempt} / {_MAX_ATTEMPTS}."
+                )
+                backoff = _RETRY_BACKOFF_SECONDS * attempt
+                remaining = remaining_time(deadline)
+                time.sleep(backoff if remaining is None else min(backoff, remaining))
+
+    def predict(
+        self,
+        docstring: str,
+        usage: Optional[Usage] = None,
+        deadline: Optional[float] = None,
+    ):
+        """Convert a docstring through the multi-turn prompt.
+
+        Args:
+            docstring: raw docstring text (without triple quotes).
+            usage: if given, token usage of every call is accumulated into it.
+            deadline: `time.monotonic()` value after which DeadlineExceeded is raised.
+
+        Returns:
+            The content of the final response.
+
+        Raises:
+            ConversionError: if the response is not surrounded by triple quotes or its
+                             verbatim blocks cannot be restored.
+        """
+        elided = (
+            ElidedDocstring.from_text(docstring)
+            if self.elide_verbatim
+            else ElidedDocstring(text=docstring)
+        )
+        if elided.blocks:
+            self.metrics.increment("elision.blocks", len(elided.blocks))
+
+        sections = (
+            DocstringSections.from_text(elided.text) if self.section_only else None
+        )
+        text = elided.text if sections is None else sections.fields
+        request_to_llm = _REQUEST_TO_LLM
+        if ElidedDocstring.has_placeholders(text):
+            request_to_llm = f"{_REQUEST_TO_LLM} {PLACEHOLDER_RULE}"
+
+        def convert(router: Router, stage_prefix: str) -> str:
+            if sections is None:
+                response = self._convert(
+                    text, router, stage_prefix, request_to_llm, usage, deadline
+                )
+            else:
+                response = sections.splice(
+                    self._convert_fields(
+                        text, router, stage_prefix, request_to_llm, usage, deadline
+                    )
+                )
+            # Unquoted output would be spliced into the file as code
+            if not is_quoted(response):
+                raise ConversionError("Output is not surrounded by triple quotes.")
+            try:
+                return elided.restore(response)
+            except ValueError as e:
+                raise ConversionError(str(e)) from e
+
+        if self.cascade_router is None:
+            return convert(self.router, "llm")
+
+        self.metrics.increment("cascade.docstrings")
+        try:
+            response = convert(self.cascade_router, "llm.cascade")
+            validation = validate_conversion(docstring, response)
+        except ConversionError as e:
+            validation = ValidationResult(errors=[str(e)])
+        if validation.ok:
+            return response
+
+        self.metrics.increment("cascade.escalated")
+        _logger.info(
+            "Escalating docstring after failed validation: "
+            + " ".join(validation.errors)
+        )
+        return convert(self.router, "llm")
+
+    def _convert_fields(
+        self,
+        fields_text: str,
+        router: Router,
+        stage_prefix: str,
+        request_to_llm: str,
+        usage: Optional[Usage],
+        deadline: Optional[float],
+    ) -> str:
+        """Convert a field region, reusing memoized conversions of identical fields.
+
+        Only the fields missing from the memo are sent. Fields containing verbatim
+        placeholders are never memoized since placeholder numbers are per docstring. If
+        the converted misses cannot be matched back to their fields, the whole region
+        is converted instead.
+        """
+        fields = split_fields(fields_text) if self.param_memo is not None else None
+        if fields is None:
+            return self._convert(
+                fields_text, router, stage_prefix, request_to_llm, usage, deadline
+            )
+
+        entries, misses = {}, []
+        for f in fields:
+            entry = None
+            if not ElidedDocstring.has_placeholders(f.text):
+                entry = self.param_memo.get(f.key)
+            if entry is None:
+                misses.append(f)
+            else:
+                entries[(f.kind, f.name)] = entry
+
+        if misses:
+            response = self._convert(
+                "\n".join(f.text for f in misses),
+                router,
+                stage_prefix,
+                request_to_llm,
+                usage,
+                deadline,
+            )
+            converted = parse_google_fields(response)
+            if any((f.kind, f.name) not in converted for f in misses):
+                self.metrics.increment("memo.fallbacks")
+                return self._convert(
+                    fields_text, router, stage_prefix, request_to_llm, usage, deadline
+                )
+            for f in misses:
+                entries[(f.kind, f.name)] = converted[(f.kind, f.name)]
+                if not ElidedDocstring.has_placeholders(f.text):
+                    self.param_memo.put(f.key, converted[(f.kind, f.name)])
+
+        return assemble_google_fields(fields, entries)
+
+    def fingerprint(self) -> str:
+        """Digest of the prompts, routes and settings that determine the predictions."""
+        cascade_routes = (
+            [] if self.cascade_router is None else self.cascade_router.routes
+        )
+        settings = {
+            "prompts": [_SYSTEM_PROMPT, _REQUEST_TO_LLM, _RULES],
+            "routes": sorted(r.name for r in self.router.routes),
+            "cascade_routes": sorted(r.name for r in cascade_routes),
+            "compaction": self.compaction,
+            "elide_verbatim": self.elide_verbatim,
+            "section_only": self.section_only,
+            "candidates": self.candidates,
+        }
+        return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+    def escalation_rate(self) -> float:
+        docstrings = self.metrics.counter("cascade.docstrings")
+        return (
+            self.metrics.counter("cascade.escalated") / docstrings
+            if docstrings
+            else 0.0
+        )
 
-    def predict(self, docstring: str):
+    def _best_candidate(self, docstring: str, candidates: List[str]) -> str:
+        """Pick the candidate with the fewest local validation errors (first on ties)."""
+        if len(candidates) == 1:
+            return candidates[0]
+
+        self.metrics.increment("candidates.received", len(candidates))
+        errors = [len(validate_conversion(docstring, c).errors) for c in candidates]
+        best = errors.index(min(errors))
+        if errors[best] > 0:
+            self.metrics.increment("candidates.none_valid")
+        return candidates[best]
+
+    def _convert(
+        self,
+        docstring: str,
+        router: Router,
+        stage_prefix: str,
+        request_to_llm: str,
+        usage: Optional[Usage],
+        deadline: Optional[float],
+    ) -> str:
+        rules_digest = _RULES_DIGEST
+        if ElidedDocstring.has_placeholders(docstring):
+            # Compacted turns drop the request, so the digest must carry the rule too
+            rules_digest = f"{_RULES_DIGEST}- {PLACEHOLDER_RULE}\n"
         context = DocstringReformatContext(
             docstring=docstring,
             system_prompt=_SYSTEM_PROMPT,
             rules=_RULES,
-            request_to_llm=_REQUEST_TO_LLM,
+            request_to_llm=request_to_llm,
+            rules_digest=rules_digest,
+            compaction=self.compaction,
+            single_turn=self.candidates > 1,
         )
 
         response = None
+        turn = 0
         while context.has_prompts():
+            turn += 1
             _logger.info("Incrementing prompt.")
             context.increment_prompt(response=response)
-            raw_response = self.client.predict(
-                endpoint=self.deploy_route_name,
-                inputs={"messages": context.messages, "temperature": _TEMPERATURE},
+            raw_response, route = self._chat(
+                context.messages,
+                f"{stage_prefix}.turn_{turn}",
+                deadline,
+                router,
+                self.candidates,
+                docstring,
             )
-            response = raw_response["choices"][0]["message"]["content"]
+            contents = [c["message"]["content"] for c in raw_response["choices"]]
+            response = self._best_candidate(docstring, contents)
+
+            if usage is not None:
+                usage.add(
+                    Usage.from_response(
+                        raw_response,
+                        context.messages,
+                        "".join(contents),
+                        rules_tokens=context.rules_tokens(),
+                        price=self.price_table.get(route.name),
+                    )
+                )
 
         return response
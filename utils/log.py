@@ -1,24 +1,115 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Optional
 
+_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+_MAX_MESSAGE_CHARS = 2000
+# Marks the handler installed by init_logger, so that calling it again replaces it
+_HANDLER_NAME = "llm_documentation_modifier"
+
+_listener: Optional[QueueListener] = None
+
+
+class TruncatingFilter(logging.Filter):
+    """Truncate messages longer than `max_chars`, e.g. full docstrings or responses."""
+
+    def __init__(self, max_chars: int = _MAX_MESSAGE_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            record.msg = (
+                f"{message[: self.max_chars]}... "
+                f"[{len(message) - self.max_chars} more characters]"
+            )
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as JSON lines with time, level, logger and message fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, _DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
 
-def init_logger() -> Logger:
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
 
-    info_handler = logging.StreamHandler()
-    info_handler.setLevel(logging.INFO)
-    error_handler = logging.StreamHandler()
-    error_handler.setLevel(logging.ERROR)
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue records as they are, unlike QueueHandler, which merges the message and
+    traceback into `msg` on the calling thread and clears `args` and `exc_info`. The
+    listener's formatter then formats both and can emit the traceback on its own.
+    """
 
-    local_time_format = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    info_handler.setFormatter(local_time_format)
-    error_handler.setFormatter(local_time_format)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Other handlers may see the same record, so do not share it across threads
+        return copy.copy(record)
 
-    logger.addHandler(info_handler)
-    logger.addHandler(error_handler)
 
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def init_logger(
+    level: int = logging.INFO,
+    structured: bool = False,
+    max_message_chars: int = _MAX_MESSAGE_CHARS,
+    stream: Optional[IO] = None,
+) -> Logger:
+    """Configure the root logger with a single handler; safe to call repeatedly.
+
+    Args:
+        level: verbosity of the root logger.
+        structured: emit JSON lines through a QueueHandler, so that formatting and
+                    I/O happen on a listener thread instead of the calling threads.
+        max_message_chars: messages longer than this are truncated.
+        stream: stream to log to, stderr by default.
+
+    Returns:
+        The root logger.
+    """
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    _stop_listener()
+    for handler in list(logger.handlers):
+        if handler.get_name() == _HANDLER_NAME:
+            logger.removeHandler(handler)
+
+    stream_handler = logging.StreamHandler(stream)
+    if structured:
+        stream_handler.setFormatter(JsonFormatter())
+        handler = DeferredQueueHandler(queue.SimpleQueue())
+        global _listener
+        _listener = QueueListener(handler.queue, stream_handler)
+        _listener.start()
+    else:
+        stream_handler.setFormatter(logging.Formatter(_FORMAT, datefmt=_DATE_FORMAT))
+        handler = stream_handler
+
+    handler.set_name(_HANDLER_NAME)
+    handler.addFilter(TruncatingFilter(max_message_chars))
+    logger.addHandler(handler)
     return logger
+
+
+# Flush queued records at exit
+atexit.register(_stop_listener)
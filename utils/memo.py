@@ -0,0 +1,35 @@
+import threading
+from typing import Dict, Optional
+
+from utils.metrics import Metrics
+
+
+class ParamMemo:
+    """
+    Thread-safe memo of converted fields keyed by their normalized sphinx text (see
+    `utils.sections.Field.key`). Parameters such as `artifact_path` that are documented
+    identically across many functions are then only converted once per run.
+    """
+
+    def __init__(self, metrics: Optional[Metrics] = None):
+        self.metrics = Metrics() if metrics is None else metrics
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+        self.metrics.increment("memo.hits" if entry is not None else "memo.misses")
+        return entry
+
+    def put(self, key: str, entry: str):
+        with self._lock:
+            self._entries[key] = entry
+
+    def hit_rate(self) -> float:
+        hits = self.metrics.counter("memo.hits")
+        lookups = hits + self.metrics.counter("memo.misses")
+        return hits / lookups if lookups else 0.0
@@ -0,0 +1,203 @@
+import cProfile
+import io
+import json
+import logging
+import math
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterator, Any
+
+_logger = logging.getLogger()
+
+_PERCENTILES = (50, 95, 99)
+_PROFILE_ROWS = 25
+
+# Profilers of the worker threads started while `profile` is active, None otherwise
+_thread_profilers: Optional[List[cProfile.Profile]] = None
+_thread_profilers_lock = threading.Lock()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of `values`.
+
+    Args:
+        values: samples to compute the percentile over.
+        q: percentile in the range [0, 100].
+
+    Returns:
+        The interpolated percentile or 0.0 if there are no samples.
+    """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class Metrics:
+    """
+    Thread-safe collection of per-stage latency samples. Every sample is stored under
+    its stage name (e.g. `file.parse` or `llm.turn_2`) and, optionally, summed under a
+    key such as a file path or a `path:line` docstring identifier. Gauges hold the
+    last, min and max value of live levels such as the concurrency limit and counters
+    count events such as hedged requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._by_key: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self._gauges: Dict[str, Dict[str, float]] = {}
+        self._counters: Dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, seconds: float, key: Optional[str] = None):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            if key is not None:
+                self._by_key[key][stage] += seconds
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            gauge = self._gauges.setdefault(name, {"min": value, "max": value})
+            gauge["last"] = value
+            gauge["min"] = min(gauge["min"], value)
+            gauge["max"] = max(gauge["max"], value)
+
+    def gauge(self, name: str) -> Optional[float]:
+        with self._lock:
+            return self._gauges.get(name, {}).get("last")
+
+    def discard_key(self, key: str):
+        """Drop the samples summed under `key` and its `key:line` docstring keys."""
+        with self._lock:
+            for k in [k for k in self._by_key if key in (k, k.rpartition(":")[0])]:
+                del self._by_key[k]
+
+    def trim(self, keep_samples: int):
+        """Drop the sums of every key and all but the last `keep_samples` samples of
+        each stage, e.g. between the calls of a long-lived run. Counters and gauges are
+        kept.
+        """
+        with self._lock:
+            self._by_key.clear()
+            for values in self._samples.values():
+                del values[: max(0, len(values) - keep_samples)]
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    @contextmanager
+    def timer(self, stage: str, key: Optional[str] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, key)
+
+    def samples(self, stage: str) -> List[float]:
+        with self._lock:
+            return list(self._samples.get(stage, []))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+
+        return {
+            stage: {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                **{f"p{q}": percentile(values, q) for q in _PERCENTILES},
+                "max": max(values),
+            }
+            for stage, values in sorted(samples.items())
+        }
+
+    def format_table(self) -> str:
+        columns = ["count", "total", "mean"] + [f"p{q}" for q in _PERCENTILES] + ["max"]
+        summary = self.summary()
+        width = max([len("stage")] + [len(stage) for stage in summary])
+
+        rows = [f"{'stage':<{width}}" + "".join(f"{c:>10}" for c in columns)]
+        for stage, stats in summary.items():
+            cells = [f"{stats['count']:>10}"] + [
+                f"{stats[c]:>10.3f}" for c in columns[1:]
+            ]
+            rows.append(f"{stage:<{width}}" + "".join(cells))
+        return "\n".join(rows)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            by_key = {k: dict(v) for k, v in self._by_key.items()}
+            gauges = {k: dict(v) for k, v in self._gauges.items()}
+            counters = dict(self._counters)
+        return {
+            "stages": self.summary(),
+            "keys": by_key,
+            "gauges": gauges,
+            "counters": counters,
+        }
+
+    def write_json(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """Write the stage summary (latencies in seconds) and any `extra` sections."""
+        with open(path, "w+") as f:
+            json.dump({**self.to_dict(), **(extra or {})}, f, indent=2)
+
+
+def profile_thread():
+    """Profile the calling thread for the active `profile` block, if any.
+
+    cProfile only profiles the thread that enables it, so executors whose workers do
+    the work pass this as their `initializer`.
+    """
+    with _thread_profilers_lock:
+        if _thread_profilers is None:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Since python 3.12 the profiler of the `profile` block covers all threads
+            return
+        _thread_profilers.append(profiler)
+
+
+@contextmanager
+def profile(path: Optional[str]) -> Iterator[None]:
+    """Run the wrapped block under cProfile, dumping pstats to `path` if it is set.
+
+    The stats of worker threads started with `profile_thread` are merged in.
+    """
+    global _thread_profilers
+    if path is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    with _thread_profilers_lock:
+        _thread_profilers = []
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _thread_profilers_lock:
+            thread_profilers, _thread_profilers = _thread_profilers, None
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, *thread_profilers, stream=stream)
+        stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(_PROFILE_ROWS)
+        _logger.info(f"Wrote profile to {path}\n{stream.getvalue()}")
@@ -0,0 +1,213 @@
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, IO, List, Optional
+
+_logger = logging.getLogger()
+
+_TTY_REFRESH_SECONDS = 0.5
+_LOG_INTERVAL_SECONDS = 30.0
+_CLEAR_LINE = "\r\x1b[K"
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+@dataclass
+class ProgressSnapshot:
+    """Point-in-time view of a run's progress; rates are averaged since the start."""
+
+    done: int
+    total: int
+    elapsed: float
+    tokens: int
+    in_flight: int
+    cache_hit_rate: Optional[float]
+    errors: int
+
+    @property
+    def docstrings_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate, None before the first docstring is done."""
+        if not self.done:
+            return None
+        return (self.total - self.done) / self.docstrings_per_second
+
+    def format(self) -> str:
+        parts = [
+            f"{self.done} / {self.total} docstrings",
+            f"{self.docstrings_per_second:.2f} docstrings/s",
+            f"{self.tokens_per_second:.0f} tokens/s",
+            f"{self.in_flight} in flight",
+        ]
+        if self.cache_hit_rate is not None:
+            parts.append(f"{self.cache_hit_rate:.0%} cache hits")
+        parts.append(f"{self.errors} errors")
+        eta = self.eta
+        parts.append(f"ETA {'?' if eta is None else _format_duration(eta)}")
+        return " | ".join(parts)
+
+
+class _StatusLineStream:
+    """Stream of the log handlers sharing the status line's TTY, which clears the
+    status line before their output is written so that log lines do not print onto it.
+    """
+
+    def __init__(self, progress: "Progress"):
+        self.progress = progress
+
+    def write(self, text: str) -> int:
+        with self.progress._draw_lock:
+            self.progress._clear_line()
+            return self.progress.stream.write(text)
+
+    def __getattr__(self, name: str):
+        return getattr(self.progress.stream, name)
+
+
+class Progress:
+    """
+    Thread-safe progress of the docstrings of a run, reported from a background thread.
+    On a TTY a single status line is redrawn every half second; otherwise a log line is
+    written every `log_interval` seconds.
+
+    The token count, in-flight requests, cache hit rate and error count are read through
+    callables when reporting, so that the conversion threads only bump two counters.
+
+    While the status line is shown, root log handlers writing to the same stream write
+    through `_StatusLineStream`, which clears the line first; it is redrawn on the next
+    refresh.
+    """
+
+    def __init__(
+        self,
+        tokens: Callable[[], int] = lambda: 0,
+        in_flight: Callable[[], int] = lambda: 0,
+        cache_hit_rate: Callable[[], Optional[float]] = lambda: None,
+        errors: Callable[[], int] = lambda: 0,
+        stream: Optional[IO] = None,
+        log_interval: float = _LOG_INTERVAL_SECONDS,
+    ):
+        self._tokens = tokens
+        self._in_flight = in_flight
+        self._cache_hit_rate = cache_hit_rate
+        self._errors = errors
+        self.stream = sys.stderr if stream is None else stream
+        self.log_interval = log_interval
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+        self._start = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._draw_lock = threading.Lock()
+        self._line_shown = False
+        self._log_handlers: List[logging.StreamHandler] = []
+
+    def add_total(self, count: int):
+        with self._lock:
+            self._total += count
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self._done += count
+
+    def discard(self, count: int):
+        """Forget `count` docstrings, e.g. of a finished call of a long-lived run."""
+        with self._lock:
+            self._total -= count
+            self._done = max(0, self._done - count)
+
+    def reset(self):
+        """Forget every docstring, e.g. between the calls of a long-lived run."""
+        with self._lock:
+            self._total = 0
+            self._done = 0
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            done, total = self._done, self._total
+        return ProgressSnapshot(
+            done=done,
+            total=total,
+            elapsed=time.monotonic() - self._start,
+            tokens=self._tokens(),
+            in_flight=self._in_flight(),
+            cache_hit_rate=self._cache_hit_rate(),
+            errors=self._errors(),
+        )
+
+    @property
+    def is_tty(self) -> bool:
+        return hasattr(self.stream, "isatty") and self.stream.isatty()
+
+    def _clear_line(self):
+        if self._line_shown:
+            self.stream.write(_CLEAR_LINE)
+            self._line_shown = False
+
+    def _report(self):
+        if self.is_tty:
+            line = self.snapshot().format()
+            with self._draw_lock:
+                # Redraw the status line in place
+                self.stream.write(f"{_CLEAR_LINE}{line}")
+                self.stream.flush()
+                self._line_shown = True
+        else:
+            _logger.info(f"Progress: {self.snapshot().format()}")
+
+    def _loop(self):
+        interval = _TTY_REFRESH_SECONDS if self.is_tty else self.log_interval
+        while not self._stop.wait(interval):
+            self._report()
+
+    def start(self):
+        self._start = time.monotonic()
+        self._stop.clear()
+        if self.is_tty:
+            self._log_handlers = [
+                h
+                for h in logging.getLogger().handlers
+                if isinstance(h, logging.StreamHandler) and h.stream is self.stream
+            ]
+            for handler in self._log_handlers:
+                handler.setStream(_StatusLineStream(self))
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._report()
+        for handler in self._log_handlers:
+            handler.setStream(self.stream)
+        self._log_handlers = []
+        if self.is_tty:
+            with self._draw_lock:
+                # Keep the final status line
+                self.stream.write("\n")
+                self.stream.flush()
+                self._line_shown = False
+
+    def __enter__(self) -> "Progress":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Callable, Any, Iterable
+
+from utils.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    DeadlineExceeded,
+    is_transient_error,
+)
+from utils.metrics import Metrics
+
+_logger = logging.getLogger()
+
+_STRATEGIES = {"least-outstanding", "latency"}
+_LATENCY_SMOOTHING = 0.2
+_MAX_COOLDOWN_SECONDS = 600.0
+
+
+@dataclass
+class Route:
+    """
+    A gateway route that requests can be sent to. The schema is as follows:
+
+    - name: name of the route (endpoint) in the gateway config
+    - deploy_uri: URI of the gateway serving the route
+    - weight: relative share of the load the route should receive
+    - limiter: AIMD limit on in-flight requests to this route
+    - client: deploy client bound to `deploy_uri`
+
+    """
+
+    name: str
+    deploy_uri: str
+    weight: float = 1.0
+    limiter: Optional[AdaptiveConcurrencyLimiter] = None
+    client: Any = None
+    outstanding: int = 0
+    latency: Optional[float] = None
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}@{self.deploy_uri}"
+
+
+def parse_route(spec: str, default_deploy_uri: str) -> Route:
+    """Parse a `NAME[:WEIGHT][@URI]` route spec, e.g. `gpt-4:2@http://host:5000`."""
+    name_and_weight, _, deploy_uri = spec.partition("@")
+    name, _, weight = name_and_weight.partition(":")
+    if not name:
+        raise ValueError(f"Route spec {spec!r} is missing a route name.")
+    return Route(
+        name=name,
+        deploy_uri=deploy_uri or default_deploy_uri,
+        weight=float(weight) if weight else 1.0,
+    )
+
+
+class Router:
+    """
+    Spread requests across several gateway routes and fail over between them.
+
+    Routes are picked by the lowest weighted load: `(outstanding + 1) / weight` for the
+    "least-outstanding" strategy, additionally multiplied by the route's smoothed
+    latency for the "latency" strategy. A failing route is skipped for
+    `cooldown_seconds` (doubling with consecutive failures) unless no healthy route is
+    left. Each route has its own concurrency limiter so throttling on one route does
+    not slow down the others.
+    """
+
+    def __init__(
+        self,
+        routes: List[Route],
+        strategy: str = "least-outstanding",
+        cooldown_seconds: float = 30.0,
+        metrics: Optional[Metrics] = None,
+        limiter_factory: Optional[Callable[[Route], AdaptiveConcurrencyLimiter]] = None,
+    ):
+        assert routes, "At least one route is required."
+        assert strategy in _STRATEGIES, f"{strategy} strategy is not supported."
+        self.routes = routes
+        self.strategy = strategy
+        self.cooldown_seconds = cooldown_seconds
+        self.metrics = Metrics() if metrics is None else metrics
+        self._lock = threading.Lock()
+
+        for route in routes:
+            if route.limiter is None:
+                route.limiter = (
+                    AdaptiveConcurrencyLimiter(metrics=self.metrics)
+                    if limiter_factory is None
+                    else limiter_factory(route)
+                )
+
+    def _load(self, route: Route) -> float:
+        load = (route.outstanding + 1) / route.weight
+        if self.strategy == "latency" and route.latency is not None:
+            load *= route.latency
+        return load
+
+    def choose(self, exclude: Iterable[Route] = ()) -> Route:
+        excluded = {id(r) for r in exclude}
+        with self._lock:
+            candidates = [r for r in self.routes if id(r) not in excluded]
+            if not candidates:
+                raise IndexError("There are no routes left to try.")
+
+            now = time.monotonic()
+            healthy = [r for r in candidates if r.unhealthy_until <= now]
+            route = min(healthy or candidates, key=self._load)
+            route.outstanding += 1
+            return route
+
+    def _release(self, route: Route, latency: Optional[float], failed: bool = False):
+        with self._lock:
+            route.outstanding -= 1
+            if failed:
+                route.consecutive_failures += 1
+                cooldown = self.cooldown_seconds * 2 ** (route.consecutive_failures - 1)
+                route.unhealthy_until = time.monotonic() + min(
+                    cooldown, _MAX_COOLDOWN_SECONDS
+                )
+                return
+            if latency is None:
+                return
+
+            route.consecutive_failures = 0
+            route.unhealthy_until = 0.0
+            if route.latency is None:
+                route.latency = latency
+            else:
+                route.latency += _LATENCY_SMOOTHING * (latency - route.latency)
+
+    def call(self, fn: Callable[[Route], Any]) -> Any:
+        """Call `fn` with the best route, failing over to the others on errors.
+
+        Only overload and transport errors fail over and count against the route. Other
+        errors, e.g. a 4xx for a bad request, would fail on every route and are raised
+        immediately, as is DeadlineExceeded. If every route fails, the error of the
+        last route is raised.
+        """
+        tried = []
+        while True:
+            route = self.choose(exclude=tried)
+            tried.append(route)
+            start = time.perf_counter()
+            try:
+                result = fn(route)
+            except Exception as e:
+                if not is_transient_error(e):
+                    self._release(route, None)
+                    raise
+                self._release(route, None, failed=True)
+                self.metrics.increment(f"route.{route.name}.errors")
+                if len(tried) == len(self.routes):
+                    raise
+                _logger.warning(f"Route {route.label} failed ({e}), failing over.")
+            else:
+                self._release(route, time.perf_counter() - start)
+                self.metrics.increment(f"route.{route.name}.requests")
+                return result
@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import List, Dict
+
+from utils.doc_manipulation import DocstringMap
+from utils.usage import estimate_tokens
+
+SCHEDULES = ("longest-first", "file-priority", "fifo")
+
+
+@dataclass
+class Job:
+    """
+    One docstring to convert. The schema is as follows:
+
+    - file_path: path of the file the docstring was read from
+    - docstring: the docstring to convert
+    - estimated_tokens: size estimate used to order the jobs
+
+    """
+
+    file_path: str
+    docstring: DocstringMap
+
+    @property
+    def estimated_tokens(self) -> int:
+        return estimate_tokens(self.docstring.text)
+
+
+def order_jobs(jobs: List[Job], schedule: str = "longest-first") -> List[Job]:
+    """Order the jobs of one or several files for submission.
+
+    - longest-first: largest estimated jobs first across all files, so that a large
+      docstring does not run alone at the end of the run.
+    - file-priority: files with the fewest estimated tokens first so that they complete
+      (and are written) early, largest jobs first within each file.
+    - fifo: file and docstring order.
+
+    Sorting is stable, so equally sized jobs keep their original order.
+    """
+    assert schedule in SCHEDULES, f"{schedule} schedule is not supported."
+    if schedule == "fifo":
+        return list(jobs)
+
+    by_size = sorted(jobs, key=lambda job: -job.estimated_tokens)
+    if schedule == "longest-first":
+        return by_size
+
+    file_tokens: Dict[str, int] = {}
+    for job in jobs:
+        file_tokens[job.file_path] = file_tokens.get(job.file_path, 0) + (
+            job.estimated_tokens
+        )
+    return sorted(by_size, key=lambda job: file_tokens[job.file_path])
@@ -0,0 +1,174 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Dict, Tuple
+
+from utils.validation import strip_triple_quotes
+
+_FIELD_PATTERN = re.compile(r"^:(param|type|returns?|rtype|raises?|yields?)\b")
+_TRIPLE_QUOTES = '"""'
+
+
+def _is_field_start(line: str) -> bool:
+    return _FIELD_PATTERN.match(line) is not None
+
+
+def _is_continuation(line: str) -> bool:
+    return line.strip() == "" or line[:1].isspace()
+
+
+def _join_lines(lines: List[str]) -> str:
+    return "\n".join(lines).strip("\n")
+
+
+@dataclass
+class DocstringSections:
+    """
+    A cleaned (dedented) docstring split around its sphinx field region. The schema is
+    as follows:
+
+    - head: description before the first `:param`/`:type`/`:return:`/`:rtype:` field
+    - fields: the field region, including the indented continuation lines of each field
+    - tail: anything after the field region, e.g. trailing examples
+
+    """
+
+    head: str
+    fields: str
+    tail: str
+
+    @classmethod
+    def from_text(cls, docstring: str) -> Optional["DocstringSections"]:
+        """Split `docstring`, returning None if it has no field region."""
+        lines = docstring.split("\n")
+        start = next((i for i, line in enumerate(lines) if _is_field_start(line)), None)
+        if start is None:
+            return None
+
+        end = start + 1
+        for i in range(start + 1, len(lines)):
+            if _is_field_start(lines[i]) or (
+                _is_continuation(lines[i]) and lines[i].strip()
+            ):
+                end = i + 1
+            elif not _is_continuation(lines[i]):
+                break
+
+        return cls(
+            head=_join_lines(lines[:start]),
+            fields=_join_lines(lines[start:end]),
+            tail=_join_lines(lines[end:]),
+        )
+
+    def splice(self, converted_fields: str) -> str:
+        """Surround the converted field region with the untouched head and tail.
+
+        Args:
+            converted_fields: LLM output for `fields`, with or without triple quotes.
+
+        Returns:
+            The full docstring surrounded by triple quotes, in the same format as a
+            full-docstring prediction.
+        """
+        parts = [
+            self.head,
+            strip_triple_quotes(converted_fields).strip("\n"),
+            self.tail,
+        ]
+        body = "\n\n".join(part for part in parts if part)
+        return f"{_TRIPLE_QUOTES}{body}\n{_TRIPLE_QUOTES}"
+
+
+_FIELD_NAME_PATTERN = re.compile(r"^:(param|type)\s+(?:[^:]*\s)?(\*{0,2}\w+)\s*:")
+_RETURN_FIELD_PATTERN = re.compile(r"^:(returns?|rtype)\s*:")
+_ARG_ENTRY_PATTERN = re.compile(r"^(\*{0,2}\w+)\s*(\([^)]*\))?\s*:")
+_SECTION_HEADERS = {"Args:": "param", "Returns:": "return"}
+
+
+@dataclass
+class Field:
+    """
+    One logical field of a field region: a `:param name:` with its `:type name:`, or
+    the `:return:` with its `:rtype:`. `kind` is "param" or "return" and `name` is None
+    for the return field.
+    """
+
+    kind: str
+    name: Optional[str]
+    text: str
+
+    @property
+    def key(self) -> str:
+        """Whitespace-normalized identity of the field, used to memoize conversions."""
+        return f"{self.kind}:" + " ".join(self.text.split())
+
+
+def split_fields(fields: str) -> Optional[List[Field]]:
+    """Group a field region into Fields, or None if it has fields we cannot group.
+
+    Fields other than param/type/return/rtype (e.g. `:raises:`) make the region
+    ungroupable, so callers should convert it as a whole.
+    """
+    grouped = {}
+    for line in fields.split("\n"):
+        if _is_field_start(line):
+            if match := _FIELD_NAME_PATTERN.match(line):
+                current = ("param", match.group(2))
+            elif _RETURN_FIELD_PATTERN.match(line):
+                current = ("return", None)
+            else:
+                return None
+            grouped.setdefault(current, []).append(line)
+        else:
+            grouped[current].append(line)
+
+    return [
+        Field(kind=kind, name=name, text=_join_lines(lines))
+        for (kind, name), lines in grouped.items()
+    ]
+
+
+def parse_google_fields(converted: str) -> Dict[Tuple[str, Optional[str]], str]:
+    """Parse converted Args/Returns sections into per-field entries.
+
+    Args:
+        converted: LLM output with `Args:` and/or `Returns:` sections, with or without
+                   triple quotes.
+
+    Returns:
+        Mapping of ("param", name) to the dedented Args entry (starting with `name:`)
+        and ("return", None) to the dedented Returns body.
+    """
+    entries = {}
+    section, current = None, None
+    for line in strip_triple_quotes(converted).split("\n"):
+        if line.strip() in _SECTION_HEADERS and not line[:1].isspace():
+            section = _SECTION_HEADERS[line.strip()]
+            current = ("return", None) if section == "return" else None
+            continue
+        if section is None or (line.strip() and not line[:1].isspace()):
+            section, current = None, None
+            continue
+
+        dedented = line[4:] if line.startswith("    ") else line.strip()
+        if section == "param" and (match := _ARG_ENTRY_PATTERN.match(dedented)):
+            current = ("param", match.group(1))
+        if current is not None:
+            entries.setdefault(current, []).append(dedented)
+
+    return {key: _join_lines(lines) for key, lines in entries.items()}
+
+
+def assemble_google_fields(fields: List[Field], entries: Dict) -> str:
+    """Build Args/Returns sections from per-field entries, in the order of `fields`."""
+    params = [entries[("param", f.name)] for f in fields if f.kind == "param"]
+    returns = [entries[("return", None)] for f in fields if f.kind == "return"]
+
+    def indent(text: str) -> str:
+        return "\n".join("    " + line if line else "" for line in text.split("\n"))
+
+    sections = []
+    if params:
+        sections.append("Args:\n" + "\n".join(indent(p) for p in params))
+    if returns:
+        sections.append("Returns:\n" + indent(returns[0]))
+    return "\n\n".join(sections)
@@ -0,0 +1,43 @@
+import json
+from typing import Dict, Iterator, Optional
+
+_ENDPOINT_PATH = "{deploy_uri}/endpoints/{endpoint}/invocations"
+_DATA_PREFIX = "data:"
+_DONE = "[DONE]"
+
+
+def stream_chat(
+    deploy_uri: str, endpoint: str, inputs: Dict, timeout: Optional[float] = None
+) -> Iterator[str]:
+    """Stream the content deltas of a chat completion from an MLflow gateway route.
+
+    The mlflow deploy client does not implement `predict_stream` for the gateway, so
+    the server-sent events are read directly. Closing the iterator early closes the
+    connection, which stops generation on the gateway side.
+
+    Args:
+        deploy_uri: URI of the gateway, e.g. `http://localhost:5000`.
+        endpoint: name of the chat route.
+        inputs: chat request payload; `"stream": true` is added.
+        timeout: seconds to wait for the connection and between chunks.
+
+    Returns:
+        Iterator over the content of each delta, in order.
+    """
+    import requests
+
+    url = _ENDPOINT_PATH.format(deploy_uri=deploy_uri.rstrip("/"), endpoint=endpoint)
+    with requests.post(
+        url, json={**inputs, "stream": True}, stream=True, timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith(_DATA_PREFIX):
+                continue
+            data = line[len(_DATA_PREFIX) :].strip()
+            if data == _DONE:
+                return
+            for choice in json.loads(data).get("choices", []):
+                content = choice.get("delta", {}).get("content")
+                if content:
+                    yield content
@@ -0,0 +1,171 @@
+import math
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional, Any, Tuple
+
+from utils.general import read_yaml
+
+# Rough chars-per-token ratio for English prose/code with OpenAI tokenizers
+_CHARS_PER_TOKEN = 4
+# Per-message overhead of the chat format (role, separators)
+_TOKENS_PER_MESSAGE = 4
+
+# USD per 1K (prompt, completion) tokens, keyed by gateway route name
+_PRICES_PER_1K_TOKENS = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+}
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return math.ceil(len(text) / _CHARS_PER_TOKEN) if text else 0
+
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    return sum(_TOKENS_PER_MESSAGE + estimate_tokens(m["content"]) for m in messages)
+
+
+def load_price_table(path: Optional[str] = None) -> Dict[str, Tuple[float, float]]:
+    """Return the default price table, updated with a YAML file if one is given.
+
+    The YAML maps a route name to its USD price per 1K tokens:
+
+    .. code-block:: yaml
+
+        gpt-4:
+          prompt: 0.03
+          completion: 0.06
+    """
+    prices = dict(_PRICES_PER_1K_TOKENS)
+    if path is not None:
+        for route, price in (read_yaml(path) or {}).items():
+            prices[route] = (float(price["prompt"]), float(price["completion"]))
+    return prices
+
+
+@dataclass
+class Usage:
+    """
+    Token usage of one or more gateway calls. Tokens are taken from the `usage` field
+    of the response and estimated locally when the gateway omits it. `rules_tokens` is
+    the (estimated) share of prompt tokens spent resending the rules block.
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    requests: int = 0
+    estimated_requests: int = 0
+    rules_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "Usage"):
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.requests += other.requests
+        self.estimated_requests += other.estimated_requests
+        self.rules_tokens += other.rules_tokens
+        self.cost += other.cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+    @classmethod
+    def from_response(
+        cls,
+        raw_response: Dict[str, Any],
+        messages: List[Dict],
+        completion: str,
+        rules_tokens: int = 0,
+        price: Optional[Tuple[float, float]] = None,
+    ) -> "Usage":
+        """Build the usage of a single chat call.
+
+        Args:
+            raw_response: response dict returned by the deploy client.
+            messages: messages that were sent in the request.
+            completion: content of the returned message.
+            rules_tokens: prompt tokens attributed to the rules block.
+            price: USD per 1K (prompt, completion) tokens for the route.
+
+        Returns:
+            Usage of the call.
+        """
+        reported = raw_response.get("usage") or {}
+        prompt_tokens = reported.get("prompt_tokens")
+        completion_tokens = reported.get("completion_tokens")
+        estimated = prompt_tokens is None or completion_tokens is None
+
+        if prompt_tokens is None:
+            prompt_tokens = estimate_message_tokens(messages)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(completion)
+
+        cost = 0.0
+        if price is not None:
+            cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+
+        return cls(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            requests=1,
+            estimated_requests=int(estimated),
+            rules_tokens=rules_tokens,
+            cost=cost,
+        )
+
+
+class UsageTracker:
+    """Thread-safe aggregation of Usage per docstring, per file and for the run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.run = Usage()
+        self.files: Dict[str, Usage] = defaultdict(Usage)
+        self.docstrings: Dict[str, Usage] = defaultdict(Usage)
+
+    def add(self, usage: Usage, file_key: str, docstring_key: str):
+        with self._lock:
+            self.run.add(usage)
+            self.files[file_key].add(usage)
+            self.docstrings[docstring_key].add(usage)
+
+    def discard(self, file_key: str):
+        """Drop the usage of a file and of its docstrings, keyed `file_key:line`."""
+        with self._lock:
+            self.files.pop(file_key, None)
+            for key in [k for k in self.docstrings if k.rpartition(":")[0] == file_key]:
+                del self.docstrings[key]
+
+    def reset(self):
+        """Drop the usage of the run, of every file and of every docstring."""
+        with self._lock:
+            self.run = Usage()
+            self.files.clear()
+            self.docstrings.clear()
+
+    def format_totals(self) -> str:
+        run = self.run
+        rules_share = run.rules_tokens / run.prompt_tokens if run.prompt_tokens else 0.0
+        return "\n".join(
+            [
+                f"requests:          {run.requests} ({run.estimated_requests} estimated)",
+                f"prompt tokens:     {run.prompt_tokens}",
+                f"completion tokens: {run.completion_tokens}",
+                f"total tokens:      {run.total_tokens}",
+                f"rules tokens:      {run.rules_tokens} ({rules_share:.1%} of prompt)",
+                f"cost (USD):        {run.cost:.4f}",
+            ]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run": self.run.to_dict(),
+                "files": {k: v.to_dict() for k, v in self.files.items()},
+                "docstrings": {k: v.to_dict() for k, v in self.docstrings.items()},
+            }
@@ -0,0 +1,155 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+_MAX_LINE_LENGTH = 100
+_TRIPLE_QUOTES = '"""'
+
+_PARAM_PATTERN = re.compile(r"^\s*:param\s+(?:[^:]*\s)?(\*{0,2}\w+)\s*:", re.MULTILINE)
+_RETURN_PATTERN = re.compile(r"^\s*:returns?:", re.MULTILINE)
+_FIELD_PATTERN = re.compile(r"^\s*:(param|type|returns?|rtype)\b", re.MULTILINE)
+
+
+class ConversionError(Exception):
+    """Raised when the LLM output cannot be turned into a valid docstring."""
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of the local checks on a predicted docstring; no errors means valid."""
+
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.errors) == 0
+
+
+def get_param_names(docstring: str) -> List[str]:
+    """Names of the `:param name:` (or `:param type name:`) fields of a docstring."""
+    return _PARAM_PATTERN.findall(docstring)
+
+
+def strip_triple_quotes(text: str) -> str:
+    return text.strip().removeprefix(_TRIPLE_QUOTES).removesuffix(_TRIPLE_QUOTES)
+
+
+def is_quoted(text: str) -> bool:
+    """Whether `text` starts and ends with triple quotes, as a docstring prediction must."""
+    stripped = text.strip()
+    return stripped.startswith(_TRIPLE_QUOTES) and stripped.endswith(_TRIPLE_QUOTES)
+
+
+def _has_arg_entry(body: str, name: str) -> bool:
+    return re.search(rf"^\s*{re.escape(name)}\b.*:", body, re.MULTILINE) is not None
+
+
+def _check_line(line: str, original_lines: Set[str], max_line_length: int) -> List[str]:
+    if len(line) > max_line_length and line.strip() not in original_lines:
+        return [f"Line exceeds {max_line_length} characters: {line.strip()[:40]}..."]
+    return []
+
+
+def validate_conversion(
+    original: str, predicted: str, max_line_length: int = _MAX_LINE_LENGTH
+) -> ValidationResult:
+    """Check a predicted google-style docstring against the original.
+
+    Args:
+        original: original sphinx-style docstring text.
+        predicted: LLM output, expected to be surrounded by triple quotes.
+        max_line_length: longest allowed line. Lines that already appear in the
+                         original (e.g. long URLs in code blocks) are exempt.
+
+    Returns:
+        ValidationResult listing every failed check.
+    """
+    result = ValidationResult()
+    stripped = predicted.strip()
+
+    if not is_quoted(stripped):
+        result.errors.append("Output is not surrounded by triple quotes.")
+    if len(stripped) < 2 * len(_TRIPLE_QUOTES) or _TRIPLE_QUOTES in stripped[3:-3]:
+        result.errors.append("Output does not contain exactly one docstring.")
+
+    body = strip_triple_quotes(stripped)
+    if _FIELD_PATTERN.search(body):
+        result.errors.append("Output still contains sphinx :param/:return: fields.")
+
+    param_names = get_param_names(original)
+    if param_names and "Args:" not in body:
+        result.errors.append("Output is missing the Args section.")
+    for name in param_names:
+        if not _has_arg_entry(body, name.lstrip("*")):
+            result.errors.append(f"Parameter {name!r} is missing from the output.")
+    if _RETURN_PATTERN.search(original) and "Returns:" not in body:
+        result.errors.append("Output is missing the Returns section.")
+
+    original_lines = {line.strip() for line in original.split("\n")}
+    for line in body.split("\n"):
+        result.errors.extend(_check_line(line, original_lines, max_line_length))
+
+    return result
+
+
+def check_source_syntax(source: str, filename: str = "<source>") -> Optional[str]:
+    """Compile python source, returning its syntax error or None if it compiles.
+
+    Module-level so that it can run in a process pool.
+    """
+    try:
+        compile(source, filename, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+class IncrementalValidator:
+    """
+    Validate a streamed prediction chunk by chunk. Line-level checks run as soon as a
+    line is complete, and `complete` turns True once the closing triple quotes of the
+    docstring arrive; anything streamed after them is dropped from `text`.
+    """
+
+    def __init__(self, original: str, max_line_length: int = _MAX_LINE_LENGTH):
+        self.original = original
+        self.max_line_length = max_line_length
+        self.errors: List[str] = []
+        self._original_lines = {line.strip() for line in original.split("\n")}
+        self._buffer = ""
+        self._checked = 0
+        self._end: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    @property
+    def text(self) -> str:
+        return self._buffer if self._end is None else self._buffer[: self._end]
+
+    def feed(self, chunk: str) -> bool:
+        """Add a streamed chunk, returning whether the docstring is complete."""
+        if self.complete:
+            return True
+        self._buffer += chunk
+
+        start = self._buffer.find(_TRIPLE_QUOTES)
+        if start != -1:
+            end = self._buffer.find(_TRIPLE_QUOTES, start + len(_TRIPLE_QUOTES))
+            if end != -1:
+                self._end = end + len(_TRIPLE_QUOTES)
+
+        lines = self.text.split("\n")
+        # The last line is still being streamed unless the docstring is complete
+        ready = lines if self.complete else lines[:-1]
+        for line in ready[self._checked :]:
+            self.errors.extend(
+                _check_line(line, self._original_lines, self.max_line_length)
+            )
+        self._checked = len(ready)
+        return self.complete
+
+    def result(self) -> ValidationResult:
+        """Full validation of the text received so far."""
+        return validate_conversion(self.original, self.text, self.max_line_length)